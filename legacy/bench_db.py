@@ -0,0 +1,69 @@
+"""
+Micro-benchmark for the SQLite layer in src/db.py
+
+Compares the old connect-per-call / rollback-journal pattern with the
+pooled WAL connection (one transaction per insert). For the buffered
+db.log_metric see bench_metrics_sink.py.
+
+Usage:
+    python bench_db.py [num_inserts]
+"""
+
+import sys
+import time
+import sqlite3
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, 'src')
+import db
+
+
+def bench_connect_per_insert(db_path: Path, n: int) -> float:
+    """Old behaviour: new connection, default journal, commit + close per insert"""
+    start = time.perf_counter()
+    for i in range(n):
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO metrics (video_id, step, duration_seconds, success, error_message)
+            VALUES (?, ?, ?, ?, ?)
+        """, (1, "benchmark", i * 0.001, True, None))
+        conn.commit()
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_pooled(n: int) -> float:
+    """New behaviour: one insert per transaction on the thread-local WAL connection"""
+    start = time.perf_counter()
+    for i in range(n):
+        with db.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO metrics (video_id, step, duration_seconds, success, error_message)
+                VALUES (?, ?, ?, ?, ?)
+            """, (1, "benchmark", i * 0.001, True, None))
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Baseline database stays in rollback-journal mode
+        before_path = Path(tmp) / "before" / "jetski.db"
+        db.DB_PATH = before_path
+        db.init_db()
+        db.get_connection().execute("PRAGMA journal_mode=DELETE")
+        db.close_connection()
+        before = bench_connect_per_insert(before_path, n)
+
+        db.DB_PATH = Path(tmp) / "after" / "jetski.db"
+        db.init_db()
+        after = bench_pooled(n)
+        db.close_connection()
+
+    print(f"SQLite metric inserts ({n} rows)")
+    print(f"  before (connect per insert, rollback journal): {n / before:10.0f} inserts/s")
+    print(f"  after  (pooled connection, WAL):               {n / after:10.0f} inserts/s")
+    print(f"  speedup: {before / after:.1f}x")
@@ -0,0 +1,64 @@
+"""
+Benchmark for DocAgent: cold vs warm create_summary_doc
+
+Cold: client caches dropped first, so the run pays for reading the service
+account file, the token exchange, parsing discovery documents and new TLS
+connections. Warm: a fresh DocAgent() per run (like the pipeline does) on
+top of the shared credentials, services and connections.
+
+Creates real documents - needs GOOGLE_SERVICE_ACCOUNT_PATH.
+
+Usage:
+    python bench_doc_agent.py [runs]
+"""
+
+import os
+import sys
+import time
+import statistics
+
+sys.path.insert(0, 'src')
+from agents.doc_agent import DocAgent
+from agents.google_clients import reset_clients
+
+VIRAL_ANALYSIS = {
+    "segments": [
+        {"rank": 1, "score": 90, "start_time": "1:00", "end_time": "2:00", "viral_type": "insight",
+         "hook": "Benchmark hook", "summary": "Benchmark summary", "transcript_excerpt": "..."}
+    ],
+    "selected": {"rank": 1, "reason": "Benchmark"}
+}
+
+STORYBOARD = {
+    "title": "DocAgent benchmark",
+    "panels": [{"panel_number": i, "caption": f"Panel {i}"} for i in range(1, 7)],
+    "hashtags": ["#jetski"]
+}
+
+
+def run_once() -> float:
+    start = time.perf_counter()
+    agent = DocAgent()
+    result = agent.create_summary_doc("https://youtu.be/benchmark", "Benchmark", VIRAL_ANALYSIS, STORYBOARD)
+    elapsed = time.perf_counter() - start
+    if result["status"] != "success":
+        raise SystemExit(f"create_summary_doc failed: {result}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    if not os.getenv("GOOGLE_SERVICE_ACCOUNT_PATH"):
+        raise SystemExit("Set GOOGLE_SERVICE_ACCOUNT_PATH to run this benchmark")
+
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    cold = []
+    for _ in range(runs):
+        reset_clients()
+        cold.append(run_once())
+
+    warm = [run_once() for _ in range(runs)]
+
+    print(f"create_summary_doc over {runs} runs (median)")
+    print(f"  cold (new credentials, services, connections): {statistics.median(cold) * 1000:8.1f} ms")
+    print(f"  warm (shared clients):                         {statistics.median(warm) * 1000:8.1f} ms")
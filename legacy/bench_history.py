@@ -0,0 +1,107 @@
+"""
+Benchmark for db.get_video_history on a synthetic database
+
+Builds a database with the pre-index schema, times the old
+LEFT JOIN / COUNT(DISTINCT) history query, then runs init_db() (which
+adds the indexes) and times the current db.get_video_history().
+
+Usage:
+    python bench_history.py [num_videos]
+"""
+
+import sys
+import time
+import random
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, 'src')
+import db
+
+OLD_HISTORY_QUERY = """
+    SELECT
+        v.id,
+        v.video_url,
+        v.title,
+        v.created_at,
+        COUNT(DISTINCT vs.id) as segments_count,
+        COUNT(DISTINCT s.id) as storyboards_count,
+        COUNT(DISTINCT gc.id) as comics_count
+    FROM videos v
+    LEFT JOIN viral_segments vs ON v.id = vs.video_id
+    LEFT JOIN storyboards s ON v.id = s.video_id
+    LEFT JOIN generated_comics gc ON s.id = gc.storyboard_id
+    GROUP BY v.id
+    ORDER BY v.created_at DESC
+    LIMIT ?
+"""
+
+
+def drop_indexes(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall()
+    for row in rows:
+        conn.execute(f"DROP INDEX {row[0]}")
+
+
+def populate(conn, num_videos: int):
+    """3 segments, 1-3 storyboards and one comic per storyboard for every video"""
+    rng = random.Random(42)
+    with conn:
+        conn.executemany(
+            "INSERT INTO videos (id, video_url, video_id, title, created_at) VALUES (?, ?, ?, ?, ?)",
+            [
+                (i, f"https://youtu.be/v{i:010d}", f"v{i:010d}", f"Video {i}",
+                 time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(1_700_000_000 + i * 60)))
+                for i in range(1, num_videos + 1)
+            ]
+        )
+        conn.executemany(
+            "INSERT INTO viral_segments (video_id, rank, score, is_selected) VALUES (?, ?, ?, ?)",
+            [(i, rank, 90 - rank, rank == 1) for i in range(1, num_videos + 1) for rank in (1, 2, 3)]
+        )
+        storyboards = [(i, i * 3 - 2) for i in range(1, num_videos + 1) for _ in range(rng.randint(1, 3))]
+        conn.executemany(
+            "INSERT INTO storyboards (video_id, segment_id, panels_json) VALUES (?, ?, '[]')",
+            storyboards
+        )
+        conn.execute(
+            "INSERT INTO generated_comics (storyboard_id, status) SELECT id, 'success' FROM storyboards"
+        )
+
+
+def time_query(func, repeats: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    num_videos = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    limit = 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "jetski.db"
+        db.init_db()
+        conn = db.get_connection()
+        drop_indexes(conn)
+
+        print(f"Building synthetic database with {num_videos} videos...")
+        populate(conn, num_videos)
+
+        old_rows = [dict(row) for row in conn.execute(OLD_HISTORY_QUERY, (limit,)).fetchall()]
+        before = time_query(lambda: conn.execute(OLD_HISTORY_QUERY, (limit,)).fetchall(), repeats=3)
+
+        db.init_db()
+        new_rows = db.get_video_history(limit=limit)
+        after = time_query(lambda: db.get_video_history(limit=limit))
+
+        db.close_connection()
+
+    print(f"get_video_history(limit={limit}) on {num_videos} videos")
+    print(f"  before (no indexes, JOIN + COUNT DISTINCT): {before * 1000:10.2f} ms")
+    print(f"  after  (indexes, correlated subqueries):    {after * 1000:10.2f} ms")
+    print(f"  speedup: {before / after:.0f}x")
+    print(f"  same results: {old_rows == new_rows}")
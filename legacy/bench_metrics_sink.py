@@ -0,0 +1,65 @@
+"""
+Micro-benchmark for the buffered metrics sink (src/metrics.py)
+
+Compares one insert per transaction on the pooled WAL connection with
+db.log_metric, which buffers rows and writes them in batches on a
+background thread.
+
+Usage:
+    python bench_metrics_sink.py [num_inserts]
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, 'src')
+import db
+
+
+def bench_per_insert(n: int) -> float:
+    """Before: one transaction per row on the thread-local WAL connection"""
+    start = time.perf_counter()
+    for i in range(n):
+        with db.transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO metrics (video_id, step, duration_seconds, success, error_message)
+                VALUES (?, ?, ?, ?, ?)
+            """, (1, "benchmark", i * 0.001, True, None))
+    return time.perf_counter() - start
+
+
+def bench_sink(n: int) -> tuple:
+    """
+    After: db.log_metric buffers, the sink writes batches.
+    Returns (time spent in log_metric calls, time until every row is written).
+    """
+    start = time.perf_counter()
+    for i in range(n):
+        db.log_metric(1, "benchmark", i * 0.001)
+    recorded = time.perf_counter() - start
+    db._metrics_sink.flush()
+    return recorded, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "before" / "jetski.db"
+        db.init_db()
+        before = bench_per_insert(n)
+        db.close_connection()
+
+        db.DB_PATH = Path(tmp) / "after" / "jetski.db"
+        db.init_db()
+        caller, after = bench_sink(n)
+        written = db.get_connection().execute("SELECT COUNT(*) FROM metrics").fetchone()[0]
+        db.close_connection()
+
+    print(f"SQLite metric inserts ({n} rows)")
+    print(f"  before (one transaction per row, pooled WAL): {n / before:10.0f} inserts/s")
+    print(f"  after  (buffered, batched by the sink):       {n / after:10.0f} inserts/s")
+    print(f"  speedup: {before / after:.1f}x")
+    print(f"  log_metric call latency: {caller / n * 1e6:.1f} µs (rows written: {written}/{n})")
@@ -0,0 +1,113 @@
+"""
+Benchmark + recall check for transcript pre-ranking (src/agents/prerank.py)
+
+Offline (default): a synthetic long transcript with planted highlight
+moments. Reports prompt tokens with and without pre-ranking, the local
+scoring time, and how many planted moments land in the selected windows.
+
+Live (--live URL): fetches a real transcript and runs find_viral_moments
+with and without pre-ranking. Reports prompt tokens, wall time, and recall:
+how many of the full-transcript segments overlap a selected window.
+Needs OPENAI_API_KEY and makes real API calls.
+
+Usage:
+    python bench_prerank.py [hours]
+    python bench_prerank.py --live https://www.youtube.com/watch?v=...
+"""
+
+import sys
+import time
+import random
+
+sys.path.insert(0, 'src')
+from agents.transcript_agent import Transcript, fetch_transcript, parse_timestamp
+from agents.prerank import select_windows, condense_transcript, PRERANK_TOP_K
+from agents.highlight_agent import find_viral_moments, estimate_tokens
+
+FILLER = ("so yeah you know we were just kind of talking about the thing and then uh basically "
+          "it was like okay right so I mean the show the podcast episode guys today thing stuff "
+          "really good pretty much anyway like said went back there came over time people").split()
+
+# Each planted moment leans on different features
+HIGHLIGHTS = [
+    "the biggest mistake I ever made was believing nobody would notice! never again",
+    "[Laughter] he fell right into the fountain in front of the whole wedding [Laughter] hilarious",
+    "my grandmother smuggled saffron through Tangier inside hollowed violins in nineteen forty",
+    "I was terrified, heartbroken, devastated, crying in the parking lot. Why? Why me?",
+    "[Applause] that's the secret: success is the failure you refused to quit [Applause]",
+    "quantum tunneling lets electrons cross barriers classical physics forbids outright",
+]
+
+
+def synthetic_transcript(hours: float, seed: int = 7):
+    """Captions every ~4s of filler, with HIGHLIGHTS planted as 60s moments"""
+    rng = random.Random(seed)
+    duration = hours * 3600
+    moments = sorted(rng.sample(range(300, int(duration) - 300, 60), len(HIGHLIGHTS)))
+    planted = dict(zip(moments, HIGHLIGHTS))
+
+    snippets = []
+    t = 0.0
+    while t < duration:
+        moment = next((start for start in planted if start <= t < start + 60), None)
+        if moment is not None:
+            text = planted[moment]
+        else:
+            text = " ".join(rng.choice(FILLER) for _ in range(rng.randint(8, 12)))
+        snippets.append(type("Snippet", (), {"text": text, "start": t, "duration": 4.0}))
+        t += 4.0
+    return Transcript.from_snippets(snippets), [(start, start + 60) for start in moments]
+
+
+def overlaps(interval, windows) -> bool:
+    start, end = interval
+    return any(start < w["end_seconds"] and w["start_seconds"] < end for w in windows)
+
+
+def bench_offline(hours: float):
+    transcript, moments = synthetic_transcript(hours)
+    full_tokens = estimate_tokens(transcript.timestamped_text())
+
+    start = time.perf_counter()
+    windows = select_windows(transcript)
+    condensed = condense_transcript(transcript)
+    elapsed = time.perf_counter() - start
+
+    hits = sum(overlaps(moment, windows) for moment in moments)
+    condensed_tokens = estimate_tokens(condensed)
+    print(f"Synthetic transcript: {hours:g}h, {len(transcript.offsets)} captions")
+    print(f"  prompt tokens: {full_tokens} full → {condensed_tokens} pre-ranked "
+          f"({100 * (1 - condensed_tokens / full_tokens):.1f}% fewer, top {PRERANK_TOP_K} windows)")
+    print(f"  local scoring: {elapsed * 1000:.1f} ms")
+    print(f"  planted moments recalled: {hits}/{len(moments)}")
+
+
+def bench_live(video_url: str):
+    transcript = fetch_transcript(video_url)
+    windows = select_windows(transcript)
+
+    runs = {}
+    for prerank in (False, True):
+        start = time.perf_counter()
+        result = find_viral_moments(transcript, prerank=prerank)
+        runs[prerank] = (result, time.perf_counter() - start)
+
+    full_tokens = estimate_tokens(transcript.timestamped_text())
+    condensed_tokens = estimate_tokens(condense_transcript(transcript) or transcript.timestamped_text())
+    print(f"Live transcript: {transcript.duration / 60:.0f} min")
+    print(f"  prompt tokens: {full_tokens} full → {condensed_tokens} pre-ranked")
+    print(f"  find_viral_moments: {runs[False][1]:.1f}s full → {runs[True][1]:.1f}s pre-ranked")
+
+    segments = runs[False][0].get("segments", [])
+    intervals = [(parse_timestamp(seg.get("start_time", "")), parse_timestamp(seg.get("end_time", "")))
+                 for seg in segments]
+    intervals = [interval for interval in intervals if None not in interval]
+    hits = sum(overlaps(interval, windows) for interval in intervals)
+    print(f"  full-transcript segments inside selected windows: {hits}/{len(intervals)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == "--live":
+        bench_live(sys.argv[2])
+    else:
+        bench_offline(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0)
@@ -0,0 +1,44 @@
+"""
+Checks for agents.prompt_builder.normalize_transcript()
+
+Caption noise, fillers, stutters and rolling-caption repeats go; words that
+only look like them stay. No API keys or network needed:
+
+    python check_normalize.py
+"""
+
+import sys
+
+# Straight from the module - the agents package builds API clients on import
+sys.path.insert(0, 'src/agents')
+from prompt_builder import normalize_transcript
+
+CASES = [
+    # (transcript, expected)
+    ("[0:05] [Music] ♪ so um, we went uh home", "[0:05] so we went home"),
+    (">> I I think so", "I think so"),
+    ("and then the kid said and then the kid said it was over",
+     "and then the kid said it was over"),
+    ("[1:02] [Music] [1:10] he's back", "[1:10] he's back"),
+    # Uppercase is a word, not a filler
+    ("the ER doctor saw him", "the ER doctor saw him"),
+    ("UM, the team from UM won", "UM, the team from UM won"),
+    # Interjection repeats are the content
+    ("ha ha ha [Laughter]", "ha ha ha [Laughter]"),
+    ("no, no, no! yes yes yes", "no, no, no! yes yes yes"),
+    # Two-word repeats are usually meant
+    ("start spreading the news, New York New York", "start spreading the news, New York New York"),
+]
+
+
+if __name__ == "__main__":
+    failed = 0
+    for transcript, expected in CASES:
+        got = normalize_transcript(transcript)
+        if got == expected:
+            print(f"✅ {transcript!r}")
+        else:
+            failed += 1
+            print(f"❌ {transcript!r}\n   expected {expected!r}\n   got      {got!r}")
+    print(f"\n{len(CASES) - failed}/{len(CASES)} passed")
+    sys.exit(1 if failed else 0)
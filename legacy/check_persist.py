@@ -0,0 +1,93 @@
+"""
+Round-trip check for supabase_client.persist_pipeline_result()
+
+Runs the RPC through PostgREST against a local stack - never point this at
+production. Start it from the repo root, then run from legacy/:
+
+    supabase start
+    SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_ANON_KEY=<anon key> python check_persist.py
+
+Checks that one call writes the whole run, that a retry of the same payload
+(after a lost response) is a no-op, and that a bad row rolls everything back.
+"""
+
+import sys
+import uuid
+
+sys.path.insert(0, 'src')
+import supabase_client as db
+
+
+def run_args(video_id: str, last_panel: int = 6) -> dict:
+    return {
+        "video": {"video_url": f"https://youtu.be/{video_id}", "video_id": video_id, "title": "Persist check"},
+        "segments": [
+            {"rank": 1, "score": 91, "hook": "Best moment"},
+            {"rank": 2, "score": 74, "hook": "Runner-up"}
+        ],
+        "selected_rank": 1,
+        "storyboard_data": {"title": "Persist check", "panels": [], "hashtags": ["#jetski"]},
+        "panels_data": [
+            {"panel_number": 1, "caption": "First"},
+            {"panel_number": last_panel, "caption": "Last"}
+        ],
+        "comic": {"generation_time": 12.5},
+        "metrics": [db.metric_row("viral_analysis", 2.5), db.metric_row("image_generation", 9.0)]
+    }
+
+
+def lose_first_response(rpc):
+    """supabase.rpc whose first call commits but then fails like a timeout"""
+    calls = []
+
+    def wrapper(name, params):
+        if calls:
+            return rpc(name, params)
+        calls.append(params)
+        rpc(name, params).execute()
+        raise ConnectionError("response lost after commit")
+    wrapper.calls = calls
+    return wrapper
+
+
+def count(table: str, column: str, value: str) -> int:
+    return len(db.supabase.table(table).select("id").eq(column, value).execute().data)
+
+
+if __name__ == "__main__":
+    video_id = f"chk_{uuid.uuid4().hex[:8]}"
+
+    args = run_args(video_id)
+    saved = db.persist_pipeline_result(**args)
+    assert count("viral_segments", "video_id", saved["video_id"]) == 2
+    assert count("comic_panels", "storyboard_id", saved["storyboard_id"]) == 2
+    assert count("processing_metrics", "video_id", saved["video_id"]) == 2
+    print(f"✅ Persisted run in one call: {saved}")
+
+    again = db.persist_pipeline_result(**run_args(video_id))
+    assert again["video_id"] == saved["video_id"], "re-processed video should keep its id"
+    print("✅ Re-processed video reuses its row")
+
+    # persist_pipeline_result retries with the same payload (same ids)
+    retry_video_id = f"chk_{uuid.uuid4().hex[:8]}"
+    rpc = db.supabase.rpc
+    db.supabase.rpc = lossy = lose_first_response(rpc)
+    try:
+        retried = db.persist_pipeline_result(**run_args(retry_video_id))
+    finally:
+        db.supabase.rpc = rpc
+    assert retried["comic_id"] == lossy.calls[0]["payload"]["comic"]["id"], "retry should return the committed ids"
+    assert count("viral_segments", "video_id", retried["video_id"]) == 2, "retry duplicated segments"
+    assert count("processing_metrics", "video_id", retried["video_id"]) == 2, "retry duplicated metrics"
+    print("✅ Retry after a lost response is a no-op")
+
+    bad_video_id = f"chk_{uuid.uuid4().hex[:8]}"
+    try:
+        db.persist_pipeline_result(**run_args(bad_video_id, last_panel=7))
+        raise AssertionError("panel_number 7 should be rejected")
+    except AssertionError:
+        raise
+    except Exception as e:
+        print(f"✅ Invalid run rejected ({getattr(e, 'code', type(e).__name__)})")
+    assert count("videos", "video_id", bad_video_id) == 0, "failed run left rows behind"
+    print("✅ Failed run left no rows behind")
@@ -0,0 +1,188 @@
+"""
+Local stand-in for the Google Drive upload API
+
+Implements just enough of /upload/drive/v3/files (multipart and resumable
+uploads, including Content-Range status queries and resumption) to exercise
+agents/drive_uploader.py without Google credentials. It can inject 429/503
+responses to test the retry path, and cut the first resumable PUT short to
+test resuming.
+
+Usage:
+    python drive_standin.py            # self-check: uploads through the stand-in
+    python drive_standin.py serve 9000 # run the stand-in, then point
+                                       # DRIVE_API_BASE_URL=http://localhost:9000 at it
+"""
+
+import sys
+import json
+import time
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# drive_uploader has no package imports; load it directly so the agents'
+# heavier dependencies (OpenAI, Gemini, ...) aren't needed here
+sys.path.insert(0, 'src/agents')
+
+
+class DriveStandin(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, fail_first: int = 0, fail_status: int = 503,
+                 truncate_first_put: bool = False):
+        super().__init__(("127.0.0.1", port), DriveHandler)
+        self.files = {}
+        self.sessions = {}
+        self.requests = []
+        self.fail_remaining = fail_first
+        self.fail_status = fail_status
+        # Keep half of the first resumable PUT, then answer 503
+        self.truncate_remaining = 1 if truncate_first_put else 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class DriveHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status: int, body: dict = None, headers: dict = None):
+        payload = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _inject_failure(self) -> bool:
+        with self.server.lock:
+            if self.server.fail_remaining <= 0:
+                return False
+            self.server.fail_remaining -= 1
+        self._reply(self.server.fail_status, {"error": "injected"}, {"Retry-After": "0"})
+        return True
+
+    def _store(self, metadata: dict, data: bytes, mime_type: str) -> dict:
+        file_id = uuid.uuid4().hex[:12]
+        with self.server.lock:
+            self.server.files[file_id] = {**metadata, "data": data, "mimeType": mime_type}
+        return {"id": file_id, "webViewLink": f"{self.server.base_url}/file/d/{file_id}/view"}
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        upload_type = parse_qs(url.query).get("uploadType", [""])[0]
+        body = self._body()
+        with self.server.lock:
+            self.server.requests.append(("POST", upload_type, len(body)))
+
+        if self._inject_failure():
+            return
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._reply(401, {"error": "missing token"})
+
+        if upload_type == "multipart":
+            boundary = self.headers["Content-Type"].split("boundary=")[1].encode()
+            parts = body.split(b"--" + boundary)
+            metadata_part, media_part = parts[1], parts[2]
+            metadata = json.loads(metadata_part.split(b"\r\n\r\n", 1)[1].rstrip(b"\r\n"))
+            media_headers, data = media_part.split(b"\r\n\r\n", 1)
+            mime_type = media_headers.decode().split("Content-Type: ")[1].strip()
+            return self._reply(200, self._store(metadata, data[:-2], mime_type))
+
+        if upload_type == "resumable":
+            session_id = uuid.uuid4().hex
+            with self.server.lock:
+                self.server.sessions[session_id] = {"metadata": json.loads(body), "data": b""}
+            location = f"{self.server.base_url}/upload/drive/v3/files?uploadType=resumable&upload_id={session_id}"
+            return self._reply(200, {}, {"Location": location})
+
+        self._reply(400, {"error": f"unsupported uploadType {upload_type}"})
+
+    def do_PUT(self):
+        session_id = parse_qs(urlparse(self.path).query).get("upload_id", [""])[0]
+        body = self._body()
+        content_range = self.headers.get("Content-Range", "")
+        with self.server.lock:
+            self.server.requests.append(("PUT", "status" if "*" in content_range else "resumable", len(body)))
+            session = self.server.sessions.get(session_id)
+
+        if session is None:
+            return self._reply(404, {"error": "unknown upload session"})
+        if "*" not in content_range and self._inject_failure():
+            return
+
+        # "bytes start-end/total" (data) or "bytes */total" (status query)
+        start, total = len(session["data"]), None
+        if content_range:
+            span, total = content_range.split(" ", 1)[1].split("/")
+            total = int(total)
+            if span != "*":
+                start = int(span.split("-")[0])
+        if start != len(session["data"]):
+            return self._reply(400, {"error": f"expected offset {len(session['data'])}, got {start}"})
+
+        with self.server.lock:
+            truncate = self.server.truncate_remaining > 0 and body
+            if truncate:
+                self.server.truncate_remaining -= 1
+        if truncate:
+            session["data"] += body[:len(body) // 2]
+            return self._reply(503, {"error": "injected (partial)"})
+        session["data"] += body
+
+        if total is not None and len(session["data"]) < total:
+            headers = {"Range": f"bytes=0-{len(session['data']) - 1}"} if session["data"] else {}
+            return self._reply(308, {}, headers)
+        self._reply(200, self._store(session["metadata"], session["data"], self.headers.get("Content-Type")))
+
+
+def self_check():
+    from drive_uploader import DriveUploader
+
+    server = DriveStandin(fail_first=2, truncate_first_put=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    uploader = DriveUploader(lambda: "test-token", base_url=server.base_url,
+                             max_workers=4, multipart_threshold=64 * 1024)
+
+    files = [
+        {"name": f"Panel_{i}.png", "data": bytes([i]) * (10_000 * i), "mime_type": "image/png", "parents": ["f1"]}
+        for i in range(1, 7)
+    ]
+    files.append({"name": "Panel_big.png", "data": b"\x89PNG" * 50_000, "mime_type": "image/png"})
+
+    start = time.perf_counter()
+    results = uploader.upload_many(files)
+    elapsed = time.perf_counter() - start
+    uploader.close()
+    server.shutdown()
+
+    stored = {f["name"]: f for f in server.files.values()}
+    ok = all("id" in r for r in results) and all(stored[f["name"]]["data"] == f["data"] for f in files)
+
+    kinds = [upload_type for _, upload_type, _ in server.requests]
+    print(f"Uploaded {len(files)} files in {elapsed * 1000:.1f} ms")
+    print(f"  requests: {len(server.requests)} ({kinds.count('multipart')} multipart, "
+          f"{kinds.count('resumable')} resumable, {kinds.count('status')} status queries, "
+          f"2 injected failures retried, 1 cut-short upload resumed)")
+    print(f"  round trip intact: {ok}")
+    return ok
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 9000
+        server = DriveStandin(port=port)
+        print(f"Drive stand-in listening on {server.base_url}")
+        server.serve_forever()
+    else:
+        sys.exit(0 if self_check() else 1)
@@ -6,6 +6,7 @@ Quick example showing how to use JetSki API to convert YouTube videos to comics.
 
 import requests
 import json
+import time
 import base64
 from pathlib import Path
 
@@ -14,6 +15,27 @@ from pathlib import Path
 API_BASE = "http://localhost:8000"
 OUTPUT_DIR = Path("data/output")
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+POLL_INTERVAL_SECONDS = 3
+POLL_TIMEOUT_SECONDS = 600
+
+
+def wait_for_job(status_url: str) -> dict:
+    """
+    Poll a queued /jetski job until it finishes.
+
+    Returns:
+        dict: The job (status "success" with "result", or "failed" with "error")
+    """
+    deadline = time.time() + POLL_TIMEOUT_SECONDS
+    while True:
+        # inline_images: panels come back base64-encoded instead of as /blobs links
+        job = requests.get(f"{API_BASE}{status_url}", params={"inline_images": True}).json()
+        if job["status"] in ("success", "failed"):
+            return job
+        if time.time() > deadline:
+            raise TimeoutError(f"Job still {job['status']} after {POLL_TIMEOUT_SECONDS}s")
+        print(f"   ⏳ {job['status']} ({job.get('current_step') or 'waiting'})...")
+        time.sleep(POLL_INTERVAL_SECONDS)
 
 
 def full_pipeline_example():
@@ -37,11 +59,17 @@ def full_pipeline_example():
         }
     )
 
-    if response.status_code != 200:
+    if response.status_code != 202:
         print(f"❌ Error: {response.json()}")
         return
 
-    result = response.json()
+    # The run is queued; poll its job until it's done
+    job = wait_for_job(response.json()["status_url"])
+    if job["status"] != "success":
+        print(f"❌ Error: {job['error']}")
+        return
+
+    result = job["result"]
 
     # 1. Show viral analysis
     print("=" * 60)
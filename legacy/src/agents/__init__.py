@@ -2,19 +2,26 @@
 JetSki Agents Package
 """
 
-from .transcript_agent import get_transcript, extract_video_id
+from .transcript_agent import get_transcript, fetch_transcript, extract_video_id, Transcript
 from .highlight_agent import find_viral_moments
 from .storyboard_agent import generate_storyboard
-from .image_agent import generate_comic_panels, save_panel_image
+from .image_agent import generate_comic_panels, save_panel_image, image_result_to_json, PanelImage
 from .doc_agent import DocAgent
+from .drive_uploader import DriveUploader, DriveUploadError
 
 __all__ = [
     "get_transcript",
+    "fetch_transcript",
+    "Transcript",
     "extract_video_id",
     "find_viral_moments",
     "generate_storyboard",
     "generate_comic_panels",
     "save_panel_image",
+    "image_result_to_json",
+    "PanelImage",
     "DocAgent",
+    "DriveUploader",
+    "DriveUploadError",
 ]
 
@@ -4,12 +4,10 @@ Doc Agent - Creates Google Docs summaries with captions and posting strategies
 
 import os
 import json
-from typing import Dict, List
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseUpload
-from io import BytesIO
-import base64
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from .google_clients import get_credentials, get_service, get_drive_uploader
 
 
 class DocAgent:
@@ -27,19 +25,33 @@ class DocAgent:
             credentials_path = os.getenv("GOOGLE_SERVICE_ACCOUNT_PATH")
 
         if credentials_path and os.path.exists(credentials_path):
-            self.credentials = service_account.Credentials.from_service_account_file(
-                credentials_path,
-                scopes=[
-                    'https://www.googleapis.com/auth/documents',
-                    'https://www.googleapis.com/auth/drive.file'
-                ]
-            )
-            self.docs_service = build('docs', 'v1', credentials=self.credentials)
-            self.drive_service = build('drive', 'v3', credentials=self.credentials)
+            # Credentials, services and connections are shared process-wide
+            self.credentials_path = credentials_path
+            self.credentials = get_credentials(credentials_path)
+            self.uploader = get_drive_uploader(credentials_path)
         else:
             print("⚠️  Warning: Google credentials not found. Doc Agent will work in preview mode.")
-            self.docs_service = None
-            self.drive_service = None
+            self.credentials_path = None
+            self.credentials = None
+            self.uploader = None
+
+    @contextmanager
+    def docs_service(self):
+        """Docs v1 service checked out from the shared pool (None in preview mode)"""
+        if self.credentials_path is None:
+            yield None
+            return
+        with get_service('docs', 'v1', self.credentials_path) as service:
+            yield service
+
+    @contextmanager
+    def drive_service(self):
+        """Drive v3 service checked out from the shared pool (None in preview mode)"""
+        if self.credentials_path is None:
+            yield None
+            return
+        with get_service('drive', 'v3', self.credentials_path) as service:
+            yield service
 
     def create_summary_doc(
         self,
@@ -62,6 +74,38 @@ class DocAgent:
         Returns:
             Dict with doc_url, drive_folder_url, and preview
         """
+        result = self.create_doc(video_url, video_title, viral_analysis, storyboard_data)
+        if result["status"] != "success":
+            return result
+
+        # Save images to Drive and get folder URL
+        folder_url = None
+        if image_data:
+            folder_url = self.upload_images_to_drive(
+                image_data=image_data,
+                folder_name=drive_folder_name(storyboard_data)
+            )
+            if folder_url:
+                print(f"📁 Images saved to Drive: {folder_url}")
+
+        return {**result, "drive_folder_url": folder_url}
+
+    def create_doc(
+        self,
+        video_url: str,
+        video_title: str,
+        viral_analysis: Dict,
+        storyboard_data: Dict
+    ) -> Dict:
+        """
+        Create the Google Doc and fill in its text (no Drive uploads).
+
+        Only needs the analysis and storyboard, so it can run while the
+        panels are still rendering.
+
+        Returns:
+            Dict with doc_url, doc_id and preview
+        """
         selected_segment = viral_analysis["segments"][viral_analysis["selected"]["rank"] - 1]
 
         # Build document content
@@ -76,44 +120,35 @@ class DocAgent:
             selection_reason=viral_analysis["selected"]["reason"]
         )
 
-        if self.docs_service is None:
-            # Preview mode - return markdown
-            return {
-                "doc_url": None,
-                "drive_folder_url": None,
-                "preview": doc_content,
-                "status": "preview_mode",
-                "message": "Google credentials not configured. Showing preview only."
-            }
+        with self.docs_service() as docs_service:
+            if docs_service is None:
+                # Preview mode - return markdown
+                return {
+                    "doc_url": None,
+                    "drive_folder_url": None,
+                    "preview": doc_content,
+                    "status": "preview_mode",
+                    "message": "Google credentials not configured. Showing preview only."
+                }
 
-        # Create Google Doc
-        doc = self.docs_service.documents().create(body={
-            'title': doc_title
-        }).execute()
+            # Create Google Doc
+            doc = docs_service.documents().create(body={
+                'title': doc_title
+            }).execute()
 
-        doc_id = doc.get('documentId')
+            doc_id = doc.get('documentId')
 
-        # Insert content into doc
-        self._insert_formatted_content(doc_id, doc_content)
-
-        # Save images to Drive and get folder URL
-        folder_url = None
-        if image_data:
-            folder_url = self.upload_images_to_drive(
-                image_data=image_data,
-                folder_name=f"JetSki - {storyboard_data.get('title', 'Comic')}"
-            )
+            # Insert content into doc
+            self._insert_formatted_content(docs_service, doc_id, doc_content)
 
         doc_url = f"https://docs.google.com/document/d/{doc_id}/edit"
 
         print(f"📄 Google Doc created: {doc_url}")
-        if folder_url:
-            print(f"📁 Images saved to Drive: {folder_url}")
 
         return {
             "doc_url": doc_url,
             "doc_id": doc_id,
-            "drive_folder_url": folder_url,
+            "drive_folder_url": None,
             "preview": doc_content,
             "status": "success"
         }
@@ -257,7 +292,7 @@ AI-powered video-to-comic content engine
 
         return content
 
-    def _insert_formatted_content(self, doc_id: str, content: str):
+    def _insert_formatted_content(self, docs_service, doc_id: str, content: str):
         """Insert formatted content into Google Doc"""
         requests = [
             {
@@ -268,69 +303,97 @@ AI-powered video-to-comic content engine
             }
         ]
 
-        self.docs_service.documents().batchUpdate(
+        docs_service.documents().batchUpdate(
             documentId=doc_id,
             body={'requests': requests}
         ).execute()
 
-    def upload_images_to_drive(self, image_data: List[Dict], folder_name: str = "JetSki Outputs") -> str:
+    def create_drive_folder(self, folder_name: str = "JetSki Outputs") -> Optional[Dict]:
         """
-        Upload generated comic panels to Google Drive.
+        Create a Drive folder for panel uploads.
 
-        Args:
-            image_data: List of panel images with base64 data
-            folder_name: Name of folder to create
+        Returns:
+            Dict with id and url, or None if Drive isn't configured
+        """
+        with self.drive_service() as drive_service:
+            if drive_service is None:
+                print("⚠️  Warning: Drive service not initialized")
+                return None
+
+            folder_metadata = {
+                'name': folder_name,
+                'mimeType': 'application/vnd.google-apps.folder'
+            }
+
+            folder = drive_service.files().create(
+                body=folder_metadata,
+                fields='id, webViewLink'
+            ).execute()
+
+        print(f"📁 Created Drive folder: {folder_name}")
+
+        return {"id": folder.get('id'), "url": folder.get('webViewLink')}
+
+    def upload_panel(self, folder_id: str, panel: Dict) -> Optional[str]:
+        """
+        Upload one generated panel into a Drive folder.
+
+        Safe to call from several threads at once; small panels go up in a
+        single multipart request, 429/5xx responses are retried with backoff.
 
         Returns:
-            str: Google Drive folder URL
+            str: webViewLink of the uploaded file (None if the panel has no image)
         """
-        if self.drive_service is None:
-            print("⚠️  Warning: Drive service not initialized")
+        image = panel.get("image")
+        if image is None or self.uploader is None:
             return None
 
-        # Create folder
-        folder_metadata = {
-            'name': folder_name,
-            'mimeType': 'application/vnd.google-apps.folder'
-        }
+        panel_num = panel.get("panel_number", "?")
 
-        folder = self.drive_service.files().create(
-            body=folder_metadata,
-            fields='id, webViewLink'
-        ).execute()
+        uploaded_file = self.uploader.upload(
+            name=f'Panel_{panel_num}{image.extension}',
+            data=image.data,
+            mime_type=image.mime_type,
+            parents=[folder_id]
+        )
 
-        folder_id = folder.get('id')
-        folder_url = folder.get('webViewLink')
+        print(f"  ✅ Uploaded Panel {panel_num}: {uploaded_file.get('webViewLink')}")
 
-        print(f"📁 Created Drive folder: {folder_name}")
+        return uploaded_file.get('webViewLink')
 
-        # Upload each panel
-        for panel in image_data:
-            if "image_base64" not in panel:
-                continue
+    def upload_images_to_drive(self, image_data: List[Dict], folder_name: str = "JetSki Outputs") -> str:
+        """
+        Upload generated comic panels to Google Drive.
 
-            panel_num = panel.get("panel_number", "?")
-            image_bytes = base64.b64decode(panel["image_base64"])
-            mime_type = panel.get("mime_type", "image/png")
+        Panels are uploaded concurrently (DRIVE_UPLOAD_WORKERS at a time).
 
-            file_metadata = {
-                'name': f'Panel_{panel_num}.png',
-                'parents': [folder_id]
-            }
+        Args:
+            image_data: List of panels from image_agent (raw PanelImage under "image")
+            folder_name: Name of folder to create
 
-            media = MediaIoBaseUpload(
-                BytesIO(image_bytes),
-                mimetype=mime_type,
-                resumable=True
-            )
+        Returns:
+            str: Google Drive folder URL
+        """
+        folder = self.create_drive_folder(folder_name)
+        if folder is None:
+            return None
 
-            uploaded_file = self.drive_service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id, webViewLink'
-            ).execute()
+        panels = [panel for panel in image_data if panel.get("image") is not None]
+        results = self.uploader.upload_many([
+            {
+                "name": f"Panel_{panel.get('panel_number', '?')}{panel['image'].extension}",
+                "data": panel["image"].data,
+                "mime_type": panel["image"].mime_type,
+                "parents": [folder["id"]]
+            }
+            for panel in panels
+        ])
+
+        uploaded = sum(1 for result in results if "error" not in result)
+        print(f"  ✅ Uploaded {uploaded}/{len(panels)} panels")
 
-            print(f"  ✅ Uploaded Panel {panel_num}: {uploaded_file.get('webViewLink')}")
+        return folder["url"]
 
-        return folder_url
 
+def drive_folder_name(storyboard_data: Dict) -> str:
+    return f"JetSki - {storyboard_data.get('title', 'Comic')}"
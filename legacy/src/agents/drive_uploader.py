@@ -0,0 +1,264 @@
+"""
+Drive Uploader - Concurrent Google Drive file uploads over plain HTTPS
+Small files go up in one multipart request; large ones use a resumable session.
+"""
+
+import os
+import json
+import time
+import random
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Point at a local stand-in for testing (see drive_standin.py)
+DRIVE_API_BASE_URL = os.getenv("DRIVE_API_BASE_URL", "https://www.googleapis.com")
+
+DRIVE_UPLOAD_WORKERS = int(os.getenv("DRIVE_UPLOAD_WORKERS", "4"))
+
+# Files up to this size are sent as a single multipart request (no session round trip)
+DRIVE_MULTIPART_THRESHOLD_BYTES = int(os.getenv("DRIVE_MULTIPART_THRESHOLD_BYTES", str(5 * 1024 * 1024)))
+
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", "5"))
+DRIVE_TIMEOUT_SECONDS = 60
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+# A multipart POST creates the file as it's processed, so only retry where
+# it provably wasn't: rejected up front, or never connected
+CREATE_RETRY_STATUSES = {429, 503}
+CREATE_RETRY_EXCEPTIONS = (requests.ConnectTimeout,)
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 32.0
+
+UPLOAD_FIELDS = "id,webViewLink"
+
+
+class DriveUploadError(Exception):
+    """Upload failed after all retries (or with a non-retryable status)"""
+
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class DriveUploader:
+    """
+    Bounded-concurrency uploader with exponential backoff.
+
+    Multipart uploads are retried only on 429/503 (a retry after anything
+    else could create a duplicate file); resumable uploads ask the session
+    how much it has and continue from there.
+    """
+
+    def __init__(
+        self,
+        token_provider: Callable[[], str],
+        base_url: str = DRIVE_API_BASE_URL,
+        max_workers: int = DRIVE_UPLOAD_WORKERS,
+        multipart_threshold: int = DRIVE_MULTIPART_THRESHOLD_BYTES,
+        max_retries: int = DRIVE_MAX_RETRIES,
+        session: requests.Session = None
+    ):
+        """
+        Args:
+            token_provider: Returns a valid OAuth access token (called per request)
+            base_url: Drive API root, e.g. https://www.googleapis.com
+            max_workers: Concurrent uploads for upload_many/submit
+            multipart_threshold: Largest size (bytes) sent as a multipart upload
+            max_retries: Retries per request on retryable statuses/connection errors
+        """
+        self.token_provider = token_provider
+        self.base_url = base_url.rstrip("/")
+        self.max_workers = max_workers
+        self.multipart_threshold = multipart_threshold
+        self.max_retries = max_retries
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+        self.session = session
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drive-upload")
+
+    def upload(self, name: str, data: bytes, mime_type: str, parents: List[str] = None) -> Dict:
+        """
+        Upload one file.
+
+        Returns:
+            dict: Drive file resource ({"id", "webViewLink"})
+        """
+        metadata = {"name": name}
+        if parents:
+            metadata["parents"] = parents
+
+        if len(data) <= self.multipart_threshold:
+            return self._multipart_upload(metadata, data, mime_type)
+        return self._resumable_upload(metadata, data, mime_type)
+
+    def submit(self, name: str, data: bytes, mime_type: str, parents: List[str] = None) -> Future:
+        """Queue an upload on the worker pool"""
+        return self._executor.submit(self.upload, name, data, mime_type, parents)
+
+    def upload_many(self, files: List[Dict]) -> List[Dict]:
+        """
+        Upload files concurrently ({"name", "data", "mime_type", "parents"} each).
+        Results keep the input order; a failed file yields {"error": ...}.
+        """
+        futures = [
+            self.submit(f["name"], f["data"], f.get("mime_type", "application/octet-stream"), f.get("parents"))
+            for f in files
+        ]
+
+        results = []
+        for f, future in zip(files, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"  ❌ Upload of {f['name']} failed: {str(e)}")
+                results.append({"name": f["name"], "error": str(e)})
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def _multipart_upload(self, metadata: Dict, data: bytes, mime_type: str) -> Dict:
+        boundary = f"jetski-{uuid.uuid4().hex}"
+        body = b"".join([
+            f"--{boundary}\r\n".encode(),
+            b"Content-Type: application/json; charset=UTF-8\r\n\r\n",
+            json.dumps(metadata).encode("utf-8"),
+            f"\r\n--{boundary}\r\nContent-Type: {mime_type}\r\n\r\n".encode(),
+            data,
+            f"\r\n--{boundary}--\r\n".encode()
+        ])
+
+        response = self._request(
+            "POST",
+            f"{self.base_url}/upload/drive/v3/files",
+            params={"uploadType": "multipart", "fields": UPLOAD_FIELDS},
+            headers={"Content-Type": f"multipart/related; boundary={boundary}"},
+            data=body,
+            retry_statuses=CREATE_RETRY_STATUSES,
+            retry_exceptions=CREATE_RETRY_EXCEPTIONS
+        )
+        return response.json()
+
+    def _resumable_upload(self, metadata: Dict, data: bytes, mime_type: str) -> Dict:
+        # Opening a session creates nothing, so it retries like any idempotent call
+        session_response = self._request(
+            "POST",
+            f"{self.base_url}/upload/drive/v3/files",
+            params={"uploadType": "resumable", "fields": UPLOAD_FIELDS},
+            headers={
+                "Content-Type": "application/json; charset=UTF-8",
+                "X-Upload-Content-Type": mime_type,
+                "X-Upload-Content-Length": str(len(data))
+            },
+            data=json.dumps(metadata)
+        )
+
+        upload_url = session_response.headers.get("Location")
+        if not upload_url:
+            raise DriveUploadError("Resumable upload session has no Location header")
+
+        total = len(data)
+        offset = 0
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                response = self._send("PUT", upload_url, headers={
+                    "Content-Type": mime_type,
+                    "Content-Length": str(total - offset),
+                    "Content-Range": f"bytes {offset}-{total - 1}/{total}" if total else f"bytes */{total}"
+                }, data=data[offset:], allow_redirects=False)
+            except RETRY_EXCEPTIONS as e:
+                error = f"Connection failed: {str(e)}"
+            else:
+                if response.status_code in (200, 201):
+                    return response.json()
+                if response.status_code != 308 and response.status_code not in RETRY_STATUSES:
+                    raise DriveUploadError(
+                        f"Drive API returned {response.status_code}: {response.text[:200]}",
+                        status_code=response.status_code
+                    )
+                error = f"Drive API returned {response.status_code}"
+                retry_after = response.headers.get("Retry-After")
+
+            if attempt == self.max_retries:
+                raise DriveUploadError(f"Resumable upload incomplete after retries: {error}")
+            time.sleep(self._backoff(attempt, retry_after))
+
+            # Ask the session what it already has and continue from there
+            status = self._request("PUT", upload_url, headers={
+                "Content-Length": "0",
+                "Content-Range": f"bytes */{total}"
+            }, allow_redirects=False)
+            if status.status_code in (200, 201):
+                return status.json()
+            offset = self._committed_bytes(status)
+
+        raise DriveUploadError("Retries exhausted")
+
+    @staticmethod
+    def _committed_bytes(response: requests.Response) -> int:
+        """Bytes the session has stored, from a 308's Range header ("bytes=0-N")"""
+        committed = response.headers.get("Range")
+        if not committed:
+            return 0
+        try:
+            return int(committed.rsplit("-", 1)[1]) + 1
+        except (IndexError, ValueError):
+            return 0
+
+    def _send(self, method: str, url: str, headers: Dict = None, **kwargs) -> requests.Response:
+        request_headers = {**(headers or {}), "Authorization": f"Bearer {self.token_provider()}"}
+        return self.session.request(method, url, headers=request_headers, timeout=DRIVE_TIMEOUT_SECONDS, **kwargs)
+
+    def _request(self, method: str, url: str, headers: Dict = None,
+                 retry_statuses=RETRY_STATUSES, retry_exceptions=RETRY_EXCEPTIONS,
+                 **kwargs) -> requests.Response:
+        """
+        Send a request, retrying with exponential backoff.
+
+        The defaults (429/5xx, connection errors, timeouts) are for idempotent
+        calls; pass narrower sets for requests that create something.
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._send(method, url, headers=headers, **kwargs)
+            except retry_exceptions as e:
+                if attempt == self.max_retries:
+                    raise DriveUploadError(f"Connection failed: {str(e)}")
+                time.sleep(self._backoff(attempt))
+                continue
+            except requests.RequestException as e:
+                raise DriveUploadError(f"Request failed: {str(e)}")
+
+            if response.status_code < 400:
+                return response
+
+            if response.status_code not in retry_statuses or attempt == self.max_retries:
+                raise DriveUploadError(
+                    f"Drive API returned {response.status_code}: {response.text[:200]}",
+                    status_code=response.status_code
+                )
+
+            time.sleep(self._backoff(attempt, response.headers.get("Retry-After")))
+
+        raise DriveUploadError("Retries exhausted")
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str] = None) -> float:
+        """Retry-After if the server sent one, else 2^attempt * base with full jitter"""
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX_SECONDS)
+            except ValueError:
+                pass
+        return random.uniform(0, min(BACKOFF_BASE_SECONDS * (2 ** attempt), BACKOFF_MAX_SECONDS))
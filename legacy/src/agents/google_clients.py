@@ -0,0 +1,148 @@
+"""
+Google Clients - Process-wide credentials, API services and HTTP connections
+Shared by every DocAgent so a request doesn't re-read the service account
+file, re-parse discovery documents or open new TLS connections.
+"""
+
+import os
+import json
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import httplib2
+import google_auth_httplib2
+from google.oauth2 import service_account
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from .drive_uploader import DriveUploader
+
+GOOGLE_SCOPES = [
+    'https://www.googleapis.com/auth/documents',
+    'https://www.googleapis.com/auth/drive.file'
+]
+
+# Refresh the access token this long before it expires, so no request stalls on a refresh
+TOKEN_REFRESH_MARGIN_SECONDS = int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN_SECONDS", "300"))
+GOOGLE_HTTP_TIMEOUT_SECONDS = int(os.getenv("GOOGLE_HTTP_TIMEOUT_SECONDS", "60"))
+
+_lock = threading.Lock()
+_credentials: Dict[str, service_account.Credentials] = {}
+_refresh_locks: Dict[str, threading.Lock] = {}
+_discovery_docs: Dict[tuple, dict] = {}
+_uploaders: Dict[str, DriveUploader] = {}
+
+# httplib2.Http (and so every discovery service) is not thread-safe: idle
+# services (each with its own keep-alive connection) wait here per API and
+# are checked out by one thread at a time, whichever thread that is
+_idle_services: Dict[tuple, List] = {}
+
+
+def get_credentials(credentials_path: str) -> service_account.Credentials:
+    """Service account credentials, loaded once per file"""
+    with _lock:
+        credentials = _credentials.get(credentials_path)
+        if credentials is None:
+            credentials = service_account.Credentials.from_service_account_file(
+                credentials_path, scopes=GOOGLE_SCOPES
+            )
+            _credentials[credentials_path] = credentials
+            _refresh_locks[credentials_path] = threading.Lock()
+        return credentials
+
+
+def _needs_refresh(credentials) -> bool:
+    if not credentials.token or credentials.expiry is None:
+        return True
+    # google-auth keeps expiry as naive UTC
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    remaining = credentials.expiry - now
+    return remaining.total_seconds() < TOKEN_REFRESH_MARGIN_SECONDS
+
+
+def get_access_token(credentials_path: str) -> str:
+    """Valid access token, refreshed ahead of expiry (one refresh at a time)"""
+    credentials = get_credentials(credentials_path)
+    if _needs_refresh(credentials):
+        with _refresh_locks[credentials_path]:
+            if _needs_refresh(credentials):
+                credentials.refresh(Request())
+    return credentials.token
+
+
+def _discovery_doc(api: str, version: str) -> dict:
+    """Static discovery document bundled with google-api-python-client, parsed once"""
+    with _lock:
+        doc = _discovery_docs.get((api, version))
+        if doc is None:
+            raw = get_static_doc(api, version)
+            if raw is None:
+                raise ValueError(f"No static discovery document for {api} {version}")
+            doc = json.loads(raw)
+            _discovery_docs[(api, version)] = doc
+        return doc
+
+
+def _build_service(api: str, version: str, credentials_path: str):
+    """Discovery-based service on its own keep-alive AuthorizedHttp"""
+    http = google_auth_httplib2.AuthorizedHttp(
+        get_credentials(credentials_path),
+        http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT_SECONDS)
+    )
+    return build_from_document(_discovery_doc(api, version), http=http)
+
+
+@contextmanager
+def get_service(api: str, version: str, credentials_path: str):
+    """
+    Check out a service for the duration of the with block.
+
+    An idle service (and its open connection) is reused if there is one,
+    otherwise a new one is built from the static discovery document. It goes
+    back to the pool afterwards, so short-lived worker threads share the
+    same warm connections.
+    """
+    # Keep the shared token fresh so AuthorizedHttp never refreshes on its own
+    get_access_token(credentials_path)
+
+    key = (api, version, credentials_path)
+    with _lock:
+        idle = _idle_services.setdefault(key, [])
+        service = idle.pop() if idle else None
+    if service is None:
+        service = _build_service(api, version, credentials_path)
+
+    # Not returned if the block raises: its connection may be in a bad state
+    yield service
+
+    with _lock:
+        _idle_services.setdefault(key, []).append(service)
+
+
+def get_drive_uploader(credentials_path: str) -> DriveUploader:
+    """Shared Drive uploader (one worker pool and connection pool per process)"""
+    with _lock:
+        uploader = _uploaders.get(credentials_path)
+        if uploader is None:
+            uploader = DriveUploader(lambda: get_access_token(credentials_path))
+            _uploaders[credentials_path] = uploader
+        return uploader
+
+
+def reset_clients(credentials_path: Optional[str] = None):
+    """Drop cached clients and idle services - used to measure cold starts"""
+    with _lock:
+        paths = [credentials_path] if credentials_path else list(_credentials)
+        for path in paths:
+            _credentials.pop(path, None)
+            _refresh_locks.pop(path, None)
+            uploader = _uploaders.pop(path, None)
+            if uploader:
+                uploader.close()
+        for key in [key for key in _idle_services if key[2] in paths]:
+            del _idle_services[key]
+        if credentials_path is None:
+            _discovery_docs.clear()
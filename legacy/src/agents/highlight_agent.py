@@ -1,79 +1,343 @@
 import os
 import json
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from .transcript_agent import Transcript, parse_timestamp
+from .rate_limiter import get_limiter
+from .prerank import prerank_available, condense_transcript
+from .prompt_builder import Prompt, normalize_transcript, prompt_stats, carry_prompt_run
+
 # Load environment variables from root directory
 root_dir = Path(__file__).parent.parent.parent
 load_dotenv(dotenv_path=root_dir / ".env")
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are left to the shared rate limiter so it sees every 429
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+MODEL = "gpt-4o-mini"
+limiter = get_limiter("openai", MODEL)
+
+# Output budget reserved per call on top of the prompt
+RESPONSE_TOKENS = 1000
+
+# Chunked (map-reduce) mode for long transcripts
+HIGHLIGHT_CHUNK_TOKENS = int(os.getenv("HIGHLIGHT_CHUNK_TOKENS", "12000"))
+HIGHLIGHT_CHUNK_OVERLAP_TOKENS = int(os.getenv("HIGHLIGHT_CHUNK_OVERLAP_TOKENS", "800"))
+HIGHLIGHT_CONCURRENCY = int(os.getenv("HIGHLIGHT_CONCURRENCY", "4"))
+
+# Longer timed transcripts are pre-ranked locally and only the top windows are sent
+PRERANK_MIN_TOKENS = int(os.getenv("PRERANK_MIN_TOKENS", "6000"))
+
+# Rough English average; good enough for budgeting without a tokenizer dependency
+CHARS_PER_TOKEN = 4
+
+# Static instruction blocks: sent first and byte-identical on every request so
+# provider-side prompt caching can reuse them - keep request data out of these.
+# OpenAI only caches prefixes of 1024+ tokens, so VIRAL_INSTRUCTIONS carries the
+# fixed schema, rules and examples (REDUCE_INSTRUCTIONS is too short to cache)
+VIRAL_INSTRUCTIONS = """You are a viral content strategist. Analyze the transcript and identify the TOP 3 potential viral segments.
+
+Return ONLY valid JSON in this exact format:
+{
+    "segments": [
+        {
+            "rank": 1,
+            "score": 95,
+            "start_time": "8:45",
+            "end_time": "11:15",
+            "viral_type": "emotional quote",
+            "hook": "The disease of the heart line",
+            "summary": "Historical quote about greed and colonialism that sparks deep conversation",
+            "transcript_excerpt": "We suffer from a disease of the heart that can only be cured by gold..."
+        },
+        {
+            "rank": 2,
+            "score": 82,
+            "start_time": "21:15",
+            "end_time": "23:45",
+            "viral_type": "economics insight",
+            "hook": "Gold standard explained simply",
+            "summary": "Breakdown of how gold connects to economics and crypto",
+            "transcript_excerpt": "..."
+        },
+        {
+            "rank": 3,
+            "score": 75,
+            "start_time": "45:30",
+            "end_time": "47:00",
+            "viral_type": "humor",
+            "hook": "Crypto bro meets historian",
+            "summary": "Funny exchange about modern vs historical perspectives",
+            "transcript_excerpt": "..."
+        }
+    ],
+    "selected": {
+        "rank": 1,
+        "reason": "Highest viral potential - combines emotion, history, and quotable moment"
+    }
+}
+
+Score from 0-100 based on:
+- Emotional impact (quotable lines, dramatic moments)
+- Novelty (unique insights, surprising facts)
+- Visual potential (easy to illustrate in comic form)
+- Shareability (would people post this?)
+
+SCORING GUIDE:
+- 90-100: a standalone moment people would quote or share without any context
+- 75-89: strong and clear, but needs a sentence of setup to land
+- 50-74: interesting to existing fans of the speaker, weak for a cold audience
+- Below 50: filler, housekeeping or sponsor reads - only return these if nothing better exists
+Scores must be strictly decreasing by rank; never give two segments the same score.
+
+FIELD RULES:
+- "rank": 1, 2 and 3, best first
+- "start_time" / "end_time": "m:ss" or "h:mm:ss"; end_time is after start_time
+- A segment should run between 30 seconds and 3 minutes - long enough to tell a story, short enough for one comic
+- "viral_type": a short lowercase label, e.g. "emotional quote", "surprising fact", "humor",
+  "hot take", "story", "life advice", "debate", "confession", "economics insight"
+- "hook": at most 8 words, written as a headline, no hashtags or emojis
+- "summary": one sentence saying what happens and why it works
+- "transcript_excerpt": the key lines copied from the transcript (no paraphrasing), at most 60 words;
+  use "..." where you skip text
+
+CHOOSING SEGMENTS:
+- The three segments must not overlap in time and should cover different ideas
+- Prefer moments with a clear speaker, a clear claim or punchline and a concrete image
+  (a place, an object, an action) - they turn into better comic panels
+- Prefer self-contained moments over ones that depend on earlier parts of the video
+- Skip intros, outros, calls to subscribe, sponsor segments and ad reads
+- Do not invent quotes, names or facts that are not in the transcript
+- Audience reactions such as [Laughter] or [Applause] are a good signal of a strong moment
+
+WHAT MAKES A STRONG MOMENT (examples):
+- Strong: "I was fired on a Friday and by Monday I had started the company that replaced them."
+  (a turn of events, a clear before/after, easy to draw)
+- Strong: "Every empire in history has died of the same disease - and it was never the enemy at the gates."
+  (a bold, quotable claim that invites replies)
+- Strong: a guest laughing so hard they can't finish the sentence, followed by [Laughter]
+  (a visible emotion the audience can feel)
+- Weak: "So yeah, that's basically what we talked about last week, link in the description."
+  (housekeeping, no idea of its own)
+- Weak: a long list of statistics with no story or speaker reaction around it
+  (informative but hard to illustrate and rarely shared)
+- Weak: an inside joke that only makes sense to people who watched the previous episode
+
+TIMING:
+- Start a segment at the first line a new viewer needs, not in the middle of a sentence
+- End it right after the payoff line; don't run on into the next topic
+- If there are no timestamps, estimate from the position in the transcript and keep the format
+
+"selected" is the segment that will become the comic: usually rank 1, but pick a lower rank
+if rank 1 would be hard to illustrate. "reason" is one sentence.
+
+If the transcript contains [m:ss] markers, use them for start_time/end_time.
+The transcript may be a set of excerpts separated by "..." - only pick moments from the text given.
+If the transcript is shorter than three good moments, still return three segments, ranked honestly."""
+
+REDUCE_INSTRUCTIONS = """You are a viral content strategist. Below are candidate viral segments found in
+different (overlapping) parts of one long transcript. Pick the TOP 3 overall.
 
-def find_viral_moments(transcript: str):
+- Merge near-duplicates (the same moment found in two overlapping parts)
+- Copy the chosen segments' fields verbatim, only re-assign "rank" (1-3) and adjust "score" if needed
+- Pick the single best one for comic generation in "selected"
+
+Return ONLY valid JSON in this exact format:
+{
+    "segments": [ { "rank": 1, "score": 95, "start_time": "...", "end_time": "...", "viral_type": "...",
+                    "hook": "...", "summary": "...", "transcript_excerpt": "..." } ],
+    "selected": { "rank": 1, "reason": "..." }
+}"""
+
+
+def transcript_prompt_text(transcript) -> str:
+    """Prompt text for a transcript: [m:ss] markers when timing is known"""
+    if isinstance(transcript, Transcript):
+        return transcript.timestamped_text()
+    return transcript
+
+
+def build_viral_prompt(transcript) -> Prompt:
     """
-    Analyzes transcript and identifies 3 potential viral segments.
-    Returns the TOP viral moment auto-selected for comic generation.
+    Builds the viral-moment analysis prompt for a transcript (str or Transcript).
+    The transcript is normalized (caption noise and filler removed) first.
     """
-    prompt = f"""
-    You are a viral content strategist. Analyze the transcript and identify the TOP 3 potential viral segments.
-
-    Return ONLY valid JSON in this exact format:
-    {{
-        "segments": [
-            {{
-                "rank": 1,
-                "score": 95,
-                "start_time": "8:45",
-                "end_time": "11:15",
-                "viral_type": "emotional quote",
-                "hook": "The disease of the heart line",
-                "summary": "Historical quote about greed and colonialism that sparks deep conversation",
-                "transcript_excerpt": "We suffer from a disease of the heart that can only be cured by gold..."
-            }},
-            {{
-                "rank": 2,
-                "score": 82,
-                "start_time": "21:15",
-                "end_time": "23:45",
-                "viral_type": "economics insight",
-                "hook": "Gold standard explained simply",
-                "summary": "Breakdown of how gold connects to economics and crypto",
-                "transcript_excerpt": "..."
-            }},
-            {{
-                "rank": 3,
-                "score": 75,
-                "start_time": "45:30",
-                "end_time": "47:00",
-                "viral_type": "humor",
-                "hook": "Crypto bro meets historian",
-                "summary": "Funny exchange about modern vs historical perspectives",
-                "transcript_excerpt": "..."
-            }}
-        ],
-        "selected": {{
-            "rank": 1,
-            "reason": "Highest viral potential - combines emotion, history, and quotable moment"
-        }}
-    }}
-
-    Score from 0-100 based on:
-    - Emotional impact (quotable lines, dramatic moments)
-    - Novelty (unique insights, surprising facts)
-    - Visual potential (easy to illustrate in comic form)
-    - Shareability (would people post this?)
-
-    Transcript:
-    {transcript}
+    transcript = transcript_prompt_text(transcript)
+    return Prompt(
+        "viral_analysis", VIRAL_INSTRUCTIONS,
+        f"Transcript:\n{normalize_transcript(transcript)}",
+        raw_dynamic=f"Transcript:\n{transcript}"
+    )
+
+
+def build_reduce_prompt(candidates: list) -> Prompt:
+    """
+    Builds the reduce prompt that picks the global top 3 from per-chunk candidates.
+    """
+    return Prompt("viral_reduce", REDUCE_INSTRUCTIONS, f"Candidates:\n{json.dumps(candidates, ensure_ascii=False)}")
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def split_transcript(transcript: str, chunk_tokens: int = HIGHLIGHT_CHUNK_TOKENS,
+                     overlap_tokens: int = HIGHLIGHT_CHUNK_OVERLAP_TOKENS) -> list:
+    """
+    Splits a transcript into overlapping windows of about chunk_tokens each,
+    on word boundaries, so moments near a boundary appear whole in one window.
     """
+    chunk_chars = chunk_tokens * CHARS_PER_TOKEN
+    step_chars = max(chunk_chars - overlap_tokens * CHARS_PER_TOKEN, 1)
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"}
+    chunks = []
+    start = 0
+    while start < len(transcript):
+        end = min(start + chunk_chars, len(transcript))
+        if end < len(transcript):
+            # Don't cut a word in half
+            space = transcript.rfind(" ", start, end)
+            end = space if space > start else end
+        chunks.append(transcript[start:end].strip())
+        if end >= len(transcript):
+            break
+        next_start = start + step_chars
+        space = transcript.find(" ", next_start)
+        start = space + 1 if 0 <= space < end else next_start
+
+    return [chunk for chunk in chunks if chunk]
+
+
+def _complete_json(prompt: Prompt) -> dict:
+    response = limiter.call(
+        client.chat.completions.create,
+        model=MODEL,
+        messages=prompt.messages,
+        response_format={"type": "json_object"},
+        tokens=estimate_tokens(prompt.text) + RESPONSE_TOKENS,
+        usage=lambda response: response.usage.total_tokens
     )
+    prompt_stats.record(prompt, response.usage)
+    return json.loads(response.choices[0].message.content)
+
+
+def _score_chunk(chunk: str, index: int, total: int) -> list:
+    """Map step: candidate segments for one window ([] if the call fails)"""
+    try:
+        result = _complete_json(build_viral_prompt(chunk))
+        print(f"  ✅ Chunk {index + 1}/{total}: {len(result.get('segments', []))} candidates")
+        return result.get("segments", [])
+    except Exception as e:
+        print(f"  ⚠️  Chunk {index + 1}/{total} failed: {str(e)}")
+        return []
+
+
+def _rank_locally(candidates: list) -> dict:
+    """Fallback reduce: top 3 by score, best one selected"""
+    top = sorted(candidates, key=lambda seg: seg.get("score", 0), reverse=True)[:3]
+    segments = [{**seg, "rank": rank} for rank, seg in enumerate(top, 1)]
+    return {
+        "segments": segments,
+        "selected": {"rank": 1, "reason": "Highest viral score across all transcript sections"}
+    }
+
+
+def _is_valid_result(result: dict) -> bool:
+    segments = result.get("segments") or []
+    selected = result.get("selected") or {}
+    return bool(segments) and 1 <= selected.get("rank", 0) <= len(segments)
+
+
+def find_viral_moments_chunked(transcript: str, chunk_tokens: int = HIGHLIGHT_CHUNK_TOKENS,
+                               overlap_tokens: int = HIGHLIGHT_CHUNK_OVERLAP_TOKENS,
+                               max_workers: int = HIGHLIGHT_CONCURRENCY) -> dict:
+    """
+    Map-reduce viral moment detection for long transcripts.
+
+    Map: each overlapping window is scored concurrently (same prompt as the
+    single-shot mode). Reduce: a small prompt over the candidates only picks
+    the global top 3. A failed chunk is skipped instead of failing the request.
+
+    Returns the same {"segments": [...], "selected": {...}} schema.
+    """
+    chunks = split_transcript(transcript, chunk_tokens, overlap_tokens)
+    print(f"🔀 Chunked analysis: {len(chunks)} windows of ~{chunk_tokens} tokens")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+        results = list(pool.map(carry_prompt_run(_score_chunk), chunks, range(len(chunks)), [len(chunks)] * len(chunks)))
+
+    candidates = [segment for segments in results for segment in segments]
+    if not candidates:
+        raise ValueError("No viral candidates found in any transcript chunk")
+
+    if len(results) == 1:
+        return _rank_locally(candidates)
 
-    result = json.loads(response.choices[0].message.content)
+    try:
+        result = _complete_json(build_reduce_prompt(candidates))
+        if _is_valid_result(result):
+            return result
+        print("  ⚠️  Reduce step returned an invalid result, ranking locally")
+    except Exception as e:
+        print(f"  ⚠️  Reduce step failed ({str(e)}), ranking locally")
+
+    return _rank_locally(candidates)
+
+
+def attach_source_text(result: dict, transcript: Transcript) -> dict:
+    """
+    Adds start_seconds/end_seconds and the exact spoken text (source_text)
+    to each segment, sliced locally from the timed transcript.
+    """
+    for segment in result.get("segments", []):
+        start = parse_timestamp(segment.get("start_time", ""))
+        end = parse_timestamp(segment.get("end_time", ""))
+        if start is None or end is None or end < start:
+            continue
+        segment["start_seconds"] = start
+        segment["end_seconds"] = end
+        segment["source_text"] = transcript.slice_time(start, end)
     return result
 
+
+def find_viral_moments(transcript, chunked: bool = None, prerank: bool = None):
+    """
+    Analyzes transcript and identifies 3 potential viral segments.
+    Returns the TOP viral moment auto-selected for comic generation.
+
+    Accepts plain text or a timed Transcript; with a Transcript the model
+    sees real [m:ss] markers and each segment gets its exact source_text.
+
+    Timed transcripts longer than PRERANK_MIN_TOKENS are pre-ranked locally
+    (see prerank.py, needs numpy) and only the top windows are sent, with
+    their real [m:ss] markers; pass prerank=True/False to force it.
+
+    Transcripts longer than HIGHLIGHT_CHUNK_TOKENS go through the chunked
+    map-reduce mode automatically; pass chunked=True/False to force a mode.
+    """
+    prompt_text = transcript_prompt_text(transcript)
+
+    if prerank is None:
+        prerank = prerank_available() and isinstance(transcript, Transcript) \
+            and estimate_tokens(prompt_text) > PRERANK_MIN_TOKENS
+    if prerank:
+        condensed = condense_transcript(transcript)
+        if condensed:
+            print(f"✂️  Pre-ranked transcript: ~{estimate_tokens(condensed)} of "
+                  f"~{estimate_tokens(prompt_text)} tokens sent")
+            prompt_text = condensed
+
+    if chunked is None:
+        chunked = estimate_tokens(prompt_text) > HIGHLIGHT_CHUNK_TOKENS
+
+    if chunked:
+        result = find_viral_moments_chunked(prompt_text)
+    else:
+        result = _complete_json(build_viral_prompt(prompt_text))
+
+    if isinstance(transcript, Transcript):
+        attach_source_text(result, transcript)
+    return result
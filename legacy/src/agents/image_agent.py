@@ -4,41 +4,73 @@ from google import genai
 from PIL import Image
 from io import BytesIO
 import base64
+import time
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Initialize Google Gemini client
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+from .rate_limiter import get_limiter
+from .render_cache import get_render_cache, render_key
 
-def generate_comic_panels(storyboard_data: dict):
+# Concurrency cap and per-call timeout for panel rendering
+IMAGE_MAX_WORKERS = int(os.getenv("IMAGE_MAX_WORKERS", "3"))
+IMAGE_TIMEOUT_SECONDS = float(os.getenv("IMAGE_TIMEOUT_SECONDS", "120"))
+
+# Initialize Google Gemini client (timeout is applied to every HTTP call, in ms)
+client = genai.Client(
+    api_key=os.getenv("GOOGLE_API_KEY"),
+    http_options={"timeout": int(IMAGE_TIMEOUT_SECONDS * 1000)}
+)
+
+MODEL = "gemini-2.5-flash-image"
+limiter = get_limiter("gemini", MODEL)
+
+# generate_content config; part of the render cache key, so anything that
+# changes the output must go through here
+GENERATION_CONFIG: dict = {}
+
+
+class PanelImage:
     """
-    Generates 6 comic panel images using Google Gemini 2.5 Flash Image (NanoBanana).
-    Uses manga/vintage comic book hybrid style with retro halftone textures.
-    Maintains character consistency across all panels.
+    Raw bytes of one rendered panel, held once and passed around by reference.
 
-    Returns list of image data (base64 encoded) for each panel.
+    Writers (Drive, disk, blob store) take the bytes or a memoryview directly;
+    base64 is only produced at the HTTP boundary when a client asks for
+    inline images.
     """
-    panels = storyboard_data.get("panels", [])
-    style = storyboard_data.get("style", "manga-vintage")
-    title = storyboard_data.get("title", "Comic Story")
 
-    generated_images = []
+    __slots__ = ("data", "mime_type")
 
-    # Extract character details from first panel for consistency
-    character_reference = panels[0].get("character_details", "") if panels else ""
+    def __init__(self, data: bytes, mime_type: str = "image/png"):
+        self.data = data
+        self.mime_type = mime_type or "image/png"
 
-    print(f"🎨 Generating comic panels for: {title}")
-    print(f"📐 Style: {style}")
+    @property
+    def size(self) -> int:
+        return len(self.data)
 
-    for i, panel in enumerate(panels):
-        panel_num = panel.get("panel_number", i + 1)
-        scene = panel.get("scene_description", "")
-        character = panel.get("character_details", character_reference)
-        action = panel.get("action", "")
-        caption = panel.get("caption", "")
-        visual_style = panel.get("visual_style", "")
-        composition = panel.get("composition", "wide shot")
+    @property
+    def extension(self) -> str:
+        return mimetypes.guess_extension(self.mime_type) or ".png"
 
-        # Build comprehensive prompt for NanoBanana with manga/vintage style
-        prompt = f"""
+    def view(self) -> memoryview:
+        return memoryview(self.data)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode('utf-8')
+
+
+def build_panel_prompt(panel: dict, panel_num: int, character_reference: str) -> str:
+    """
+    Builds the NanoBanana prompt for a single panel (manga/vintage style).
+    """
+    scene = panel.get("scene_description", "")
+    character = panel.get("character_details", character_reference)
+    action = panel.get("action", "")
+    caption = panel.get("caption", "")
+    visual_style = panel.get("visual_style", "")
+    composition = panel.get("composition", "wide shot")
+
+    return f"""
 A single comic book panel in a hybrid manga and vintage comic book style.
 
 STYLE REQUIREMENTS:
@@ -64,75 +96,246 @@ This is panel {panel_num} of 6 in a sequential story. Maintain visual continuity
 Professional illustration quality suitable for social media sharing.
 """
 
-        try:
-            print(f"  → Generating Panel {panel_num}/6...")
-
-            response = client.models.generate_content(
-                model="gemini-2.5-flash-image",
-                contents=prompt
-            )
-
-            # Extract image from response
-            # Note: Gemini returns image in response.parts
-            if response.parts:
-                for part in response.parts:
-                    if hasattr(part, 'inline_data'):
-                        # Image is returned as inline data
-                        image_data = part.inline_data.data
-                        mime_type = part.inline_data.mime_type
-
-                        generated_images.append({
-                            "panel_number": panel_num,
-                            "caption": caption,
-                            "image_base64": base64.b64encode(image_data).decode('utf-8'),
-                            "mime_type": mime_type,
-                            "prompt_used": prompt
-                        })
-
-                        print(f"  ✅ Panel {panel_num} generated successfully")
-                        break
-            else:
-                print(f"  ⚠️  Panel {panel_num} - No image returned")
-                generated_images.append({
-                    "panel_number": panel_num,
-                    "caption": caption,
-                    "error": "No image data received from API"
-                })
 
-        except Exception as e:
-            print(f"  ❌ Panel {panel_num} failed: {str(e)}")
-            generated_images.append({
+def render_panel(panel_num: int, caption: str, prompt: str) -> dict:
+    """
+    Renders a single panel with Gemini. Never raises - failures are
+    returned as an error entry so one bad panel doesn't sink the comic.
+
+    Renders are memoized on disk by prompt + model + GENERATION_CONFIG
+    (see render_cache.py); a hit makes no API call and is marked "cached".
+    """
+    start = time.time()
+    cache = get_render_cache()
+    key = render_key(prompt, MODEL, GENERATION_CONFIG) if cache else None
+    try:
+        cached = cache.get(key) if cache else None
+        if cached:
+            print(f"  ♻️  Panel {panel_num} served from render cache")
+            return {
                 "panel_number": panel_num,
                 "caption": caption,
-                "error": str(e)
-            })
+                "image": PanelImage(*cached),
+                "mime_type": cached[1],
+                "prompt_used": prompt,
+                "cached": True,
+                "latency_seconds": time.time() - start
+            }
+
+        print(f"  → Generating Panel {panel_num}/6...")
+
+        response = limiter.call(
+            client.models.generate_content,
+            model=MODEL,
+            contents=prompt,
+            config=GENERATION_CONFIG or None
+        )
+
+        # Extract image from response
+        # Note: Gemini returns image in response.parts (text parts have no inline_data)
+        for part in response.parts or []:
+            inline_data = getattr(part, 'inline_data', None)
+            if inline_data:
+                print(f"  ✅ Panel {panel_num} generated successfully")
+                image = PanelImage(inline_data.data, inline_data.mime_type)
+                if cache:
+                    cache.put(key, image.data, image.mime_type)
+                return {
+                    "panel_number": panel_num,
+                    "caption": caption,
+                    "image": image,
+                    "mime_type": image.mime_type,
+                    "prompt_used": prompt,
+                    "cached": False,
+                    "latency_seconds": time.time() - start
+                }
+
+        print(f"  ⚠️  Panel {panel_num} - No image returned")
+        return {
+            "panel_number": panel_num,
+            "caption": caption,
+            "error": "No image data received from API",
+            "latency_seconds": time.time() - start
+        }
+
+    except Exception as e:
+        print(f"  ❌ Panel {panel_num} failed: {str(e)}")
+        return {
+            "panel_number": panel_num,
+            "caption": caption,
+            "error": str(e),
+            "latency_seconds": time.time() - start
+        }
+
+
+class PanelRenderer:
+    """
+    Renders panels on a bounded pool as they become available.
+
+    submit() can be called while the storyboard is still being written
+    (see storyboard_agent.generate_storyboard(on_panel=...)); finish()
+    submits whatever wasn't submitted yet, waits for every panel and
+    returns the generate_comic_panels() result.
+    """
+
+    def __init__(self, max_workers: int = None, stage=None):
+        """
+        Args:
+            max_workers: Panels rendered at once (default IMAGE_MAX_WORKERS)
+            stage: Optional fn() -> context manager held around each render,
+                early ones included (e.g. the pipeline's Gemini stage slot)
+        """
+        self.max_workers = max(1, max_workers or IMAGE_MAX_WORKERS)
+        self.stage = stage
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="panel")
+        self._futures = {}
+        self._submitted = set()
+        self.character_reference = ""
+        self.start = None
+
+    def submit(self, panel: dict, index: int):
+        """Start rendering the panel at storyboard position `index` (once)"""
+        if index in self._submitted:
+            return
+        if self.start is None:
+            self.start = time.time()
+        if index == 0:
+            # Extract character details from first panel for consistency
+            self.character_reference = panel.get("character_details", "")
+
+        panel_num = panel.get("panel_number", index + 1)
+        prompt = build_panel_prompt(panel, panel_num, self.character_reference)
+        self._futures[self._pool.submit(self._render, panel_num, panel.get("caption", ""), prompt)] = index
+        self._submitted.add(index)
+
+    def _render(self, panel_num: int, caption: str, prompt: str) -> dict:
+        if self.stage is None:
+            return render_panel(panel_num, caption, prompt)
+        with self.stage():
+            return render_panel(panel_num, caption, prompt)
+
+    def finish(self, storyboard_data: dict, on_panel=None) -> dict:
+        panels = storyboard_data.get("panels", [])
+        title = storyboard_data.get("title", "Comic Story")
+        style = storyboard_data.get("style", "manga-vintage")
+
+        if self.start is None:
+            self.start = time.time()
+        early = len(self._submitted)
+        for i, panel in enumerate(panels):
+            self.submit(panel, i)
+
+        print(f"🎨 Generating comic panels for: {title}")
+        print(f"📐 Style: {style} ({self.max_workers} concurrent, {early} started while the storyboard streamed)")
 
-    result = {
-        "title": title,
-        "style": style,
-        "total_panels": len(panels),
-        "generated_panels": generated_images,
-        "success_count": sum(1 for img in generated_images if "image_base64" in img)
-    }
+        generated_images = [None] * len(panels)
+        try:
+            # Slot results by storyboard index to keep panel order stable
+            for future in as_completed(self._futures):
+                panel_result = future.result()
+                index = self._futures[future]
+                if index >= len(panels):
+                    continue
+                generated_images[index] = panel_result
+                if on_panel is not None:
+                    try:
+                        on_panel(panel_result)
+                    except Exception as e:
+                        print(f"  ⚠️  Panel {panel_result['panel_number']} callback failed: {str(e)}")
+        finally:
+            self._pool.shutdown(wait=False)
+
+        result = {
+            "title": title,
+            "style": style,
+            "total_panels": len(panels),
+            "generated_panels": generated_images,
+            "success_count": sum(1 for img in generated_images if "image" in img),
+            "cache_hits": sum(1 for img in generated_images if img.get("cached")),
+            "panel_latencies": [
+                {
+                    "panel_number": img["panel_number"],
+                    "latency_seconds": img["latency_seconds"],
+                    "success": "image" in img,
+                    "cached": bool(img.get("cached"))
+                }
+                for img in generated_images
+            ],
+            "wall_time_seconds": time.time() - self.start
+        }
+
+        print(f"\n✨ Generated {result['success_count']}/{len(panels)} panels successfully "
+              f"in {result['wall_time_seconds']:.2f}s ({result['cache_hits']} from the render cache)")
+
+        return result
 
-    print(f"\n✨ Generated {result['success_count']}/{len(panels)} panels successfully")
+    def cancel(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
 
-    return result
+
+def generate_comic_panels(storyboard_data: dict, max_workers: int = None, on_panel=None):
+    """
+    Generates 6 comic panel images using Google Gemini 2.5 Flash Image (NanoBanana).
+    Uses manga/vintage comic book hybrid style with retro halftone textures.
+    Maintains character consistency across all panels.
+
+    Panels are rendered concurrently on a bounded thread pool
+    (max_workers, default IMAGE_MAX_WORKERS; 1 = sequential). The output
+    order always follows the storyboard, whatever order the calls finish in.
+
+    on_panel(panel) is called in the caller's thread as each panel finishes
+    (completion order), so downstream work like uploads can start early.
+
+    Returns list of image data (raw PanelImage bytes) for each panel, plus
+    per-panel latencies. Use image_result_to_json() before sending it to a client.
+    """
+    return PanelRenderer(max_workers).finish(storyboard_data, on_panel=on_panel)
+
+
+def panel_to_json(panel: dict, inline_images: bool = False) -> dict:
+    """JSON-safe copy of one rendered panel (see image_result_to_json)"""
+    panel = dict(panel)
+    image = panel.pop("image", None)
+    if image is not None:
+        panel["image_size"] = image.size
+        if panel.get("image_sha256"):
+            panel["image_path"] = f"/blobs/{panel['image_sha256']}"
+        if inline_images:
+            panel["image_base64"] = image.to_base64()
+    return panel
+
+
+def image_result_to_json(image_result: dict, inline_images: bool = False) -> dict:
+    """
+    JSON-safe copy of a generate_comic_panels() result for HTTP responses.
+
+    Panels reference their stored blob (image_sha256 / image_path); the
+    base64 image is only included when inline_images is True.
+    """
+    if not image_result or "generated_panels" not in image_result:
+        return image_result
+
+    panels = [panel_to_json(panel, inline_images) for panel in image_result["generated_panels"]]
+    return {**image_result, "generated_panels": panels}
 
 
 def save_panel_image(image_data: dict, output_path: str):
     """
     Saves a single panel image to disk.
+
+    Bytes are written as-is when the file extension already matches the
+    image's mime type; PIL is only used to convert between formats.
     """
-    if "image_base64" not in image_data:
+    image = image_data.get("image")
+    if image is None:
         raise ValueError(f"No image data found for panel {image_data.get('panel_number')}")
 
-    # Decode base64 image
-    image_bytes = base64.b64decode(image_data["image_base64"])
-
-    # Save using PIL
-    image = Image.open(BytesIO(image_bytes))
-    image.save(output_path)
+    if mimetypes.guess_type(output_path)[0] == image.mime_type:
+        with open(output_path, "wb") as f:
+            f.write(image.view())
+    else:
+        # Convert format using PIL
+        Image.open(BytesIO(image.data)).save(output_path)
 
     print(f"💾 Saved panel {image_data.get('panel_number')} to {output_path}")
 
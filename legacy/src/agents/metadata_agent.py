@@ -3,9 +3,53 @@ YouTube Video Metadata Extraction Agent
 Fetches video title, duration, and other metadata
 """
 
+import os
 import re
+import json
+import html
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
 import requests
-from typing import Dict, Optional
+from requests.adapters import HTTPAdapter
+
+# Per-video cache of successful lookups
+METADATA_CACHE_TTL_SECONDS = int(os.getenv("METADATA_CACHE_TTL_SECONDS", "3600"))
+METADATA_CACHE_SIZE = 1024
+
+METADATA_CONCURRENCY = int(os.getenv("METADATA_CONCURRENCY", "8"))
+METADATA_TIMEOUT_SECONDS = 10
+
+# Watch pages are ~1 MB; stop reading as soon as every field is found
+HTML_CHUNK_SIZE = 16 * 1024
+HTML_MAX_BYTES = 2 * 1024 * 1024
+HTML_PATTERNS = {
+    "title": re.compile(rb'<title>(.+?) - YouTube</title>'),
+    "duration": re.compile(rb'"lengthSeconds":"(\d+)"'),
+    "channel": re.compile(rb'"author":"((?:[^"\\]|\\.)*)"')
+}
+# Kept between chunks so a match split across two chunks is still found
+HTML_OVERLAP_BYTES = 1024
+
+# oEmbed requests run here, alongside the watch-page scan on the caller's thread
+_oembed_pool = ThreadPoolExecutor(max_workers=METADATA_CONCURRENCY, thread_name_prefix="oembed")
+
+# One keep-alive session for the process (connection pool sized for batch lookups)
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=METADATA_CONCURRENCY))
+_session.headers.update({
+    "User-Agent": "Mozilla/5.0 (compatible; JetSki/1.0)",
+    "Accept-Language": "en-US,en;q=0.9"
+})
+# Skip the EU consent interstitial, which has none of the fields
+_session.cookies.set("CONSENT", "YES+", domain=".youtube.com")
+
+_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_cache_lock = threading.Lock()
+
 
 def extract_video_id(video_url: str) -> Optional[str]:
     """
@@ -30,10 +74,116 @@ def extract_video_id(video_url: str) -> Optional[str]:
     return None
 
 
+def thumbnail_url(video_id: str) -> str:
+    return f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
+
+
+def _fetch_oembed(video_id: str) -> Dict:
+    """Title and channel from the oEmbed endpoint (~1 KB of JSON, no duration)"""
+    try:
+        response = _session.get(
+            "https://www.youtube.com/oembed",
+            params={"url": f"https://www.youtube.com/watch?v={video_id}", "format": "json"},
+            timeout=METADATA_TIMEOUT_SECONDS
+        )
+        if response.status_code != 200:
+            return {}
+        data = response.json()
+    except (requests.RequestException, ValueError):
+        return {}
+
+    fields = {}
+    if data.get("title"):
+        fields["title"] = data["title"]
+    if data.get("author_name"):
+        fields["channel"] = data["author_name"]
+    return fields
+
+
+def _decode_field(name: str, raw: bytes):
+    if name == "duration":
+        return int(raw)
+    if name == "channel":
+        # JSON string contents (may contain \uXXXX escapes)
+        return json.loads(b'"' + raw + b'"')
+    return html.unescape(raw.decode("utf-8", errors="replace"))
+
+
+def _scan_watch_page(video_id: str, wanted: List[str]) -> Dict:
+    """
+    Stream the watch page and regex-scan it chunk by chunk, closing the
+    connection once every wanted field is found.
+    """
+    fields = {}
+    pending = [name for name in wanted if name in HTML_PATTERNS]
+
+    with _session.get(f"https://www.youtube.com/watch?v={video_id}", stream=True,
+                      timeout=METADATA_TIMEOUT_SECONDS) as response:
+        if response.status_code != 200:
+            raise ValueError(f"Watch page returned {response.status_code}")
+
+        window = b""
+        read = 0
+        for chunk in response.iter_content(chunk_size=HTML_CHUNK_SIZE):
+            read += len(chunk)
+            window = window[-HTML_OVERLAP_BYTES:] + chunk
+
+            for name in list(pending):
+                match = HTML_PATTERNS[name].search(window)
+                if match:
+                    fields[name] = _decode_field(name, match.group(1))
+                    pending.remove(name)
+
+            if not pending or read >= HTML_MAX_BYTES:
+                break
+
+    return fields
+
+
+def _fetch_metadata(video_id: str, video_url: str) -> Dict:
+    """
+    oEmbed and the watch page, concurrently.
+
+    Only the watch page has the duration, so it is always scanned; oEmbed's
+    title and channel win when both have them. If the scan fails, whatever
+    oEmbed returned is kept and the result carries an "error".
+
+    Raises:
+        Exception: the scan error, when oEmbed returned nothing either
+    """
+    oembed_future = _oembed_pool.submit(_fetch_oembed, video_id)
+    scan_error = None
+    try:
+        fields = _scan_watch_page(video_id, ["title", "duration", "channel"])
+    except Exception as e:
+        fields = {}
+        scan_error = e
+    oembed = oembed_future.result()
+    if scan_error is not None and not oembed:
+        raise scan_error
+    fields.update(oembed)
+
+    duration = fields.get("duration")
+    metadata = {
+        "video_id": video_id,
+        "title": fields.get("title", f"Video {video_id}"),
+        "duration": duration,
+        "duration_formatted": format_duration(duration) if duration else None,
+        "thumbnail_url": thumbnail_url(video_id),
+        "channel": fields.get("channel", "Unknown Channel"),
+        "video_url": video_url
+    }
+    if scan_error is not None:
+        metadata["error"] = str(scan_error)
+    return metadata
+
+
 def get_video_metadata(video_url: str) -> Dict:
     """
     Extract video metadata from YouTube URL
-    Uses web scraping as fallback when API not available
+    Uses oEmbed plus a partial (streamed) read of the watch page, fetched
+    concurrently, no API key needed. Successful lookups are cached per video id for
+    METADATA_CACHE_TTL_SECONDS.
 
     Returns:
         dict: {
@@ -55,50 +205,56 @@ def get_video_metadata(video_url: str) -> Dict:
             "duration": None
         }
 
-    try:
-        # Method 1: Try to extract from YouTube page HTML (no API key needed)
-        response = requests.get(f"https://www.youtube.com/watch?v={video_id}", timeout=10)
-
-        if response.status_code == 200:
-            html = response.text
-
-            # Extract title from <title> tag
-            title_match = re.search(r'<title>(.+?) - YouTube</title>', html)
-            title = title_match.group(1) if title_match else f"Video {video_id}"
-
-            # Extract duration from page metadata
-            duration_match = re.search(r'"lengthSeconds":"(\d+)"', html)
-            duration = int(duration_match.group(1)) if duration_match else None
-
-            # Extract channel name
-            channel_match = re.search(r'"author":"(.+?)"', html)
-            channel = channel_match.group(1) if channel_match else "Unknown Channel"
-
-            # Extract thumbnail
-            thumbnail_url = f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg"
-
-            return {
-                "video_id": video_id,
-                "title": title,
-                "duration": duration,
-                "duration_formatted": format_duration(duration) if duration else None,
-                "thumbnail_url": thumbnail_url,
-                "channel": channel,
-                "video_url": video_url
-            }
+    with _cache_lock:
+        cached = _cache.get(video_id)
+        if cached and cached[0] > time.time():
+            _cache.move_to_end(video_id)
+            return {**cached[1], "video_url": video_url}
 
+    try:
+        metadata = _fetch_metadata(video_id, video_url)
     except Exception as e:
         # Fallback: return basic info
         return {
             "video_id": video_id,
             "title": f"YouTube Video {video_id}",
             "duration": None,
-            "thumbnail_url": f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
+            "thumbnail_url": thumbnail_url(video_id),
             "channel": "Unknown",
             "video_url": video_url,
             "error": str(e)
         }
 
+    if "error" in metadata:
+        # Partial (no duration) - try the watch page again next time
+        return metadata
+
+    with _cache_lock:
+        _cache[video_id] = (time.time() + METADATA_CACHE_TTL_SECONDS, metadata)
+        _cache.move_to_end(video_id)
+        while len(_cache) > METADATA_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+    return metadata
+
+
+def get_videos_metadata(video_urls: List[str], max_workers: int = METADATA_CONCURRENCY) -> List[Dict]:
+    """
+    Metadata for many videos at once, in input order.
+
+    Lookups run concurrently on the shared session; a video id that appears
+    more than once is fetched once.
+    """
+    unique_urls = {}
+    for url in video_urls:
+        unique_urls.setdefault(extract_video_id(url) or url, url)
+
+    workers = max(1, min(max_workers, len(unique_urls)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metadata") as pool:
+        results = dict(zip(unique_urls, pool.map(get_video_metadata, unique_urls.values())))
+
+    return [{**results[extract_video_id(url) or url], "video_url": url} for url in video_urls]
+
 
 def format_duration(seconds: int) -> str:
     """Convert seconds to HH:MM:SS or MM:SS format"""
@@ -0,0 +1,237 @@
+"""
+Local pre-ranking of transcript windows
+
+Scores sliding windows of a timed transcript without any API call and keeps
+the top-K, so find_viral_moments() only pays for the parts of a long video
+that look like highlights. Features (all vectorized with NumPy):
+
+- novelty: TF-IDF of the window's words against the rest of the transcript,
+  with common English words as background (weight 0)
+- quote cues: aphorism / lesson words ("never", "truth", "secret", ...)
+- emotion: emotionally loaded words
+- punctuation: "!" and "?" density
+- audience markers: [Laughter], [Applause], ...
+
+NumPy is optional: without it prerank_available() is False and callers send
+the full transcript as before.
+"""
+
+import os
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .transcript_agent import Transcript
+
+# Windows are built from fixed time blocks: a window is PRERANK_WINDOW_SECONDS
+# long and slides by one block
+PRERANK_BLOCK_SECONDS = float(os.getenv("PRERANK_BLOCK_SECONDS", "30"))
+PRERANK_WINDOW_SECONDS = float(os.getenv("PRERANK_WINDOW_SECONDS", "90"))
+PRERANK_TOP_K = int(os.getenv("PRERANK_TOP_K", "10"))
+
+# Bump when scoring changes (part of the viral analysis cache key)
+PRERANK_VERSION = "1"
+
+FEATURES = ("novelty", "quote", "emotion", "punctuation", "markers")
+FEATURE_WEIGHTS = {"novelty": 1.0, "quote": 0.8, "emotion": 1.0, "punctuation": 0.6, "markers": 1.5}
+
+_WORD_RE = re.compile(r"[a-z][a-z']*")
+_MARKER_RE = re.compile(r"\[\s*(?:laughter|laughs|laughing|applause|cheering|cheers)\s*\]", re.IGNORECASE)
+
+COMMON_WORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can
+could did do does doing don't down even every for from get go going gonna got had has have he her
+here him his how i i'm if in into is it it's its just know like look make me more most my no not now
+of off oh okay on one only or other our out over really right said say see she so some something
+than that that's the their them then there these they thing things think this those to too uh um
+up us very want was way we well were what when where which who why will with would yeah yes you
+you're your kind sort mean actually basically stuff lot gonna wanna going
+""".split())
+
+QUOTE_WORDS = frozenset("""
+never always everyone everybody nobody nothing everything truth secret lesson remember believe
+matters mistake realized realize learned biggest most best worst only must should forget
+changed change life world rule rules key success failure fail failed dream fear
+""".split())
+
+EMOTION_WORDS = frozenset("""
+love hate angry anger afraid scared terrified fear crazy insane amazing incredible unbelievable
+shocked shocking wow beautiful horrible terrible awful devastated heartbroken cried crying tears
+laugh laughed hilarious funny joke happy sad furious proud ashamed embarrassed excited disgusting
+brutal wild nightmare miracle insane ridiculous epic legendary painful hurt died death kill killed
+""".split())
+
+
+def prerank_available() -> bool:
+    return np is not None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("Transcript pre-ranking requires numpy: pip install numpy")
+
+
+def _tokenize(transcript: Transcript):
+    """Per-snippet word lists and raw snippet texts"""
+    texts = []
+    for i in range(len(transcript.offsets)):
+        end = transcript.offsets[i + 1] - 1 if i + 1 < len(transcript.offsets) else len(transcript.text)
+        texts.append(transcript.text[transcript.offsets[i]:end])
+    words = [_WORD_RE.findall(_MARKER_RE.sub(" ", text).lower()) for text in texts]
+    return texts, words
+
+
+def block_features(transcript: Transcript, block_seconds: float = PRERANK_BLOCK_SECONDS):
+    """
+    Per-block feature sums.
+
+    Returns:
+        (features, token_counts): a (blocks, len(FEATURES)) array of summed
+        feature values and a (blocks,) array of word counts
+    """
+    _require_numpy()
+    texts, words = _tokenize(transcript)
+
+    snippet_block = (np.frombuffer(transcript.starts, dtype=np.float64) // block_seconds).astype(np.int64)
+    num_blocks = int(snippet_block.max()) + 1 if len(snippet_block) else 0
+
+    # Vocabulary ids for every token, plus which block each token is in
+    vocab: Dict[str, int] = {}
+    term_ids = np.fromiter(
+        (vocab.setdefault(word, len(vocab)) for snippet_words in words for word in snippet_words),
+        dtype=np.int64
+    )
+    words_per_snippet = np.fromiter((len(snippet_words) for snippet_words in words), dtype=np.int64,
+                                    count=len(words))
+    token_block = np.repeat(snippet_block, words_per_snippet)
+
+    vocab_words = list(vocab)
+    is_common = np.fromiter((word in COMMON_WORDS for word in vocab_words), dtype=bool, count=len(vocab))
+    is_quote = np.fromiter((word in QUOTE_WORDS for word in vocab_words), dtype=bool, count=len(vocab))
+    is_emotion = np.fromiter((word in EMOTION_WORDS for word in vocab_words), dtype=bool, count=len(vocab))
+
+    # Block-level document frequency -> idf; common words carry no weight
+    pairs = np.unique(token_block * len(vocab) + term_ids) if len(term_ids) else term_ids
+    df = np.bincount(pairs % max(len(vocab), 1), minlength=len(vocab))
+    idf = np.log((num_blocks + 1) / (df + 1))
+    idf[is_common] = 0.0
+
+    features = np.zeros((num_blocks, len(FEATURES)))
+    features[:, 0] = np.bincount(token_block, weights=idf[term_ids], minlength=num_blocks)
+    features[:, 1] = np.bincount(token_block, weights=is_quote[term_ids], minlength=num_blocks)
+    features[:, 2] = np.bincount(token_block, weights=is_emotion[term_ids], minlength=num_blocks)
+    punctuation = np.fromiter((text.count("!") + text.count("?") for text in texts), dtype=np.float64,
+                              count=len(texts))
+    markers = np.fromiter((len(_MARKER_RE.findall(text)) for text in texts), dtype=np.float64, count=len(texts))
+    features[:, 3] = np.bincount(snippet_block, weights=punctuation, minlength=num_blocks)
+    features[:, 4] = np.bincount(snippet_block, weights=markers, minlength=num_blocks)
+
+    token_counts = np.bincount(token_block, minlength=num_blocks)
+    return features, token_counts
+
+
+def score_windows(transcript: Transcript, window_seconds: float = PRERANK_WINDOW_SECONDS,
+                  block_seconds: float = PRERANK_BLOCK_SECONDS, weights: Dict = None):
+    """
+    Score every sliding window (window_seconds long, one block stride).
+
+    Rates (per word) are z-scored across windows and combined with
+    FEATURE_WEIGHTS; audience markers count as-is.
+
+    Returns:
+        (scores, token_counts, window_blocks): scores[i] is the window that
+        starts at block i; empty windows score -inf
+    """
+    features, token_counts = block_features(transcript, block_seconds)
+    window_blocks = max(1, int(round(window_seconds / block_seconds)))
+    if len(token_counts) < window_blocks:
+        # Shorter than one window: a single window over everything
+        padding = window_blocks - len(token_counts)
+        features = np.vstack([features, np.zeros((padding, features.shape[1]))])
+        token_counts = np.concatenate([token_counts, np.zeros(padding, dtype=token_counts.dtype)])
+
+    # Window sums from prefix sums over blocks
+    cumulative = np.vstack([np.zeros((1, features.shape[1])), np.cumsum(features, axis=0)])
+    window_features = cumulative[window_blocks:] - cumulative[:-window_blocks]
+    cumulative_tokens = np.concatenate([[0], np.cumsum(token_counts)])
+    window_tokens = cumulative_tokens[window_blocks:] - cumulative_tokens[:-window_blocks]
+
+    rates = window_features / np.maximum(window_tokens, 1)[:, None]
+    markers_col = FEATURES.index("markers")
+    rates[:, markers_col] = window_features[:, markers_col]
+
+    std = rates.std(axis=0)
+    z = (rates - rates.mean(axis=0)) / np.where(std > 0, std, 1.0)
+
+    weights = {**FEATURE_WEIGHTS, **(weights or {})}
+    scores = z @ np.array([weights[name] for name in FEATURES])
+    scores[window_tokens == 0] = -np.inf
+    return scores, window_tokens, window_blocks
+
+
+def select_windows(transcript: Transcript, top_k: int = PRERANK_TOP_K,
+                   window_seconds: float = PRERANK_WINDOW_SECONDS,
+                   block_seconds: float = PRERANK_BLOCK_SECONDS) -> List[Dict]:
+    """
+    Top-k non-overlapping windows, in time order.
+
+    Returns:
+        list: {"start_seconds", "end_seconds", "score"} per window
+    """
+    scores, _, window_blocks = score_windows(transcript, window_seconds, block_seconds)
+
+    chosen = []
+    taken = np.zeros(len(scores) + window_blocks, dtype=bool)
+    for index in np.argsort(-scores, kind="stable"):
+        if len(chosen) >= top_k or not np.isfinite(scores[index]):
+            break
+        if taken[index:index + window_blocks].any():
+            continue
+        taken[index:index + window_blocks] = True
+        chosen.append(int(index))
+
+    return [
+        {
+            "start_seconds": index * block_seconds,
+            "end_seconds": (index + window_blocks) * block_seconds,
+            "score": float(scores[index])
+        }
+        for index in sorted(chosen)
+    ]
+
+
+def condense_transcript(transcript: Transcript, top_k: int = PRERANK_TOP_K,
+                        window_seconds: float = PRERANK_WINDOW_SECONDS,
+                        block_seconds: float = PRERANK_BLOCK_SECONDS) -> Optional[str]:
+    """
+    Prompt text made of the top-k windows only, each with its real [m:ss]
+    markers (so the LLM's start/end times still point into the full video).
+
+    Returns None when the transcript has no timing or is already about the
+    size of the selection - send the full transcript in that case.
+    """
+    if len(transcript.offsets) <= 1 or transcript.duration <= top_k * window_seconds:
+        return None
+
+    windows = select_windows(transcript, top_k, window_seconds, block_seconds)
+
+    # Window bounds -> snippet ranges, merging windows that touch
+    ranges = []
+    for window in windows:
+        first = bisect_left(transcript.starts, window["start_seconds"])
+        last = bisect_left(transcript.starts, window["end_seconds"]) - 1
+        if last < first:
+            continue
+        if ranges and first <= ranges[-1][1] + 1:
+            ranges[-1][1] = max(ranges[-1][1], last)
+        else:
+            ranges.append([first, last])
+
+    if not ranges:
+        return None
+    return "\n...\n".join(transcript.snippets(first, last).timestamped_text() for first, last in ranges)
@@ -0,0 +1,229 @@
+"""
+Prompt building for the OpenAI agents
+
+- normalize_transcript(): strips caption noise ([Music], ♪, >>), filler
+  words and the repeated fragments auto-captions produce, keeping [m:ss]
+  markers and audience reactions ([Laughter], [Applause])
+- Prompt: a static instruction block (identical on every request, sent
+  first as the system message so provider-side prompt caching can reuse it)
+  plus the per-request data in the user message
+- prompt_stats: per-request token accounting - tokens before/after
+  normalization, prompt tokens billed and how many of them were cached;
+  inside prompt_run() each entry is tagged with the run's ids and collected
+"""
+
+import re
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Rough English average, used when tiktoken isn't installed
+CHARS_PER_TOKEN = 4
+PROMPT_STATS_RECENT = 100
+
+_NOISE_RE = re.compile(
+    r"\[\s*(?:music|inaudible|silence|noise|background noise|foreign|blank_audio|no speech|sound)\s*\]"
+    r"|[♪♫]+|>>+",
+    re.IGNORECASE
+)
+# Lowercase only - "the ER doctor" is not a filler
+_FILLER_RE = re.compile(r"(?<![\w'-])(?:u+m+|u+h+|e+r+m+|e+r|h+m+|m+h*m+|a+h+|uh-huh)(?![\w'-])[,.]?")
+# The same 1-6 word fragment said (or captioned) twice or more in a row
+_REPEAT_RE = re.compile(r"(?<!\S)((?:\S+ ){0,5}?\S+)(?: \1(?!\S))+", re.IGNORECASE)
+# Repeats that are the content rather than a stutter ("ha ha ha", "no, no, no!")
+_INTERJECTIONS = frozenset({
+    "ha", "haha", "he", "hey", "hi", "ho", "la", "no", "nope", "oh", "ok", "okay",
+    "please", "stop", "wait", "wow", "yay", "yeah", "yep", "yes"
+})
+_TIMESTAMP = r"\[\d+(?::\d{2}){1,2}\]"
+_EMPTY_MARKER_RE = re.compile(_TIMESTAMP + r" +(?=" + _TIMESTAMP + r")")
+_SPACES_RE = re.compile(r"[ \t]+")
+
+
+def _collapse_repeat(match: re.Match) -> str:
+    """
+    Keep one copy of a stuttered word ("I I think") or a caption fragment of
+    3+ words repeated by rolling auto-captions. Two-word repeats ("New York
+    New York") and interjections are left alone - they are usually meant.
+    """
+    words = match.group(1).split(" ")
+    if len(words) == 2:
+        return match.group(0)
+    if len(words) == 1 and words[0].strip(".,!?;:'\"").lower() in _INTERJECTIONS:
+        return match.group(0)
+    return match.group(1)
+
+
+def normalize_transcript(text: str) -> str:
+    """Transcript text with caption noise, filler words and stutters removed"""
+    text = _NOISE_RE.sub(" ", text)
+    text = _FILLER_RE.sub(" ", text)
+    text = _SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = _REPEAT_RE.sub(_collapse_repeat, text)
+    # A marker left with nothing after it (e.g. a [Music] stretch) is dropped
+    text = _EMPTY_MARKER_RE.sub("", text)
+    return text.strip()
+
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken (o200k_base, the gpt-4o family) or an estimate"""
+    global _encoding
+    if tiktoken is None:
+        return len(text) // CHARS_PER_TOKEN
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("o200k_base")
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+class Prompt:
+    """
+    A prompt split into its static instruction block and the request data.
+
+    `static` must not contain anything request-specific - it is sent first,
+    as its own message, so every request shares it as an exact prefix.
+    """
+
+    __slots__ = ("name", "static", "dynamic", "raw_dynamic")
+
+    def __init__(self, name: str, static: str, dynamic: str, raw_dynamic: Optional[str] = None):
+        self.name = name
+        self.static = static
+        self.dynamic = dynamic
+        # Request data before normalization (for the tokens-saved count)
+        self.raw_dynamic = raw_dynamic if raw_dynamic is not None else dynamic
+
+    @property
+    def messages(self) -> List[Dict]:
+        return [
+            {"role": "system", "content": self.static},
+            {"role": "user", "content": self.dynamic}
+        ]
+
+    @property
+    def text(self) -> str:
+        return f"{self.static}\n\n{self.dynamic}"
+
+    def __str__(self):
+        return self.text
+
+    def __len__(self):
+        return len(self.static) + len(self.dynamic)
+
+
+class PromptRun:
+    """The prompt stats entries recorded during one run, tagged with its ids"""
+
+    __slots__ = ("tags", "entries")
+
+    def __init__(self, tags: Dict):
+        self.tags = tags
+        self.entries: List[Dict] = []
+
+
+# The run the current thread's prompts are recorded under (None outside one)
+_current_run = contextvars.ContextVar("prompt_run", default=None)
+
+
+@contextmanager
+def prompt_run(**tags):
+    """
+    Tag every prompt recorded inside the block with `tags` (video_id,
+    job_id, ...; None values are left out) and collect the entries on the
+    yielded PromptRun. Work handed to other threads needs carry_prompt_run().
+    """
+    run = PromptRun({key: value for key, value in tags.items() if value is not None})
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+def carry_prompt_run(func):
+    """func wrapped to record its prompts under the caller's run, from any thread"""
+    run = _current_run.get()
+
+    def wrapper(*args, **kwargs):
+        token = _current_run.set(run)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+    return wrapper
+
+
+class PromptStats:
+    """Token accounting per prompt name, plus the most recent requests"""
+
+    def __init__(self, recent: int = PROMPT_STATS_RECENT):
+        self._totals: Dict[str, Dict] = {}
+        self._recent = deque(maxlen=recent)
+        self._lock = threading.Lock()
+
+    def record(self, prompt: Prompt, usage=None) -> Dict:
+        """
+        Record one request. `usage` is the OpenAI usage object (None if the
+        API didn't return one - the local count is used instead).
+        """
+        sent_tokens = count_tokens(prompt.static) + count_tokens(prompt.dynamic)
+        raw_tokens = sent_tokens if prompt.raw_dynamic is prompt.dynamic else \
+            count_tokens(prompt.static) + count_tokens(prompt.raw_dynamic)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or sent_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+
+        run = _current_run.get()
+        entry = {
+            "prompt": prompt.name,
+            **(run.tags if run else {}),
+            "raw_tokens": raw_tokens,
+            "sent_tokens": sent_tokens,
+            "saved_tokens": raw_tokens - sent_tokens,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "cached_ratio": round(cached_tokens / prompt_tokens, 3) if prompt_tokens else 0.0
+        }
+
+        with self._lock:
+            totals = self._totals.setdefault(prompt.name, {
+                "requests": 0, "raw_tokens": 0, "sent_tokens": 0, "saved_tokens": 0,
+                "prompt_tokens": 0, "cached_tokens": 0
+            })
+            totals["requests"] += 1
+            for key in ("raw_tokens", "sent_tokens", "saved_tokens", "prompt_tokens", "cached_tokens"):
+                totals[key] += entry[key]
+            self._recent.append(entry)
+            if run:
+                run.entries.append(entry)
+        return entry
+
+    def stats(self) -> Dict:
+        with self._lock:
+            prompts = {
+                name: {
+                    **totals,
+                    "cached_ratio": round(totals["cached_tokens"] / totals["prompt_tokens"], 3)
+                    if totals["prompt_tokens"] else 0.0
+                }
+                for name, totals in self._totals.items()
+            }
+            return {
+                "tokenizer": "o200k_base" if tiktoken is not None else f"estimate ({CHARS_PER_TOKEN} chars/token)",
+                "prompts": prompts,
+                "recent": list(self._recent)
+            }
+
+
+# Process-wide, shared by every agent
+prompt_stats = PromptStats()
@@ -0,0 +1,239 @@
+"""
+Rate Limiter - Shared request/token budgets and adaptive concurrency per provider + model
+Every OpenAI and Gemini call in the process goes through the limiter for its
+model, so concurrent pipelines share one quota instead of racing into 429s.
+"""
+
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+# Retries of a rate-limited call before the error is raised to the caller
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+RATE_LIMIT_BACKOFF_SECONDS = 1.0
+RATE_LIMIT_BACKOFF_MAX_SECONDS = 60.0
+
+# Quotas per model: requests/min, tokens/min (0 = unlimited), max in-flight calls
+DEFAULT_LIMITS = {
+    ("openai", "gpt-4o-mini"): {
+        "rpm": int(os.getenv("OPENAI_RPM", "500")),
+        "tpm": int(os.getenv("OPENAI_TPM", "200000")),
+        "max_concurrency": int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+    },
+    ("gemini", "gemini-2.5-flash-image"): {
+        "rpm": int(os.getenv("GEMINI_IMAGE_RPM", "60")),
+        "tpm": int(os.getenv("GEMINI_IMAGE_TPM", "0")),
+        "max_concurrency": int(os.getenv("GEMINI_IMAGE_MAX_CONCURRENCY", "4"))
+    }
+}
+FALLBACK_LIMITS = {"rpm": 60, "tpm": 0, "max_concurrency": 4}
+
+
+class RateLimitedError(Exception):
+    """A call was still rate limited after RATE_LIMIT_MAX_RETRIES retries"""
+
+
+class TokenBucket:
+    """
+    Refills at rate_per_minute / 60 per second up to one minute's worth.
+
+    reserve() never blocks: it takes the amount (the level may go negative)
+    and returns how long the caller must wait, so waiters are served in the
+    order they reserved.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def refund(self, amount: float):
+        """Give back an over-estimate (or take more for an under-estimate)"""
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Request + token buckets with an AIMD concurrency limit.
+
+    The in-flight limit halves on every 429 (and all new calls pause for the
+    Retry-After period), then grows back by ~1 per `limit` successful calls,
+    so throughput settles just under quota.
+    """
+
+    def __init__(self, provider: str, model: str, rpm: int, tpm: int = 0, max_concurrency: int = 4):
+        self.provider = provider
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+
+        self.limit = float(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+
+        self.counters = {
+            "calls": 0,
+            "throttled": 0,
+            "failed": 0,
+            "wait_seconds": 0.0,
+            "max_queue_depth": 0,
+            "tokens_used": 0
+        }
+
+    def _acquire(self, tokens: int):
+        wait_start = time.monotonic()
+        with self._cond:
+            self.waiting += 1
+            self.counters["max_queue_depth"] = max(self.counters["max_queue_depth"], self.waiting)
+            while True:
+                pause = self.paused_until - time.monotonic()
+                if pause <= 0 and self.active < int(self.limit):
+                    break
+                self._cond.wait(timeout=pause if pause > 0 else None)
+            self.waiting -= 1
+            self.active += 1
+
+        # Budget waits happen outside the lock (the reservation already holds our place)
+        delay = max(
+            self.requests.reserve(1) if self.requests else 0.0,
+            self.tokens.reserve(tokens) if self.tokens and tokens else 0.0
+        )
+        if delay > 0:
+            time.sleep(delay)
+
+        with self._cond:
+            self.counters["wait_seconds"] += time.monotonic() - wait_start
+
+    def _release(self, success: bool):
+        with self._cond:
+            self.active -= 1
+            if success:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def _throttled(self, retry_after: Optional[float], attempt: int):
+        """Multiplicative decrease + pause everyone until Retry-After"""
+        if retry_after is None:
+            retry_after = min(RATE_LIMIT_BACKOFF_SECONDS * (2 ** attempt), RATE_LIMIT_BACKOFF_MAX_SECONDS)
+            retry_after = random.uniform(retry_after / 2, retry_after)
+        with self._cond:
+            self.counters["throttled"] += 1
+            self.limit = max(1.0, self.limit / 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def call(self, func: Callable, *args, tokens: int = 0,
+             usage: Optional[Callable[[object], int]] = None, **kwargs):
+        """
+        Run func(*args, **kwargs) within the limits, retrying 429s.
+
+        Args:
+            tokens: Estimated tokens for the call (prompt + expected output)
+            usage: Optional fn(result) -> actual tokens, to correct the estimate
+        """
+        for attempt in range(RATE_LIMIT_MAX_RETRIES + 1):
+            self._acquire(tokens)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                rate_limited, retry_after = is_rate_limit_error(e)
+                self._release(success=False)
+                # The reservation wasn't used - the next attempt (or caller) reserves its own
+                if self.tokens:
+                    self.tokens.refund(tokens)
+                if not rate_limited:
+                    with self._cond:
+                        self.counters["failed"] += 1
+                    raise
+                print(f"  ⏳ {self.provider}/{self.model} rate limited (attempt {attempt + 1}), backing off")
+                self._throttled(retry_after, attempt)
+                continue
+
+            self._release(success=True)
+            used = tokens
+            if usage is not None:
+                try:
+                    used = usage(result) or tokens
+                except Exception:
+                    pass
+                if self.tokens and used != tokens:
+                    self.tokens.refund(tokens - used)
+            with self._cond:
+                self.counters["calls"] += 1
+                self.counters["tokens_used"] += used
+            return result
+
+        with self._cond:
+            self.counters["failed"] += 1
+        raise RateLimitedError(f"{self.provider}/{self.model} still rate limited after {RATE_LIMIT_MAX_RETRIES} retries")
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                **self.counters,
+                "wait_seconds": round(self.counters["wait_seconds"], 3),
+                "queue_depth": self.waiting,
+                "in_flight": self.active,
+                "concurrency_limit": round(self.limit, 2),
+                "max_concurrency": self.max_concurrency,
+                "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 3)
+            }
+
+
+def is_rate_limit_error(error: Exception):
+    """
+    (is_429, retry_after_seconds) for OpenAI and google-genai errors.
+
+    OpenAI errors carry .status_code and .response; google-genai errors
+    carry .code (and .response on newer versions).
+    """
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if status != 429:
+        return False, None
+
+    retry_after = None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        retry_after = float(value) if value is not None else None
+    except (TypeError, ValueError):
+        pass
+    return True, retry_after
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str, model: str) -> RateLimiter:
+    """Process-wide limiter for a provider + model"""
+    with _limiters_lock:
+        limiter = _limiters.get((provider, model))
+        if limiter is None:
+            limits = DEFAULT_LIMITS.get((provider, model), FALLBACK_LIMITS)
+            limiter = RateLimiter(provider, model, **limits)
+            _limiters[(provider, model)] = limiter
+        return limiter
+
+
+def rate_limit_stats() -> Dict:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {f"{limiter.provider}/{limiter.model}": limiter.stats() for limiter in limiters}
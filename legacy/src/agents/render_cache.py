@@ -0,0 +1,174 @@
+"""
+Persistent cache of rendered panels
+Gemini renders are keyed by a hash of the full panel prompt, the model and
+the generation parameters, and stored on local disk (raw bytes + mime type)
+with size-bounded LRU eviction. A hit skips the API call entirely, so
+re-running a storyboard (retries after a Drive/DB failure, segment
+switches) costs nothing in image time.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+RENDER_CACHE_ENABLED = os.getenv("RENDER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+RENDER_CACHE_PATH = Path(os.getenv("RENDER_CACHE_PATH", str(Path(__file__).parent.parent.parent / "data" / "render_cache")))
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def render_key(prompt: str, model: str, params: Optional[Dict] = None) -> str:
+    """SHA-256 over model, generation params (canonical JSON) and the prompt"""
+    digest = hashlib.sha256()
+    for part in (model, json.dumps(params or {}, sort_keys=True, separators=(",", ":")), prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """
+    Disk-backed LRU of rendered images.
+
+    Each entry is one file (<root>/ab/<key>): a mime type line, then the
+    raw bytes. Recency is the file's mtime (touched on every hit), so the
+    LRU order survives restarts.
+    """
+
+    def __init__(self, root: Path = RENDER_CACHE_PATH, max_bytes: int = RENDER_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.counters = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def _load(self):
+        """Index what's already on disk, oldest first (called under the lock)"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.root.exists():
+            return
+        files = []
+        for path in self.root.glob("*/*"):
+            if path.name.startswith(".tmp-"):
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """(data, mime_type) or None"""
+        with self._lock:
+            self._load()
+            if key not in self._entries:
+                self.counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                mime_type = f.readline().decode("ascii").strip()
+                data = f.read()
+            os.utime(path)
+        except (OSError, UnicodeDecodeError):
+            with self._lock:
+                self._forget(key)
+                self.counters["misses"] += 1
+                self.counters["errors"] += 1
+            return None
+
+        with self._lock:
+            self.counters["hits"] += 1
+        return data, mime_type
+
+    def put(self, key: str, data: bytes, mime_type: str):
+        header = f"{mime_type}\n".encode("ascii")
+        size = len(header) + len(data)
+        if size > self.max_bytes:
+            return
+
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temp file then rename, so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(header)
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except Exception:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"  ⚠️  Render cache write failed: {str(e)}")
+            with self._lock:
+                self.counters["errors"] += 1
+            return
+
+        with self._lock:
+            self._load()
+            self._forget(key)
+            self._entries[key] = size
+            self._bytes += size
+            self.counters["writes"] += 1
+            self._evict()
+
+    def _forget(self, key: str):
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._bytes -= size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.counters["evictions"] += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._load()
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hit_rate": round(self.counters["hits"] / lookups, 3) if lookups else 0.0
+            }
+
+
+_render_cache = None
+_render_cache_lock = threading.Lock()
+
+
+def get_render_cache() -> Optional[RenderCache]:
+    """Process-wide render cache (None when RENDER_CACHE_ENABLED is off)"""
+    global _render_cache
+    if not RENDER_CACHE_ENABLED:
+        return None
+    with _render_cache_lock:
+        if _render_cache is None:
+            _render_cache = RenderCache()
+        return _render_cache
@@ -4,110 +4,290 @@ from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from .rate_limiter import get_limiter
+from .prompt_builder import Prompt, normalize_transcript, prompt_stats
+
 # Load environment variables from root directory
 root_dir = Path(__file__).parent.parent.parent
 load_dotenv(dotenv_path=root_dir / ".env")
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Retries are left to the shared rate limiter so it sees every 429
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+
+MODEL = "gpt-4o-mini"
+limiter = get_limiter("openai", MODEL)
+
+# Output budget reserved per call on top of the prompt (6 detailed panels)
+RESPONSE_TOKENS = 2000
+CHARS_PER_TOKEN = 4
+
+# Static instruction block: sent first and byte-identical on every request so
+# provider-side prompt caching can reuse it - keep request data out of it.
+# OpenAI only caches prefixes of 1024+ tokens; the schema, rules and field guide
+# below keep it over that
+STORYBOARD_INSTRUCTIONS = """You are a comic book writer. Create a compelling 6-panel comic storyboard that tells the story of the viral segment below visually.
+
+Return ONLY valid JSON in this exact format:
+{
+    "title": "Short, punchy title based on the viral hook",
+    "style": "manga-vintage",
+    "tone": "dramatic",
+    "panels": [
+        {
+            "panel_number": 1,
+            "scene_description": "Wide establishing shot of a grand Spanish palace in the 1500s, golden light streaming through windows",
+            "character_details": "Spanish conquistador in armor, greedy expression, holding gold coins",
+            "action": "Conquistador clutches gold while indigenous people work in background",
+            "caption": "We suffer from a disease of the heart...",
+            "visual_style": "dramatic lighting, warm color palette",
+            "composition": "wide shot"
+        },
+        {
+            "panel_number": 2,
+            "scene_description": "Close-up of the conquistador's face, eyes gleaming with greed",
+            "character_details": "Detailed facial expression showing obsession",
+            "action": "Eyes reflecting gold coins",
+            "caption": "...that can only be cured by gold.",
+            "visual_style": "tight close-up, intense shadows",
+            "composition": "close-up"
+        },
+        {
+            "panel_number": 3,
+            "scene_description": "...",
+            "character_details": "...",
+            "action": "...",
+            "caption": "...",
+            "visual_style": "...",
+            "composition": "medium shot"
+        },
+        {
+            "panel_number": 4,
+            "scene_description": "...",
+            "character_details": "...",
+            "action": "...",
+            "caption": "...",
+            "visual_style": "...",
+            "composition": "wide shot"
+        },
+        {
+            "panel_number": 5,
+            "scene_description": "...",
+            "character_details": "...",
+            "action": "...",
+            "caption": "...",
+            "visual_style": "...",
+            "composition": "medium shot"
+        },
+        {
+            "panel_number": 6,
+            "scene_description": "Final impactful panel that delivers the punchline/conclusion",
+            "character_details": "...",
+            "action": "...",
+            "caption": "...",
+            "visual_style": "...",
+            "composition": "dramatic wide shot"
+        }
+    ],
+    "narrative_arc": "Setup → Hook → Build → Climax → Impact → Resolution",
+    "hashtags": ["#History", "#Gold", "#Colonialism", "#ViralQuotes"],
+    "posting_tip": "Post during peak engagement hours (12pm-3pm EST)"
+}
+
+IMPORTANT RULES:
+1. Each panel must flow naturally to the next
+2. Maintain consistent character appearance across all panels
+3. Build dramatic tension from panel 1 to 6
+4. Panel 6 should be the most impactful
+5. Captions should be SHORT (max 10 words each)
+6. Scene descriptions must be DETAILED for image generation
+7. Include character details for consistency (clothing, hair, facial features)
+
+FIELD GUIDE:
+- "title": at most 6 words, based on the viral hook; no hashtags or emojis
+- "style": always "manga-vintage" (the panel renderer is tuned for it)
+- "tone": one word, e.g. "dramatic", "funny", "inspiring", "tense", "wholesome", "dark"
+- "scene_description": where we are and what is in frame - setting, era, time of day, lighting,
+  background details. 1-2 sentences, concrete and visual; the image model only sees this panel
+- "character_details": every character in the panel with the SAME wording each time they appear
+  (age, build, hair, clothing, accessories), so the renderer draws them consistently
+- "action": what happens in this exact moment - one clear action per panel
+- "caption": the words shown with the panel; quote the speaker where possible, otherwise narrate.
+  Max 10 words, no quotation marks around the whole caption
+- "visual_style": lighting, palette and mood for this panel only
+- "composition": one of "wide shot", "medium shot", "close-up", "extreme close-up",
+  "over-the-shoulder", "low angle", "high angle", "bird's-eye view", "split panel", "dramatic wide shot"
+
+STORY SHAPE:
+- Panel 1 sets the scene and introduces the speaker or subject
+- Panel 2 delivers the hook - the line or idea that makes people stop scrolling
+- Panels 3-4 build: context, the turn, the escalation
+- Panel 5 is the climax - the punchline, the reveal or the strongest quote
+- Panel 6 lands the impact: the consequence, the reaction or the takeaway
+- Vary the composition: no more than two panels in a row with the same shot type
+
+CONTENT RULES:
+- Stay faithful to the transcript excerpt; do not invent quotes, events or facts
+- Real people may be drawn as stylized characters; never describe them as photorealistic
+- Do not ask for text, speech bubbles, logos or watermarks inside the image itself -
+  the caption is added separately
+- Keep every panel safe for work: no gore, nudity or graphic violence
+- "hashtags": 3-6 tags, each starting with "#", no spaces inside a tag
+- "posting_tip": one sentence of practical advice for posting this comic"""
+
 
-def generate_storyboard(segment_data: dict):
+def build_storyboard_prompt(segment_data: dict) -> Prompt:
     """
-    Creates a 6-panel comic storyboard from the selected viral segment.
-    Returns structured JSON with panel descriptions ready for image generation.
+    Builds the 6-panel storyboard prompt for a viral segment.
     """
     segment_text = segment_data.get("transcript_excerpt", "")
     summary = segment_data.get("summary", "")
     hook = segment_data.get("hook", "")
 
-    prompt = f"""
-    You are a comic book writer. Create a compelling 6-panel comic storyboard that tells this story visually.
-
-    VIRAL HOOK: {hook}
-    SUMMARY: {summary}
-    TRANSCRIPT EXCERPT: {segment_text}
-
-    Return ONLY valid JSON in this exact format:
-    {{
-        "title": "{hook}",
-        "style": "manga-vintage",
-        "tone": "dramatic",
-        "panels": [
-            {{
-                "panel_number": 1,
-                "scene_description": "Wide establishing shot of a grand Spanish palace in the 1500s, golden light streaming through windows",
-                "character_details": "Spanish conquistador in armor, greedy expression, holding gold coins",
-                "action": "Conquistador clutches gold while indigenous people work in background",
-                "caption": "We suffer from a disease of the heart...",
-                "visual_style": "dramatic lighting, warm color palette",
-                "composition": "wide shot"
-            }},
-            {{
-                "panel_number": 2,
-                "scene_description": "Close-up of the conquistador's face, eyes gleaming with greed",
-                "character_details": "Detailed facial expression showing obsession",
-                "action": "Eyes reflecting gold coins",
-                "caption": "...that can only be cured by gold.",
-                "visual_style": "tight close-up, intense shadows",
-                "composition": "close-up"
-            }},
-            {{
-                "panel_number": 3,
-                "scene_description": "...",
-                "character_details": "...",
-                "action": "...",
-                "caption": "...",
-                "visual_style": "...",
-                "composition": "medium shot"
-            }},
-            {{
-                "panel_number": 4,
-                "scene_description": "...",
-                "character_details": "...",
-                "action": "...",
-                "caption": "...",
-                "visual_style": "...",
-                "composition": "wide shot"
-            }},
-            {{
-                "panel_number": 5,
-                "scene_description": "...",
-                "character_details": "...",
-                "action": "...",
-                "caption": "...",
-                "visual_style": "...",
-                "composition": "medium shot"
-            }},
-            {{
-                "panel_number": 6,
-                "scene_description": "Final impactful panel that delivers the punchline/conclusion",
-                "character_details": "...",
-                "action": "...",
-                "caption": "...",
-                "visual_style": "...",
-                "composition": "dramatic wide shot"
-            }}
-        ],
-        "narrative_arc": "Setup → Hook → Build → Climax → Impact → Resolution",
-        "hashtags": ["#History", "#Gold", "#Colonialism", "#ViralQuotes"],
-        "posting_tip": "Post during peak engagement hours (12pm-3pm EST)"
-    }}
-
-    IMPORTANT RULES:
-    1. Each panel must flow naturally to the next
-    2. Maintain consistent character appearance across all panels
-    3. Build dramatic tension from panel 1 to 6
-    4. Panel 6 should be the most impactful
-    5. Captions should be SHORT (max 10 words each)
-    6. Scene descriptions must be DETAILED for image generation
-    7. Include character details for consistency (clothing, hair, facial features)
+    request = "VIRAL HOOK: {}\nSUMMARY: {}\nTRANSCRIPT EXCERPT: {}"
+    return Prompt(
+        "storyboard", STORYBOARD_INSTRUCTIONS,
+        request.format(hook, summary, normalize_transcript(segment_text)),
+        raw_dynamic=request.format(hook, summary, segment_text)
+    )
+
+
+class PanelStreamParser:
+    """
+    Incremental parser for a streamed storyboard JSON object.
+
+    feed() takes raw text chunks and returns the panel dicts from the
+    top-level "panels" array that were completed by that chunk. Only string
+    and bracket state is tracked; each finished panel object is handed to
+    json.loads on its own.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None
+        self.in_panels = False
+        self.object_start = None
+        self.panel_count = 0
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        panels = []
+        text = self.text
+
+        for i in range(self.pos, len(text)):
+            c = text[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        self.last_string = text[self.string_start + 1:i]
+            elif c == '"':
+                self.in_string = True
+                self.string_start = i
+            elif c in "{[":
+                self.depth += 1
+                if c == "[" and self.depth == 2 and self.last_string == "panels":
+                    self.in_panels = True
+                elif c == "{" and self.in_panels and self.depth == 3:
+                    self.object_start = i
+            elif c in "}]":
+                if c == "}" and self.in_panels and self.depth == 3 and self.object_start is not None:
+                    panels.append(json.loads(text[self.object_start:i + 1]))
+                    self.object_start = None
+                    self.panel_count += 1
+                elif c == "]" and self.in_panels and self.depth == 2:
+                    self.in_panels = False
+                self.depth -= 1
+
+        self.pos = len(text)
+        return panels
+
+
+class StreamInterruptedError(Exception):
+    """A streamed storyboard failed after panels were already handed to on_panel"""
+
+
+def _stream_storyboard(prompt: Prompt, on_panel) -> tuple:
+    """
+    One streamed completion; on_panel(panel, index) fires as each panel closes.
+    Returns (storyboard, usage) - usage comes from the final chunk (None if
+    the API sent none), for the rate limiter's token correction.
+
+    Once a panel has been passed on, a failure is raised as
+    StreamInterruptedError so the rate limiter doesn't retry it: a second
+    completion would write different panels under the same indices.
+    """
+    stream = client.chat.completions.create(
+        model=MODEL,
+        messages=prompt.messages,
+        response_format={"type": "json_object"},
+        stream=True,
+        # Final chunk carries the usage (passed through for older SDKs too)
+        extra_body={"stream_options": {"include_usage": True}}
+    )
+
+    parser = PanelStreamParser()
+    usage = None
+    delivered = 0
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            for panel in parser.feed(delta):
+                on_panel(panel, parser.panel_count - 1)
+                delivered += 1
+    except Exception as e:
+        if delivered:
+            raise StreamInterruptedError(
+                f"Storyboard stream failed after {delivered} panels: {str(e)}"
+            ) from e
+        raise
+
+    prompt_stats.record(prompt, usage)
+    return json.loads(parser.text), usage
+
+
+def generate_storyboard(segment_data: dict, on_panel=None):
+    """
+    Creates a 6-panel comic storyboard from the selected viral segment.
+    Returns structured JSON with panel descriptions ready for image generation.
+
+    With on_panel(panel, index), the completion is streamed and each panel
+    is passed on as soon as its JSON object is complete, so rendering can
+    start while later panels are still being written.
     """
+    prompt = build_storyboard_prompt(segment_data)
+    tokens = len(prompt) // CHARS_PER_TOKEN + RESPONSE_TOKENS
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"}
+    if on_panel is not None:
+        result, _ = limiter.call(
+            _stream_storyboard, prompt, on_panel,
+            tokens=tokens,
+            usage=lambda result: result[1].total_tokens if result[1] else None
+        )
+        return result
+
+    response = limiter.call(
+        client.chat.completions.create,
+        model=MODEL,
+        messages=prompt.messages,
+        response_format={"type": "json_object"},
+        tokens=tokens,
+        usage=lambda response: response.usage.total_tokens
     )
+    prompt_stats.record(prompt, response.usage)
 
     result = json.loads(response.choices[0].message.content)
     return result
-
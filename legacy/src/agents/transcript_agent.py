@@ -1,50 +1,270 @@
 from youtube_transcript_api import YouTubeTranscriptApi
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+import os
 import re
+import threading
+import time
 
-def get_transcript(video_url: str) -> str:
+# Language preference order, best first (manual transcripts win over auto-generated)
+TRANSCRIPT_LANGUAGES = [
+    lang.strip() for lang in os.getenv("TRANSCRIPT_LANGUAGES", "en,en-US,en-GB,en-CA").split(",") if lang.strip()
+]
+
+# Per-video cache of available transcript listings
+TRANSCRIPT_LIST_TTL_SECONDS = int(os.getenv("TRANSCRIPT_LIST_TTL_SECONDS", "3600"))
+TRANSCRIPT_LIST_CACHE_SIZE = 512
+
+# One client for the process so its HTTP session (keep-alive) is reused
+_api = YouTubeTranscriptApi()
+_listing_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_listing_lock = threading.Lock()
+
+
+class Transcript:
     """
-    Extract transcript from YouTube video
-    
+    Compact, timestamp-preserving transcript.
+
+    One text buffer plus parallel arrays (character offset, start, duration)
+    per caption snippet. Lookups in either direction (time → text, text →
+    time) are a binary search, so excerpts can be sliced locally instead of
+    asking the LLM to quote them.
+    """
+
+    __slots__ = ("text", "offsets", "starts", "durations")
+
+    def __init__(self, text: str, offsets: array, starts: array, durations: array):
+        self.text = text
+        self.offsets = offsets
+        self.starts = starts
+        self.durations = durations
+
+    @classmethod
+    def from_snippets(cls, snippets) -> "Transcript":
+        """Build from youtube-transcript-api snippets (.text, .start, .duration)"""
+        parts = []
+        offsets, starts, durations = array("q"), array("d"), array("d")
+        position = 0
+
+        for snippet in snippets:
+            text = " ".join(snippet.text.split())
+            if not text:
+                continue
+            offsets.append(position)
+            starts.append(float(snippet.start))
+            durations.append(float(snippet.duration))
+            parts.append(text)
+            position += len(text) + 1
+
+        return cls(" ".join(parts), offsets, starts, durations)
+
+    @classmethod
+    def from_text(cls, text: str) -> "Transcript":
+        """Wrap plain text with no timing information (one snippet at 0:00)"""
+        return cls(text, array("q", [0]), array("d", [0.0]), array("d", [0.0]))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Transcript":
+        return cls(data["text"], array("q", data["offsets"]), array("d", data["starts"]),
+                   array("d", data["durations"]))
+
+    def to_dict(self) -> dict:
+        return {
+            "text": self.text,
+            "offsets": self.offsets.tolist(),
+            "starts": self.starts.tolist(),
+            "durations": self.durations.tolist()
+        }
+
+    def __len__(self):
+        return len(self.text)
+
+    def __str__(self):
+        return self.text
+
+    @property
+    def duration(self) -> float:
+        if not self.starts:
+            return 0.0
+        return self.starts[-1] + self.durations[-1]
+
+    def snippet_at_time(self, seconds: float) -> int:
+        """Index of the snippet being spoken at `seconds`"""
+        return max(bisect_right(self.starts, seconds) - 1, 0)
+
+    def snippet_at_offset(self, offset: int) -> int:
+        """Index of the snippet containing character `offset`"""
+        return max(bisect_right(self.offsets, offset) - 1, 0)
+
+    def time_at_offset(self, offset: int) -> float:
+        if not self.starts:
+            return 0.0
+        return self.starts[self.snippet_at_offset(offset)]
+
+    def offset_at_time(self, seconds: float) -> int:
+        if not self.offsets:
+            return 0
+        return self.offsets[self.snippet_at_time(seconds)]
+
+    def slice_time(self, start: float, end: float) -> str:
+        """Text spoken between `start` and `end` seconds (whole snippets)"""
+        if not self.offsets:
+            return ""
+        first = self.snippet_at_time(start)
+        last = self.snippet_at_time(end)
+        end_offset = self.offsets[last + 1] - 1 if last + 1 < len(self.offsets) else len(self.text)
+        return self.text[self.offsets[first]:end_offset]
+
+    def snippets(self, first: int, last: int) -> "Transcript":
+        """Snippets first..last (inclusive) as their own Transcript, timings kept"""
+        end_offset = self.offsets[last + 1] - 1 if last + 1 < len(self.offsets) else len(self.text)
+        base = self.offsets[first]
+        return Transcript(
+            self.text[base:end_offset],
+            array("q", (offset - base for offset in self.offsets[first:last + 1])),
+            self.starts[first:last + 1],
+            self.durations[first:last + 1]
+        )
+
+    def timestamped_text(self, marker_every: float = 30.0) -> str:
+        """Text with a [m:ss] marker at least every `marker_every` seconds"""
+        if len(self.offsets) <= 1:
+            return self.text
+
+        parts = []
+        next_marker = 0.0
+        for i, start in enumerate(self.starts):
+            end_offset = self.offsets[i + 1] - 1 if i + 1 < len(self.offsets) else len(self.text)
+            if start >= next_marker:
+                parts.append(f"[{format_timestamp(start)}]")
+                next_marker = start + marker_every
+            parts.append(self.text[self.offsets[i]:end_offset])
+
+        return " ".join(parts)
+
+
+def format_timestamp(seconds: float) -> str:
+    """Seconds to H:MM:SS or M:SS"""
+    seconds = int(seconds)
+    hours, minutes, secs = seconds // 3600, (seconds % 3600) // 60, seconds % 60
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def parse_timestamp(value) -> float:
+    """'8:45' / '1:02:03' / 525 to seconds (None if unparseable)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        seconds = 0.0
+        for part in str(value).strip().split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def _listing_for(video_id: str, timings: dict):
+    """Available transcripts for a video (one request, cached per video id)"""
+    with _listing_lock:
+        cached = _listing_cache.get(video_id)
+        if cached and cached[0] > time.time():
+            timings["list_cached"] = True
+            return cached[1]
+
+    step_start = time.time()
+    listing = list(_api.list(video_id))
+    timings["list_seconds"] = time.time() - step_start
+
+    with _listing_lock:
+        _listing_cache[video_id] = (time.time() + TRANSCRIPT_LIST_TTL_SECONDS, listing)
+        while len(_listing_cache) > TRANSCRIPT_LIST_CACHE_SIZE:
+            _listing_cache.popitem(last=False)
+    return listing
+
+
+def resolve_transcript(listing, languages=None):
+    """
+    Pick the best transcript from a listing: the first preferred language
+    with a manually created transcript, else the first preferred language
+    with an auto-generated one. Returns None if nothing matches.
+    """
+    languages = languages or TRANSCRIPT_LANGUAGES
+    for want_generated in (False, True):
+        for language in languages:
+            for transcript in listing:
+                if transcript.language_code == language and transcript.is_generated == want_generated:
+                    return transcript
+    return None
+
+
+def fetch_transcript(video_url: str, languages=None, timings: dict = None) -> Transcript:
+    """
+    Extract a timestamped transcript from a YouTube video.
+
+    Lists the available transcripts once (cached per video id), resolves the
+    best match from the language preference order (TRANSCRIPT_LANGUAGES,
+    manual before auto-generated) and fetches only that one.
+
     Args:
         video_url: YouTube video URL
-        
-    Returns:
-        str: Full transcript text
+        languages: Language preference order (default TRANSCRIPT_LANGUAGES)
+        timings: Optional dict filled with per-step latencies (list/resolve/fetch)
+
+    Raises:
+        ValueError: Invalid URL or no transcript in a preferred language
     """
+    timings = {} if timings is None else timings
+
     # Extract video ID from URL
     video_id = extract_video_id(video_url)
-    
+
     if not video_id:
-        return "Error: Invalid YouTube URL"
-    
-    try:
-        # Fetch transcript using youtube-transcript-api (v1.2.3+)
-        # Try multiple language codes to increase compatibility
-        api = YouTubeTranscriptApi()
-
-        # Try different English variants
-        for lang_codes in [['en'], ['en-US'], ['en-GB'], ['en-CA']]:
-            try:
-                transcript_obj = api.fetch(video_id, languages=lang_codes)
-                # Extract text from transcript snippets
-                full_transcript = " ".join([snippet.text for snippet in transcript_obj.snippets])
-                return full_transcript
-            except:
-                continue
+        raise ValueError("Invalid YouTube URL")
+
+    listing = _listing_for(video_id, timings)
+
+    step_start = time.time()
+    match = resolve_transcript(listing, languages)
+    timings["resolve_seconds"] = time.time() - step_start
 
-        # If no English transcript found, try to list available transcripts
-        api2 = YouTubeTranscriptApi()
-        transcript_list = api2.list(video_id)
-        available = [t.language_code for t in transcript_list]
-        return f"Error: No English transcript found. Available languages: {', '.join(available)}"
+    if match is None:
+        wanted = ', '.join(languages or TRANSCRIPT_LANGUAGES)
+        available = ', '.join(t.language_code for t in listing)
+        raise ValueError(f"No transcript found for {wanted}. Available languages: {available}")
 
+    step_start = time.time()
+    fetched = match.fetch()
+    timings["fetch_seconds"] = time.time() - step_start
+    timings["language"] = match.language_code
+    timings["is_generated"] = match.is_generated
+
+    return Transcript.from_snippets(fetched.snippets)
+
+
+def get_transcript(video_url: str) -> str:
+    """
+    Extract transcript from YouTube video
+
+    Args:
+        video_url: YouTube video URL
+
+    Returns:
+        str: Full transcript text
+    """
+    try:
+        return fetch_transcript(video_url).text
+    except ValueError as e:
+        return f"Error: {str(e)}"
     except Exception as e:
         return f"Error fetching transcript: {str(e)}"
 
 def extract_video_id(video_url: str) -> str:
     """
     Extract video ID from various YouTube URL formats
-    
+
     Examples:
         - https://www.youtube.com/watch?v=VIDEO_ID
         - https://youtu.be/VIDEO_ID
@@ -55,11 +275,10 @@ def extract_video_id(video_url: str) -> str:
         r'(?:embed\/)([0-9A-Za-z_-]{11})',
         r'(?:watch\?v=)([0-9A-Za-z_-]{11})'
     ]
-    
+
     for pattern in patterns:
         match = re.search(pattern, video_url)
         if match:
             return match.group(1)
-    
-    return None
 
+    return None
@@ -0,0 +1,128 @@
+"""
+Batch ingestion for many videos at once
+Runs deduplicated pipelines on a shared worker pool and yields one event per
+video as it finishes (completion order, not submission order).
+"""
+
+import os
+import time
+import uuid
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Tuple
+
+from pipeline import run_jetski_pipeline
+from stages import stage_limiter
+from agents.transcript_agent import extract_video_id
+
+# Pipelines in flight across all batches; the per-provider stage limits
+# (stages.py) decide how many of them actually hit a provider at once
+BATCH_WORKERS = int(os.getenv("JETSKI_BATCH_WORKERS", "16"))
+
+BATCH_MAX_URLS = int(os.getenv("JETSKI_BATCH_MAX_URLS", "500"))
+
+
+def dedupe_urls(video_urls: List[str]) -> Tuple[Dict[str, str], List[str], List[str]]:
+    """
+    Split URLs into unique videos, duplicates and invalid URLs.
+
+    Returns:
+        tuple: ({video_id: first url seen}, [duplicate urls], [invalid urls])
+    """
+    unique, duplicates, invalid = {}, [], []
+    for url in video_urls:
+        video_id = extract_video_id(url)
+        if not video_id:
+            invalid.append(url)
+        elif video_id in unique:
+            duplicates.append(url)
+        else:
+            unique[video_id] = url
+    return unique, duplicates, invalid
+
+
+def summarize_result(result: Dict) -> Dict:
+    """Compact per-video completion payload (no panel bytes)"""
+    images = result.get("images") or {}
+    doc = result.get("google_doc") or {}
+    metrics = result.get("metrics") or {}
+    return {
+        "title": result.get("video_title"),
+        "storyboard_title": (result.get("storyboard") or {}).get("title"),
+        "panels_generated": images.get("success_count", 0),
+        "google_doc_url": doc.get("doc_url"),
+        "drive_folder_url": doc.get("drive_folder_url"),
+        "comic_id": metrics.get("comic_id"),
+        "video_pk": metrics.get("video_id"),
+        "total_time_seconds": metrics.get("total_time_seconds")
+    }
+
+
+class BatchRunner:
+    """Shared pool that runs many pipelines and streams their completions"""
+
+    def __init__(self, max_workers: int = BATCH_WORKERS):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jetski-batch")
+
+    async def run(self, video_urls: List[str], generate_images: bool = True,
+                  create_google_doc: bool = False) -> AsyncIterator[Dict]:
+        """
+        Queue every unique video and yield events as they happen (async, so
+        a long batch waits on the event loop rather than holding a thread):
+
+            accepted  - once, with counts of unique/duplicate/invalid URLs
+            completed - per video, with a result summary
+            failed    - per video (or invalid URL), with the error
+            done      - once, with totals and wall time
+
+        Work keeps running if the consumer stops reading.
+        """
+        batch_id = uuid.uuid4().hex
+        batch_start = time.time()
+        unique, duplicates, invalid = dedupe_urls(video_urls)
+
+        yield {
+            "event": "accepted",
+            "batch_id": batch_id,
+            "videos": len(unique),
+            "duplicates": duplicates,
+            "invalid": len(invalid)
+        }
+
+        for url in invalid:
+            yield {"event": "failed", "video_url": url, "video_id": None, "error": "Invalid YouTube URL"}
+
+        futures = {
+            asyncio.wrap_future(self._executor.submit(
+                run_jetski_pipeline, url, generate_images=generate_images, create_google_doc=create_google_doc
+            )): (video_id, url)
+            for video_id, url in unique.items()
+        }
+
+        succeeded = 0
+        pending = set(futures)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                video_id, url = futures[future]
+                event = {"video_id": video_id, "video_url": url,
+                         "elapsed_seconds": round(time.time() - batch_start, 3)}
+                try:
+                    yield {"event": "completed", **event, "result": summarize_result(future.result())}
+                    succeeded += 1
+                except Exception as e:
+                    print(f"❌ Batch {batch_id[:8]}: {url} failed: {str(e)}")
+                    yield {"event": "failed", **event, "error": str(e)}
+
+        yield {
+            "event": "done",
+            "batch_id": batch_id,
+            "succeeded": succeeded,
+            "failed": len(unique) - succeeded + len(invalid),
+            "wall_time_seconds": round(time.time() - batch_start, 3),
+            "stages": stage_limiter.stats()
+        }
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
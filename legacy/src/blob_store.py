@@ -0,0 +1,237 @@
+"""
+Content-addressed blob store for panel images
+Blobs are keyed by the SHA-256 of their raw bytes, so identical images are stored once.
+Local filesystem by default; any S3-compatible service via BLOB_STORE=s3.
+"""
+
+import os
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+BLOB_STORE_PATH = Path(os.getenv("BLOB_STORE_PATH", str(Path(__file__).parent.parent / "data" / "blobs")))
+
+# S3-compatible settings (AWS, MinIO, R2, Supabase Storage S3 endpoint, ...)
+BLOB_S3_BUCKET = os.getenv("BLOB_S3_BUCKET")
+BLOB_S3_ENDPOINT_URL = os.getenv("BLOB_S3_ENDPOINT_URL")
+BLOB_S3_PREFIX = os.getenv("BLOB_S3_PREFIX", "blobs/")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def guess_mime_type(head: bytes) -> str:
+    """Sniff an image mime type from the first bytes of a blob"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    return "application/octet-stream"
+
+
+def _is_valid_key(sha256: str) -> bool:
+    return len(sha256) == 64 and all(c in "0123456789abcdef" for c in sha256)
+
+
+class BlobStore(ABC):
+    """Interface for content-addressed storage"""
+
+    @abstractmethod
+    def put(self, data: bytes, mime_type: str = "application/octet-stream") -> Dict:
+        """
+        Store bytes (no-op if already present).
+
+        Returns:
+            dict: {"sha256": str, "size": int, "mime_type": str}
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def head(self, sha256: str) -> Optional[Dict]:
+        """
+        Size and content type recorded at write time, without reading the blob.
+
+        Returns:
+            dict: {"size": int, "mime_type": str}, or None if the blob doesn't exist
+        """
+        raise NotImplementedError
+
+    def size(self, sha256: str) -> Optional[int]:
+        """Size in bytes, or None if the blob doesn't exist"""
+        head = self.head(sha256)
+        return head["size"] if head else None
+
+    @abstractmethod
+    def iter_range(self, sha256: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield bytes start..end (inclusive) in chunks"""
+        raise NotImplementedError
+
+    def get(self, sha256: str) -> bytes:
+        return b"".join(self.iter_range(sha256))
+
+
+def _content_type(data: bytes, mime_type: str) -> str:
+    """The caller's mime type, or a sniffed one if it didn't know"""
+    if mime_type and mime_type != "application/octet-stream":
+        return mime_type
+    return guess_mime_type(data[:12])
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files under root/ab/cd/<sha256>, content type in <sha256>.type"""
+
+    def __init__(self, root: Path = BLOB_STORE_PATH):
+        self.root = Path(root)
+
+    def _path(self, sha256: str) -> Path:
+        if not _is_valid_key(sha256):
+            raise ValueError(f"Invalid blob key: {sha256}")
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def _type_path(self, path: Path) -> Path:
+        return path.with_name(path.name + ".type")
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes):
+        # Write to a temp file then rename, so readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def put(self, data: bytes, mime_type: str = "application/octet-stream") -> Dict:
+        sha256 = sha256_hex(data)
+        path = self._path(sha256)
+        mime_type = _content_type(data, mime_type)
+
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Type first, so a visible blob always has one
+            self._write_atomic(self._type_path(path), mime_type.encode("ascii"))
+            self._write_atomic(path, data)
+
+        return {"sha256": sha256, "size": len(data), "mime_type": mime_type}
+
+    def head(self, sha256: str) -> Optional[Dict]:
+        try:
+            path = self._path(sha256)
+            size = path.stat().st_size
+        except (FileNotFoundError, ValueError):
+            return None
+        try:
+            mime_type = self._type_path(path).read_text("ascii").strip()
+        except (OSError, UnicodeDecodeError):
+            # Written before types were recorded: sniff it (local read) and record it
+            with open(path, "rb") as f:
+                mime_type = guess_mime_type(f.read(12))
+            try:
+                self._write_atomic(self._type_path(path), mime_type.encode("ascii"))
+            except OSError:
+                pass
+        return {"size": size, "mime_type": mime_type}
+
+    def iter_range(self, sha256: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        with open(self._path(sha256), "rb") as f:
+            f.seek(start)
+            remaining = None if end is None else end - start + 1
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+
+class S3BlobStore(BlobStore):
+    """Blobs as objects in an S3-compatible bucket (requires boto3)"""
+
+    def __init__(self, bucket: str = BLOB_S3_BUCKET, endpoint_url: str = BLOB_S3_ENDPOINT_URL,
+                 prefix: str = BLOB_S3_PREFIX, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise ImportError("BLOB_STORE=s3 requires boto3: pip install boto3")
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+
+        if not bucket:
+            raise ValueError("Missing BLOB_S3_BUCKET for BLOB_STORE=s3")
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _key(self, sha256: str) -> str:
+        if not _is_valid_key(sha256):
+            raise ValueError(f"Invalid blob key: {sha256}")
+        return f"{self.prefix}{sha256}"
+
+    def put(self, data: bytes, mime_type: str = "application/octet-stream") -> Dict:
+        sha256 = sha256_hex(data)
+        mime_type = _content_type(data, mime_type)
+        if self.head(sha256) is None:
+            self.client.put_object(Bucket=self.bucket, Key=self._key(sha256), Body=data,
+                                   ContentType=mime_type)
+        return {"sha256": sha256, "size": len(data), "mime_type": mime_type}
+
+    def head(self, sha256: str) -> Optional[Dict]:
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._key(sha256))
+        except Exception as e:
+            # Only "not found" means no blob; credential/network errors propagate
+            if _is_not_found(e):
+                return None
+            raise
+        return {"size": head["ContentLength"], "mime_type": head.get("ContentType") or "application/octet-stream"}
+
+    def iter_range(self, sha256: str, start: int = 0, end: Optional[int] = None,
+                   chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        obj = self.client.get_object(Bucket=self.bucket, Key=self._key(sha256), Range=byte_range)
+        body = obj["Body"]
+        try:
+            while True:
+                chunk = body.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+
+def _is_not_found(error: Exception) -> bool:
+    """botocore ClientError for a missing key (HEAD responses carry no error body, just 404)"""
+    response = getattr(error, "response", None)
+    if not isinstance(response, dict):
+        return False
+    code = str(response.get("Error", {}).get("Code", ""))
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in ("404", "NoSuchKey", "NotFound") or status == 404
+
+
+_blob_store: Optional[BlobStore] = None
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide blob store selected by BLOB_STORE (local | s3)"""
+    global _blob_store
+    if _blob_store is None:
+        _blob_store = S3BlobStore() if BLOB_STORE == "s3" else LocalBlobStore()
+    return _blob_store
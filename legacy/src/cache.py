@@ -0,0 +1,187 @@
+"""
+Result cache for expensive pipeline steps
+Layered: in-process LRU first, then the database. Keys are the canonical
+YouTube video id plus a hash of the prompt/model that produced the result.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+# In-process tier limits
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", str(24 * 3600)))
+
+# Database tier lifetime
+CACHE_DB_TTL_SECONDS = int(os.getenv("CACHE_DB_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def fingerprint(*parts: str) -> str:
+    """Short SHA-256 over the given strings (prompt, model name, ...)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def cache_key(kind: str, video_id: str, version: str) -> str:
+    return f"{kind}:{video_id}:{version}"
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL and a total size budget"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES,
+                 ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, size, expires_at = entry
+            if expires_at < time.time():
+                self._remove(key)
+                self.expirations += 1
+                return None
+
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (value, size, time.time() + self.ttl_seconds)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+
+class ResultCache:
+    """
+    Two-tier cache: LRU in memory, then the database module's
+    get_cached_result/save_cached_result (Supabase or SQLite).
+    """
+
+    def __init__(self, db=None, memory: LRUCache = None, db_ttl_seconds: int = CACHE_DB_TTL_SECONDS):
+        self.db = db
+        self.memory = memory or LRUCache()
+        self.db_ttl_seconds = db_ttl_seconds
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def get_or_compute(
+        self,
+        kind: str,
+        video_id: Optional[str],
+        version: str,
+        compute: Callable[[], Any],
+        cacheable: Callable[[Any], bool] = lambda value: True
+    ) -> Any:
+        """
+        Return the cached result for (kind, video_id, version) or compute and store it.
+
+        Args:
+            kind: Result type ("transcript", "viral_analysis", "storyboard")
+            video_id: Canonical YouTube video id (None disables caching)
+            version: Hash of the prompt/model that produces the result
+            compute: Called on a miss
+            cacheable: Results failing this check (e.g. error strings) are not stored
+        """
+        if not video_id:
+            return compute()
+
+        key = cache_key(kind, video_id, version)
+
+        value = self.memory.get(key)
+        if value is not None:
+            self._count(kind, "memory_hits")
+            return value
+
+        value = self._db_get(key)
+        if value is not None and cacheable(value):
+            self._count(kind, "db_hits")
+            self.memory.put(key, value, _estimate_size(value))
+            return value
+
+        self._count(kind, "misses")
+        value = compute()
+        if cacheable(value):
+            self.memory.put(key, value, _estimate_size(value))
+            self._db_put(key, kind, video_id, value)
+        return value
+
+    def stats(self) -> Dict:
+        with self._lock:
+            by_kind = {kind: dict(counts) for kind, counts in self._counters.items()}
+        return {
+            "entries": len(self.memory),
+            "size_bytes": self.memory.size_bytes,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "by_kind": by_kind
+        }
+
+    def _count(self, kind: str, counter: str):
+        with self._lock:
+            counts = self._counters.setdefault(kind, {"memory_hits": 0, "db_hits": 0, "misses": 0})
+            counts[counter] += 1
+
+    def _db_get(self, key: str) -> Optional[Any]:
+        if self.db is None:
+            return None
+        return self._safe(lambda: self.db.get_cached_result(key))
+
+    def _db_put(self, key: str, kind: str, video_id: str, value: Any):
+        if self.db is None:
+            return
+        self._safe(lambda: self.db.save_cached_result(key, kind, video_id, value, self.db_ttl_seconds))
+
+    @staticmethod
+    def _safe(func: Callable[[], Any]) -> Optional[Any]:
+        # The cache must never fail a request - a broken DB tier is just a miss
+        try:
+            return func()
+        except Exception as e:
+            print(f"   ⚠️  Cache database tier error: {str(e)}")
+            return None
+
+
+def _estimate_size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value)
+    return len(json.dumps(value, default=str))
@@ -3,20 +3,77 @@ Database module for JetSki
 Stores video analysis results, storyboards, and generation history
 """
 
+import os
 import sqlite3
 import json
+import time
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 from typing import Optional, Dict, List
 
+from metrics import create_sink, observe_step
+
 # Database file location
 DB_PATH = Path(__file__).parent.parent / "data" / "jetski.db"
 
-def init_db():
-    """Initialize database with required tables"""
+# Connection tuning
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "16384"))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+# One long-lived connection per thread (sqlite3 connections are not thread-safe)
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get this thread's connection, opening and tuning it on first use.
+
+    Connections run in WAL mode with synchronous=NORMAL (one fsync per
+    checkpoint instead of per commit) and keep a per-connection cache of
+    prepared statements, so repeated inserts skip re-parsing the SQL.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == DB_PATH:
+        return conn
+
+    close_connection()
     DB_PATH.parent.mkdir(exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = sqlite3.connect(DB_PATH, cached_statements=DB_STATEMENT_CACHE)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+    _local.conn = conn
+    _local.path = DB_PATH
+    return conn
+
+
+def close_connection():
+    """Close this thread's connection (if any)"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+    _local.conn = None
+    _local.path = None
+
+
+@contextmanager
+def transaction():
+    """Yield a cursor inside a transaction - commits on success, rolls back on error"""
+    conn = get_connection()
+    with conn:
+        yield conn.cursor()
+
+
+
+def init_db():
+    """Initialize database with required tables"""
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Videos table - stores video metadata and analysis
@@ -96,178 +153,224 @@ def init_db():
         )
     """)
 
+    # Result cache table - stores transcripts / LLM outputs keyed by video id + prompt hash
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            video_id TEXT NOT NULL,
+            payload_json TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    migrate_db(cursor)
+
     conn.commit()
-    conn.close()
+
+
+def migrate_db(cursor: sqlite3.Cursor):
+    """
+    Idempotent schema upgrades for databases created by older versions.
+
+    Adds the foreign-key and ordering indexes that /history and the
+    per-video lookups rely on.
+    """
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_videos_created_at ON videos(created_at, id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_videos_video_id ON videos(video_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_viral_segments_video_id ON viral_segments(video_id, rank)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_storyboards_video_id ON storyboards(video_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_generated_comics_storyboard_id ON generated_comics(storyboard_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_metrics_video_id ON metrics(video_id)")
+
+    # Refresh planner statistics for the new indexes (cheap, only re-analyzes when needed)
+    cursor.execute("PRAGMA optimize")
 
 
 def save_video(video_url: str, video_id: str, title: str = None,
                duration: int = None, transcript: str = None) -> int:
     """Save video metadata to database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     try:
-        cursor.execute("""
-            INSERT INTO videos (video_url, video_id, title, duration, transcript)
-            VALUES (?, ?, ?, ?, ?)
-        """, (video_url, video_id, title, duration, transcript))
-
-        video_pk = cursor.lastrowid
-        conn.commit()
-        return video_pk
+        with transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO videos (video_url, video_id, title, duration, transcript)
+                VALUES (?, ?, ?, ?, ?)
+            """, (video_url, video_id, title, duration, transcript))
+            return cursor.lastrowid
     except sqlite3.IntegrityError:
         # Video already exists, get its ID
-        cursor.execute("SELECT id FROM videos WHERE video_url = ?", (video_url,))
-        video_pk = cursor.fetchone()[0]
-        return video_pk
-    finally:
-        conn.close()
+        row = get_connection().execute(
+            "SELECT id FROM videos WHERE video_url = ?", (video_url,)
+        ).fetchone()
+        return row[0]
 
 
 def save_viral_segments(video_pk: int, segments: List[Dict], selected_rank: int):
     """Save viral segment analysis to database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    for segment in segments:
-        cursor.execute("""
+    with transaction() as cursor:
+        cursor.executemany("""
             INSERT INTO viral_segments
             (video_id, rank, score, start_time, end_time, viral_type,
              hook, summary, transcript_excerpt, is_selected)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            video_pk,
-            segment.get('rank'),
-            segment.get('score'),
-            segment.get('start_time'),
-            segment.get('end_time'),
-            segment.get('viral_type'),
-            segment.get('hook'),
-            segment.get('summary'),
-            segment.get('transcript_excerpt'),
-            1 if segment.get('rank') == selected_rank else 0
-        ))
-
-    conn.commit()
-
-    # Return ID of selected segment
-    cursor.execute("""
-        SELECT id FROM viral_segments
-        WHERE video_id = ? AND rank = ?
-    """, (video_pk, selected_rank))
+        """, [
+            (
+                video_pk,
+                segment.get('rank'),
+                segment.get('score'),
+                segment.get('start_time'),
+                segment.get('end_time'),
+                segment.get('viral_type'),
+                segment.get('hook'),
+                segment.get('summary'),
+                segment.get('transcript_excerpt'),
+                1 if segment.get('rank') == selected_rank else 0
+            )
+            for segment in segments
+        ])
+
+        # Return ID of selected segment
+        cursor.execute("""
+            SELECT id FROM viral_segments
+            WHERE video_id = ? AND rank = ?
+        """, (video_pk, selected_rank))
 
-    segment_id = cursor.fetchone()[0]
-    conn.close()
-    return segment_id
+        return cursor.fetchone()[0]
 
 
 def save_storyboard(video_pk: int, segment_id: int, storyboard_data: Dict) -> int:
     """Save storyboard to database"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO storyboards
-        (video_id, segment_id, title, style, tone, panels_json)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        video_pk,
-        segment_id,
-        storyboard_data.get('title'),
-        storyboard_data.get('style'),
-        storyboard_data.get('tone'),
-        json.dumps(storyboard_data.get('panels', []))
-    ))
-
-    storyboard_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return storyboard_id
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT INTO storyboards
+            (video_id, segment_id, title, style, tone, panels_json)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            video_pk,
+            segment_id,
+            storyboard_data.get('title'),
+            storyboard_data.get('style'),
+            storyboard_data.get('tone'),
+            json.dumps(storyboard_data.get('panels', []))
+        ))
+        return cursor.lastrowid
 
 
 def save_generated_comic(storyboard_id: int, images_data: Optional[Dict] = None,
                          google_doc_url: str = None, drive_folder_url: str = None,
                          generation_time: float = None, status: str = "success") -> int:
     """Save final generated comic results"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        INSERT INTO generated_comics
-        (storyboard_id, images_json, google_doc_url, drive_folder_url,
-         generation_time_seconds, status)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (
-        storyboard_id,
-        json.dumps(images_data) if images_data else None,
-        google_doc_url,
-        drive_folder_url,
-        generation_time,
-        status
-    ))
-
-    comic_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
-    return comic_id
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT INTO generated_comics
+            (storyboard_id, images_json, google_doc_url, drive_folder_url,
+             generation_time_seconds, status)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (
+            storyboard_id,
+            json.dumps(images_data) if images_data else None,
+            google_doc_url,
+            drive_folder_url,
+            generation_time,
+            status
+        ))
+        return cursor.lastrowid
 
 
 def log_metric(video_pk: int, step: str, duration: float,
                success: bool = True, error: str = None):
-    """Log performance metric for a pipeline step"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    """
+    Log performance metric for a pipeline step.
+    Non-blocking: rows are buffered and written in batches by a background thread.
+    """
+    observe_step(step, duration, success)
+    _metrics_sink.record({
+        "video_id": video_pk,
+        "step": step,
+        "duration_seconds": duration,
+        "success": success,
+        "error_message": error
+    })
 
-    cursor.execute("""
-        INSERT INTO metrics (video_id, step, duration_seconds, success, error_message)
-        VALUES (?, ?, ?, ?, ?)
-    """, (video_pk, step, duration, success, error))
 
-    conn.commit()
-    conn.close()
+def _insert_metrics(rows: List[Dict]):
+    """Write a batch of metric rows in one transaction"""
+    with transaction() as cursor:
+        cursor.executemany("""
+            INSERT INTO metrics (video_id, step, duration_seconds, success, error_message)
+            VALUES (:video_id, :step, :duration_seconds, :success, :error_message)
+        """, rows)
 
 
-def get_video_history(limit: int = 10) -> List[Dict]:
-    """Get recent video processing history"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+_metrics_sink = create_sink("sqlite", _insert_metrics)
 
-    cursor.execute("""
+
+def get_video_history(limit: int = 10) -> List[Dict]:
+    """
+    Get recent video processing history
+
+    Counts are correlated subqueries, so only the `limit` newest videos
+    are counted (via the created_at index) instead of grouping the
+    videos × segments × storyboards join for the whole table.
+    """
+    cursor = get_connection().execute("""
         SELECT
             v.id,
             v.video_url,
             v.title,
             v.created_at,
-            COUNT(DISTINCT vs.id) as segments_count,
-            COUNT(DISTINCT s.id) as storyboards_count,
-            COUNT(DISTINCT gc.id) as comics_count
+            (SELECT COUNT(*) FROM viral_segments vs
+             WHERE vs.video_id = v.id) as segments_count,
+            (SELECT COUNT(*) FROM storyboards s
+             WHERE s.video_id = v.id) as storyboards_count,
+            (SELECT COUNT(*) FROM storyboards s
+             JOIN generated_comics gc ON gc.storyboard_id = s.id
+             WHERE s.video_id = v.id) as comics_count
         FROM videos v
-        LEFT JOIN viral_segments vs ON v.id = vs.video_id
-        LEFT JOIN storyboards s ON v.id = s.video_id
-        LEFT JOIN generated_comics gc ON s.id = gc.storyboard_id
-        GROUP BY v.id
-        ORDER BY v.created_at DESC
+        ORDER BY v.created_at DESC, v.id DESC
         LIMIT ?
     """, (limit,))
 
-    results = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return results
+    return [dict(row) for row in cursor.fetchall()]
 
 
 def get_video_by_url(video_url: str) -> Optional[Dict]:
     """Get video data by URL"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    row = get_connection().execute(
+        "SELECT * FROM videos WHERE video_url = ?", (video_url,)
+    ).fetchone()
 
-    cursor.execute("SELECT * FROM videos WHERE video_url = ?", (video_url,))
-    row = cursor.fetchone()
-    conn.close()
+    return dict(row) if row else None
+
+
+def get_video_by_video_id(video_id: str) -> Optional[Dict]:
+    """Get video data by YouTube video ID"""
+    row = get_connection().execute(
+        "SELECT * FROM videos WHERE video_id = ? LIMIT 1", (video_id,)
+    ).fetchone()
 
     return dict(row) if row else None
 
 
+def get_cached_result(cache_key: str):
+    """Get an unexpired cached result by key"""
+    row = get_connection().execute("""
+        SELECT payload_json FROM result_cache
+        WHERE cache_key = ? AND expires_at > ?
+    """, (cache_key, time.time())).fetchone()
+
+    return json.loads(row[0]) if row else None
+
+
+def save_cached_result(cache_key: str, kind: str, video_id: str, payload, ttl_seconds: int):
+    """Store (or replace) a cached result"""
+    with transaction() as cursor:
+        cursor.execute("""
+            INSERT OR REPLACE INTO result_cache (cache_key, kind, video_id, payload_json, expires_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (cache_key, kind, video_id, json.dumps(payload), time.time() + ttl_seconds))
+
+
 # Initialize database on module import
 init_db()
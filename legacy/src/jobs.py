@@ -0,0 +1,174 @@
+"""
+In-process job queue for long-running pipeline runs
+Jobs run on a fixed pool of worker threads so HTTP handlers return immediately
+"""
+
+import os
+import threading
+import time
+import uuid
+import copy
+import queue
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Number of pipelines that may run at the same time
+JOB_WORKERS = int(os.getenv("JETSKI_WORKERS", "4"))
+
+# Finished jobs are forgotten after this many seconds
+JOB_TTL_SECONDS = int(os.getenv("JETSKI_JOB_TTL_SECONDS", "3600"))
+
+# Steps that fire more than once per run: collected in a list under the
+# given "partial" key instead of overwriting each other
+REPEATED_STEPS = {"panel": "panels"}
+
+# Id of the job the current thread is running (None outside a job)
+current_job_id = contextvars.ContextVar("current_job_id", default=None)
+
+
+class JobQueue:
+    """Thread-pool backed job runner with pollable status and partial results"""
+
+    def __init__(self, max_workers: int = JOB_WORKERS, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="jetski-job")
+        self._jobs: Dict[str, Dict] = {}
+        self._subscribers: Dict[str, List[queue.Queue]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func: Callable, *args, **kwargs) -> str:
+        """
+        Queue func(*args, on_step=..., **kwargs) and return the new job id.
+
+        func must accept an on_step(step_name, data) callback; each call is
+        recorded under the job's "partial" results (repeated steps such as
+        "panel" are appended to a list, see REPEATED_STEPS).
+        """
+        self._prune()
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "current_step": None,
+                "partial": {},
+                "result": None,
+                "error": None,
+                "created_at": time.time(),
+                "started_at": None,
+                "finished_at": None
+            }
+
+        self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Get a snapshot of a job's status and results"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.copy(job) if job else None
+
+    def subscribe(self, job_id: str, events=None):
+        """
+        Queue of (event, data) tuples for a job: the steps recorded so far,
+        then each new step as it happens, ending with ("complete", result)
+        or ("failed", error). None if the job doesn't exist.
+
+        events can be any object with a non-blocking put() (it is called
+        from the job's thread with the queue's lock held); default queue.Queue.
+        """
+        if events is None:
+            events = queue.Queue()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            for step, data in _replay(job["partial"]):
+                events.put((step, data))
+            if job["status"] == "success":
+                events.put(("complete", job["result"]))
+            elif job["status"] == "failed":
+                events.put(("failed", job["error"]))
+            else:
+                self._subscribers.setdefault(job_id, []).append(events)
+        return events
+
+    def unsubscribe(self, job_id: str, events):
+        with self._lock:
+            subscribers = self._subscribers.get(job_id, [])
+            if events in subscribers:
+                subscribers.remove(events)
+
+    def stats(self) -> Dict:
+        """Count jobs by status"""
+        counts = {"queued": 0, "running": 0, "success": 0, "failed": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+        counts["workers"] = self.max_workers
+        return counts
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            self._jobs[job_id].update(fields)
+
+    def _publish(self, job_id: str, event: str, data, final: bool = False):
+        """Send an event to the job's subscribers (call with the lock held)"""
+        subscribers = self._subscribers.pop(job_id, []) if final else self._subscribers.get(job_id, [])
+        for events in subscribers:
+            events.put((event, data))
+
+    def _record_step(self, job_id: str, step: str, data: Dict):
+        with self._lock:
+            job = self._jobs[job_id]
+            job["current_step"] = step
+            if step in REPEATED_STEPS:
+                key = REPEATED_STEPS[step]
+                job["partial"] = {**job["partial"], key: job["partial"].get(key, []) + [data]}
+            else:
+                job["partial"] = {**job["partial"], step: data}
+            self._publish(job_id, step, data)
+
+    def _run(self, job_id: str, func: Callable, args: tuple, kwargs: Dict):
+        self._update(job_id, status="running", started_at=time.time())
+        token = current_job_id.set(job_id)
+        try:
+            result = func(*args, on_step=lambda step, data: self._record_step(job_id, step, data), **kwargs)
+            with self._lock:
+                self._jobs[job_id].update(status="success", result=result, finished_at=time.time())
+                self._publish(job_id, "complete", result, final=True)
+        except Exception as e:
+            print(f"\n❌ Job {job_id} failed: {str(e)}\n")
+            with self._lock:
+                self._jobs[job_id].update(status="failed", error=str(e), finished_at=time.time())
+                self._publish(job_id, "failed", str(e), final=True)
+        finally:
+            current_job_id.reset(token)
+
+    def _prune(self):
+        """Drop finished jobs older than the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job["finished_at"] and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+def _replay(partial: Dict):
+    """(event, data) for every recorded step, repeated steps once per item"""
+    repeated = {key: step for step, key in REPEATED_STEPS.items()}
+    for key, data in partial.items():
+        if key in repeated:
+            for item in data:
+                yield repeated[key], item
+        else:
+            yield key, data
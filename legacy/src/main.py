@@ -1,11 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import RedirectResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
 import os
 import sys
-import time
 import io
+import json
+import asyncio
 from pathlib import Path
 
 # Fix Windows encoding for emojis
@@ -20,12 +22,19 @@ sys.path.insert(0, str(src_dir))
 # Import Supabase database module
 import supabase_client as db
 
-from agents.transcript_agent import get_transcript
-from agents.highlight_agent import find_viral_moments
+from agents.transcript_agent import extract_video_id
 from agents.storyboard_agent import generate_storyboard
-from agents.image_agent import generate_comic_panels, save_panel_image
-from agents.doc_agent import DocAgent
-from agents.metadata_agent import get_video_metadata
+from pipeline import run_jetski_pipeline, run_segment_images, cached_transcript, cached_viral_analysis, result_cache
+from jobs import JobQueue
+from batch import BatchRunner, BATCH_MAX_URLS
+from stages import stage_limiter
+from metrics import render_prometheus, close_sinks
+from blob_store import get_blob_store
+from renditions import choose_rendition, known_renditions, remember_renditions, close_transcoder
+from agents.image_agent import image_result_to_json
+from agents.rate_limiter import rate_limit_stats
+from agents.prompt_builder import prompt_stats
+from agents.render_cache import get_render_cache
 
 app = FastAPI(
     title="JetSki API",
@@ -42,11 +51,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Worker pool for /jetski runs (size: JETSKI_WORKERS)
+job_queue = JobQueue()
+
+# Shared pool for /jetski/batch runs (size: JETSKI_BATCH_WORKERS)
+batch_runner = BatchRunner()
+
+
+@app.on_event("shutdown")
+def shutdown_job_queue():
+    job_queue.shutdown(wait=False)
+    batch_runner.shutdown(wait=False)
+    # Write out buffered metric rows
+    close_sinks()
+    close_transcoder()
+
+
 # Request models
 class VideoRequest(BaseModel):
     video_url: str
     generate_images: bool = True
     create_google_doc: bool = False
+    all_storyboards: bool = False
+
+class BatchRequest(BaseModel):
+    video_urls: List[str]
+    generate_images: bool = True
+    create_google_doc: bool = False
 
 class FullPipelineResponse(BaseModel):
     video_url: str
@@ -55,6 +86,7 @@ class FullPipelineResponse(BaseModel):
     storyboard: dict
     images: Optional[dict] = None
     google_doc: Optional[dict] = None
+    segments: Optional[list] = None
     status: str
     metrics: Optional[dict] = None
 
@@ -65,12 +97,24 @@ def root():
         "message": "🚀 JetSki API is live",
         "version": "1.0.0",
         "endpoints": {
-            "/jetski": "POST - Full automated pipeline (YouTube URL → Comic + Google Doc)",
+            "/jetski": "POST - Queue full automated pipeline (YouTube URL → Comic + Google Doc)",
+            "/jetski/batch": "POST - Run the pipeline for many videos, streaming NDJSON completion events",
+            "/jetski/stream": "GET - Run the pipeline, streaming each step and panel as Server-Sent Events",
+            "/jobs/{id}": "GET - Pipeline job status and results",
+            "/segments/{id}/select": "POST - Switch the selected viral segment (optionally render its images)",
+            "/jobs/{id}/events": "GET - Server-Sent Events for an existing job",
             "/analyze": "POST - Get viral moment analysis only",
             "/storyboard": "POST - Generate storyboard from segment data",
             "/history": "GET - Get recent video processing history",
             "/comics": "GET - Get recent generated comics",
-            "/storyboard/{id}": "GET - Get storyboard with panels by ID"
+            "/storyboard/{id}": "GET - Get storyboard with panels by ID",
+            "/cache/stats": "GET - Result cache and panel render cache hit/miss counters",
+            "/stages/stats": "GET - Per-provider stage slots in use and waiting",
+            "/metrics": "GET - Prometheus metrics (step latency histograms, metrics sink counters)",
+            "/rate-limits/stats": "GET - Per-model queue depth, concurrency limit and 429 counts",
+            "/prompts/stats": "GET - Prompt tokens per request: saved by normalization, cached by the provider",
+            "/blobs/{sha256}": "GET - Stream a stored panel image (ETag + Range support)",
+            "/panels/{sha256}/image": "GET - Redirect to the panel rendition (carousel/thumb) picked by Accept header"
         }
     }
 
@@ -120,7 +164,7 @@ def get_storyboard(storyboard_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/jetski", response_model=FullPipelineResponse)
+@app.post("/jetski", status_code=202)
 def jetski_full_pipeline(request: VideoRequest):
     """
     🚀 FULL JETSKI PIPELINE - Automated end-to-end flow
@@ -135,160 +179,201 @@ def jetski_full_pipeline(request: VideoRequest):
     7. Create Google Doc summary with posting strategy
 
     No user decisions needed - AI picks the best viral moment automatically.
+    With all_storyboards, storyboards for the other ranked segments are
+    written in the same run; switch with POST /segments/{id}/select.
+
+    The run is queued on the in-process job pool; poll GET /jobs/{job_id}
+    for status, partial results and the final FullPipelineResponse.
     """
+    job_id = job_queue.submit(
+        run_jetski_pipeline,
+        request.video_url,
+        generate_images=request.generate_images,
+        create_google_doc=request.create_google_doc,
+        all_storyboards=request.all_storyboards
+    )
+    return {
+        "status": "queued",
+        "job_id": job_id,
+        "status_url": f"/jobs/{job_id}"
+    }
+
+
+# Comment line sent when no event arrived for this long, so proxies keep the stream open
+SSE_HEARTBEAT_SECONDS = 15
+
+
+def _event_payload(event: str, data):
+    """JSON-safe event data (panel bytes are referenced by /blobs path, never inlined)"""
+    if event == "images":
+        return image_result_to_json(data)
+    if event == "complete" and data:
+        return {**data, "images": image_result_to_json(data.get("images"))}
+    return data
+
+
+class _LoopQueue:
+    """
+    asyncio.Queue fed from other threads: put() hands the item to the event
+    loop, so a waiting SSE stream costs no worker thread.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def put(self, item):
+        try:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, item)
+        except RuntimeError:
+            # Loop already closed (server shutting down) - nobody is listening
+            pass
+
+
+async def _sse_stream(job_id: str, events: _LoopQueue):
+    """Format a job's events as Server-Sent Events until it completes or fails"""
     try:
-        pipeline_start = time.time()
-        print(f"\n{'='*60}")
-        print(f"🚀 JETSKI PIPELINE STARTED")
-        print(f"{'='*60}\n")
-
-        # STEP 0: Extract Video Metadata
-        print("🎬 STEP 0: Extracting video metadata...")
-        step_start = time.time()
-        metadata = get_video_metadata(request.video_url)
-        video_id = metadata.get('video_id')
-        video_title = metadata.get('title', 'Unknown Video')
-        duration = metadata.get('duration')
-        print(f"   ✅ Metadata extracted: {video_title}")
-        print(f"   Duration: {metadata.get('duration_formatted', 'Unknown')}\n")
-        db.log_metric(0, "metadata_extraction", time.time() - step_start)
-
-        # STEP 1: Extract Transcript
-        print("📝 STEP 1: Extracting YouTube transcript...")
-        step_start = time.time()
-        transcript = get_transcript(request.video_url)
-        print(f"   ✅ Transcript extracted ({len(transcript)} characters)\n")
-
-        # Save video to database
-        video_pk = db.save_video(
-            video_url=request.video_url,
-            video_id=video_id,
-            title=video_title,
-            duration=duration,
-            transcript=transcript
-        )
-        db.log_metric(video_pk, "transcript_extraction", time.time() - step_start)
-
-        # STEP 2: Find Viral Moments (AI auto-selects best one)
-        print("🔍 STEP 2: Analyzing viral moments...")
-        step_start = time.time()
-        viral_analysis = find_viral_moments(transcript)
-
-        selected_rank = viral_analysis["selected"]["rank"]
-        selected_segment = viral_analysis["segments"][selected_rank - 1]
-
-        print(f"   ✅ Found {len(viral_analysis['segments'])} viral moments")
-        print(f"   🎯 AI selected: {selected_segment['hook']} (Score: {selected_segment['score']}/100)\n")
-
-        # Save viral segments to database
-        segment_id = db.save_viral_segments(video_pk, viral_analysis["segments"], selected_rank)
-        db.log_metric(video_pk, "viral_analysis", time.time() - step_start)
-
-        # STEP 3: Generate Storyboard
-        print("🎨 STEP 3: Generating 6-panel storyboard...")
-        step_start = time.time()
-        storyboard_data = generate_storyboard(selected_segment)
-        print(f"   ✅ Storyboard created: {storyboard_data.get('title', 'Untitled')}\n")
-
-        # Save storyboard to database
-        storyboard_id = db.save_storyboard(video_pk, segment_id, storyboard_data)
-        db.log_metric(video_pk, "storyboard_generation", time.time() - step_start)
-
-        # STEP 4: Generate Images (if requested)
-        image_result = None
-        if request.generate_images:
-            print("🖼️  STEP 4: Generating comic panel images (NanoBanana)...")
-            step_start = time.time()
-            try:
-                image_result = generate_comic_panels(storyboard_data)
-                print(f"   ✅ Generated {image_result.get('success_count', 0)}/6 panels\n")
-                db.log_metric(video_pk, "image_generation", time.time() - step_start, success=True)
-            except Exception as e:
-                print(f"   ⚠️  Image generation failed: {str(e)}")
-                print(f"   Continuing without images...\n")
-                image_result = {"error": str(e), "success_count": 0}
-                db.log_metric(video_pk, "image_generation", time.time() - step_start,
-                            success=False, error=str(e))
-
-        # STEP 5: Create Google Doc (if requested)
-        doc_result = None
-        google_doc_url = None
-        drive_folder_url = None
-
-        if request.create_google_doc:
-            print("📄 STEP 5: Creating Google Doc summary...")
-            step_start = time.time()
+        yield f"event: queued\ndata: {json.dumps({'job_id': job_id, 'status_url': f'/jobs/{job_id}'})}\n\n"
+        event_id = 0
+        while True:
             try:
-                doc_agent = DocAgent()
-                doc_result = doc_agent.create_summary_doc(
-                    video_url=request.video_url,
-                    video_title=video_title,
-                    viral_analysis=viral_analysis,
-                    storyboard_data=storyboard_data,
-                    image_data=image_result.get("generated_panels") if image_result else None
-                )
-                print(f"   ✅ Google Doc created\n")
-                google_doc_url = doc_result.get("google_doc_url")
-                drive_folder_url = doc_result.get("drive_folder_url")
-                db.log_metric(video_pk, "doc_creation", time.time() - step_start, success=True)
-            except Exception as e:
-                print(f"   ⚠️  Doc creation failed: {str(e)}\n")
-                doc_result = {"error": str(e), "status": "failed"}
-                db.log_metric(video_pk, "doc_creation", time.time() - step_start,
-                            success=False, error=str(e))
+                event, data = await asyncio.wait_for(events.queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            event_id += 1
+            payload = json.dumps(_event_payload(event, data), default=str)
+            yield f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+            if event in ("complete", "failed"):
+                break
+    finally:
+        job_queue.unsubscribe(job_id, events)
+
+
+def _sse_response(job_id: str) -> StreamingResponse:
+    """Must be called on the event loop (from an async route)"""
+    events = job_queue.subscribe(job_id, _LoopQueue(asyncio.get_running_loop()))
+    if events is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StreamingResponse(
+        _sse_stream(job_id, events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/jetski/stream")
+async def jetski_stream(video_url: str, generate_images: bool = True, create_google_doc: bool = False,
+                  all_storyboards: bool = False):
+    """
+    Same pipeline as POST /jetski, streamed as Server-Sent Events.
 
-        # Save comic panels to database if images were generated
-        if image_result and image_result.get("generated_panels"):
-            try:
-                panels_data = []
-                for panel in image_result.get("generated_panels", []):
-                    panels_data.append({
-                        "panel_number": panel.get("panel_number"),
-                        "image_data": panel.get("image_data"),
-                        "image_url": panel.get("image_url"),
-                        "caption": panel.get("caption", ""),
-                        "scene_description": panel.get("scene_description", ""),
-                        "generation_prompt": panel.get("generation_prompt", "")
-                    })
-                db.save_comic_panels(storyboard_id, panels_data)
-            except Exception as e:
-                print(f"   ⚠️  Failed to save comic panels: {str(e)}\n")
-
-        # Save final generated comic to database
-        total_time = time.time() - pipeline_start
-        comic_id = db.save_generated_comic(
-            storyboard_id=storyboard_id,
-            google_doc_url=google_doc_url,
-            drive_folder_url=drive_folder_url,
-            generation_time=total_time,
-            status="success"
-        )
+    Events: queued, metadata, transcript, viral_analysis, storyboard, one
+    "panel" per comic panel as it finishes, images, google_doc (if
+    requested), then complete (the full result) or failed. Panel images
+    are referenced by their /blobs path rather than inlined, so each event
+    is small and nothing is buffered server-side.
+    """
+    job_id = job_queue.submit(
+        run_jetski_pipeline,
+        video_url,
+        generate_images=generate_images,
+        create_google_doc=create_google_doc,
+        all_storyboards=all_storyboards
+    )
+    return _sse_response(job_id)
 
-        print(f"{'='*60}")
-        print(f"✨ JETSKI PIPELINE COMPLETE")
-        print(f"   Total time: {total_time:.2f}s")
-        print(f"   Comic ID: {comic_id}")
-        print(f"{'='*60}\n")
 
-        return {
-            "video_url": request.video_url,
-            "video_title": video_title,
-            "viral_analysis": viral_analysis,
-            "storyboard": storyboard_data,
-            "images": image_result,
-            "google_doc": doc_result,
-            "status": "success",
-            "metrics": {
-                "total_time_seconds": total_time,
-                "comic_id": comic_id,
-                "video_id": video_pk
-            }
-        }
+@app.get("/jobs/{job_id}/events")
+async def get_job_events(job_id: str):
+    """Server-Sent Events for a queued or running job (replays the steps recorded so far)"""
+    return _sse_response(job_id)
+
+
+@app.post("/jetski/batch")
+async def jetski_batch(request: BatchRequest):
+    """
+    Run the full pipeline for many videos (playlists, channels) in one call.
+
+    URLs are deduplicated by video id. Every video runs on the shared batch
+    pool, and the metadata/transcript, LLM and image stages are capped per
+    provider across all runs (see stages.py), so the batch goes for
+    aggregate throughput rather than single-video latency.
 
+    The response is a stream of newline-delimited JSON events: "accepted",
+    then "completed"/"failed" per video as each one finishes, then "done".
+    """
+    if not request.video_urls:
+        raise HTTPException(status_code=400, detail="video_urls is empty")
+    if len(request.video_urls) > BATCH_MAX_URLS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_URLS} URLs per batch")
+
+    events = batch_runner.run(
+        request.video_urls,
+        generate_images=request.generate_images,
+        create_google_doc=request.create_google_doc
+    )
+    return StreamingResponse(
+        (json.dumps(event, default=str) + "\n" async for event in events),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.post("/segments/{segment_id}/select")
+def select_segment(segment_id: str, generate_images: bool = False):
+    """
+    Make another ranked segment the selected one (e.g. option 2 or 3).
+
+    The segment needs a storyboard - run the pipeline with
+    all_storyboards=true. With generate_images=true its panels are rendered
+    on the job queue (poll GET /jobs/{job_id} or stream /jobs/{job_id}/events);
+    no transcript or viral analysis is redone.
+    """
+    try:
+        selection = db.select_segment(segment_id)
     except Exception as e:
-        print(f"\n❌ Pipeline failed: {str(e)}\n")
+        if "P0002" in str(e) or "not found" in str(e):
+            raise HTTPException(status_code=404, detail="Segment not found")
         raise HTTPException(status_code=500, detail=str(e))
 
+    storyboard_id = selection.get("storyboard_id")
+    if generate_images and not storyboard_id:
+        raise HTTPException(
+            status_code=409,
+            detail="Segment has no storyboard - run the pipeline with all_storyboards=true"
+        )
+
+    response = {"status": "success", **selection}
+    if generate_images:
+        job_id = job_queue.submit(run_segment_images, segment_id, storyboard_id)
+        response.update({"job_id": job_id, "status_url": f"/jobs/{job_id}"})
+    return response
+
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str, inline_images: bool = False):
+    """
+    Get status, partial results and (when finished) the result of a pipeline job.
+
+    Panel images are referenced by /blobs/{sha256}; pass inline_images=true
+    to get them base64-encoded in the response instead.
+    """
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if "images" in job["partial"]:
+        job["partial"] = {
+            **job["partial"],
+            "images": image_result_to_json(job["partial"]["images"], inline_images)
+        }
+    if job["result"]:
+        job["result"] = {
+            **job["result"],
+            "images": image_result_to_json(job["result"]["images"], inline_images)
+        }
+    return job
+
 
 @app.post("/analyze")
 def analyze_video(video_url: str):
@@ -297,8 +382,9 @@ def analyze_video(video_url: str):
     Returns structured JSON.
     """
     try:
-        transcript = get_transcript(video_url)
-        viral_analysis = find_viral_moments(transcript)
+        video_id = extract_video_id(video_url)
+        transcript = cached_transcript(video_url, video_id)
+        viral_analysis = cached_viral_analysis(video_id, transcript)
         return {
             "status": "success",
             "viral_analysis": viral_analysis
@@ -322,3 +408,158 @@ def create_storyboard(segment_data: dict):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+
+@app.get("/cache/stats")
+def get_cache_stats():
+    """Result cache size and hit/miss counters per result type, plus the panel render cache"""
+    render_cache = get_render_cache()
+    return {
+        "status": "success",
+        "cache": result_cache.stats(),
+        "render_cache": render_cache.stats() if render_cache else {"enabled": False}
+    }
+
+
+@app.get("/stages/stats")
+def get_stage_stats():
+    """Active/waiting runs and limits for each provider stage"""
+    return {
+        "status": "success",
+        "stages": stage_limiter.stats()
+    }
+
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text exposition: step latency histograms computed in-process"""
+    return Response(content=render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/rate-limits/stats")
+def get_rate_limit_stats():
+    """Queue depth, in-flight calls, adaptive concurrency limit and throttles per model"""
+    return {
+        "status": "success",
+        "rate_limits": rate_limit_stats()
+    }
+
+
+@app.get("/prompts/stats")
+def get_prompt_stats():
+    """Input tokens before/after normalization and the provider's cached-token ratio, per prompt"""
+    return {
+        "status": "success",
+        "prompts": prompt_stats.stats()
+    }
+
+
+def _parse_range(range_header: str, size: int):
+    """Parse a single 'bytes=start-end' range. Returns (start, end) or None if unsatisfiable."""
+    units, _, spec = range_header.partition("=")
+    if units.strip() != "bytes" or "," in spec:
+        return None
+
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if start_text == "":
+            # Suffix range: last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return None
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+@app.get("/blobs/{sha256}")
+def get_blob(
+    sha256: str,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """Stream a content-addressed blob (panel image) with ETag and Range support"""
+    blob_store = get_blob_store()
+    try:
+        blob = blob_store.head(sha256)
+    except ValueError:
+        blob = None
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    size = blob["size"]
+    # Recorded when the blob was written, so nothing is read before streaming
+    media_type = blob["mime_type"]
+
+    # Content never changes for a given hash, so the hash is a perfect strong ETag
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    if range_header:
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(blob_store.iter_range(sha256, start, end), status_code=206,
+                                 media_type=media_type, headers=headers)
+
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(blob_store.iter_range(sha256), media_type=media_type, headers=headers)
+
+
+# /panels/... answers depend on Accept and on which renditions exist yet, so
+# unlike /blobs/... (immutable) they may only be cached briefly
+PANEL_REDIRECT_MAX_AGE = 300
+
+
+@app.get("/panels/{sha256}/image")
+def get_panel_image(
+    sha256: str,
+    size: str = "carousel",
+    accept: Optional[str] = Header(None)
+):
+    """
+    Redirect to the best blob for the client: size is a rendition name from
+    PANEL_RENDITIONS ("carousel", "thumb") or "original"; the format (WebP,
+    JPEG, ...) follows Accept. Falls back to the original image when no
+    rendition fits (e.g. transcoding hasn't finished).
+    """
+    renditions = None
+    if size != "original":
+        renditions = known_renditions(sha256)
+        if renditions is None:
+            try:
+                renditions = db.get_panel_renditions(sha256)
+            except Exception as e:
+                print(f"⚠️  Rendition lookup failed for {sha256}: {str(e)}")
+            if renditions:
+                remember_renditions(sha256, renditions)
+
+    rendition = choose_rendition(renditions, size, accept) if renditions else None
+    if rendition is None:
+        try:
+            found = get_blob_store().head(sha256) is not None
+        except ValueError:
+            found = False
+        if not found:
+            raise HTTPException(status_code=404, detail="Blob not found")
+
+    return RedirectResponse(
+        f"/blobs/{rendition['sha256'] if rendition else sha256}",
+        status_code=302,
+        headers={"Cache-Control": f"public, max-age={PANEL_REDIRECT_MAX_AGE}", "Vary": "Accept"}
+    )
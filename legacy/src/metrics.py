@@ -0,0 +1,197 @@
+"""
+Background metrics sink + in-process step latency histograms
+log_metric() only appends to a ring buffer; a writer thread inserts rows in
+batches. Histograms are kept in memory and exposed in Prometheus text format.
+"""
+
+import os
+import atexit
+import random
+import threading
+from collections import deque
+from typing import Callable, Dict, List
+
+# Ring buffer size; when full the oldest rows are overwritten (and counted as dropped)
+METRICS_BUFFER_SIZE = int(os.getenv("METRICS_BUFFER_SIZE", "10000"))
+METRICS_BATCH_SIZE = int(os.getenv("METRICS_BATCH_SIZE", "100"))
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "2.0"))
+
+# Above this fill ratio only failures and a sample of successes are kept
+METRICS_PRESSURE_RATIO = 0.8
+METRICS_PRESSURE_SAMPLE_RATE = float(os.getenv("METRICS_PRESSURE_SAMPLE_RATE", "0.1"))
+
+# Step latency buckets in seconds (LLM and image calls run from ~1s to minutes)
+HISTOGRAM_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class StepHistograms:
+    """Cumulative latency histograms per (step, success)"""
+
+    def __init__(self, buckets: tuple = HISTOGRAM_BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[tuple, Dict] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, step: str, duration: float, success: bool = True):
+        key = (step, bool(success))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += duration
+            series["count"] += 1
+
+    def render(self, name: str = "jetski_step_duration_seconds") -> List[str]:
+        lines = [
+            f"# HELP {name} Pipeline step latency",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            series = sorted(self._series.items())
+            for (step, success), data in series:
+                labels = f'step="{_escape(step)}",success="{str(success).lower()}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, data["counts"]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {data["count"]}')
+                lines.append(f"{name}_sum{{{labels}}} {data['sum']:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {data['count']}")
+        return lines
+
+
+class MetricsSink:
+    """
+    Ring buffer + writer thread for metric rows.
+
+    record() never blocks on I/O. The writer flushes every
+    METRICS_BATCH_SIZE rows or METRICS_FLUSH_SECONDS, whichever comes
+    first. Writes are best-effort: a failed batch is counted and dropped.
+    """
+
+    def __init__(self, name: str, write_batch: Callable[[List[Dict]], None],
+                 capacity: int = METRICS_BUFFER_SIZE, batch_size: int = METRICS_BATCH_SIZE,
+                 flush_interval: float = METRICS_FLUSH_SECONDS):
+        self.name = name
+        self.write_batch = write_batch
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = deque(maxlen=capacity)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._thread = None
+        self.counters = {"recorded": 0, "written": 0, "dropped": 0, "sampled_out": 0,
+                         "write_errors": 0, "flushes": 0}
+
+    def record(self, row: Dict):
+        with self._cond:
+            if self._closed:
+                return
+            if self._thread is None:
+                self._start()
+
+            self.counters["recorded"] += 1
+            under_pressure = len(self._buffer) >= self.capacity * METRICS_PRESSURE_RATIO
+            if under_pressure and row.get("success", True) and random.random() >= METRICS_PRESSURE_SAMPLE_RATE:
+                self.counters["sampled_out"] += 1
+                return
+            if len(self._buffer) == self.capacity:
+                self.counters["dropped"] += 1
+            self._buffer.append(row)
+
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name=f"metrics-{self.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._buffer) < self.batch_size:
+                    self._cond.wait(timeout=self.flush_interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        """Write everything buffered so far (in batches), from the calling thread"""
+        with self._write_lock:
+            while True:
+                with self._cond:
+                    if not self._buffer:
+                        return
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    self.write_batch(batch)
+                    with self._cond:
+                        self.counters["written"] += len(batch)
+                        self.counters["flushes"] += 1
+                except Exception as e:
+                    print(f"⚠️  Metrics sink '{self.name}': dropped {len(batch)} rows ({str(e)})")
+                    with self._cond:
+                        self.counters["write_errors"] += 1
+                        self.counters["dropped"] += len(batch)
+
+    def close(self):
+        """Stop the writer and flush what's left"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {**self.counters, "buffered": len(self._buffer), "capacity": self.capacity}
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide: latency histograms (every log_metric call) and every sink created
+step_histograms = StepHistograms()
+_sinks: List[MetricsSink] = []
+
+
+def create_sink(name: str, write_batch: Callable[[List[Dict]], None]) -> MetricsSink:
+    sink = MetricsSink(name, write_batch)
+    _sinks.append(sink)
+    return sink
+
+
+def observe_step(step: str, duration: float, success: bool = True):
+    step_histograms.observe(step, duration, success)
+
+
+def close_sinks():
+    """Flush and stop every sink (FastAPI shutdown / interpreter exit)"""
+    for sink in _sinks:
+        sink.close()
+
+
+def render_prometheus() -> str:
+    lines = step_histograms.render()
+    for counter in ("recorded", "written", "dropped", "sampled_out", "write_errors"):
+        lines.append(f"# TYPE jetski_metrics_rows_{counter}_total counter")
+        for sink in _sinks:
+            lines.append(f'jetski_metrics_rows_{counter}_total{{sink="{sink.name}"}} {sink.stats()[counter]}')
+    lines.append("# TYPE jetski_metrics_buffered_rows gauge")
+    for sink in _sinks:
+        lines.append(f'jetski_metrics_buffered_rows{{sink="{sink.name}"}} {sink.stats()["buffered"]}')
+    return "\n".join(lines) + "\n"
+
+
+atexit.register(close_sinks)
@@ -0,0 +1,630 @@
+"""
+JetSki Pipeline
+Runs the full metadata → transcript → highlight → storyboard → images → doc flow
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+# Import Supabase database module
+import supabase_client as db
+
+from cache import ResultCache, fingerprint
+from blob_store import get_blob_store
+from renditions import get_transcoder, remember_renditions
+from stages import stage_limiter
+from metrics import observe_step
+from jobs import current_job_id
+from agents.transcript_agent import fetch_transcript, extract_video_id, Transcript
+from agents.highlight_agent import find_viral_moments, build_viral_prompt, MODEL as HIGHLIGHT_MODEL
+from agents.prerank import PRERANK_VERSION
+from agents.prompt_builder import prompt_run, carry_prompt_run
+from agents.storyboard_agent import generate_storyboard, build_storyboard_prompt, MODEL as STORYBOARD_MODEL
+from agents.image_agent import PanelRenderer, panel_to_json
+from agents.doc_agent import DocAgent, drive_folder_name
+from agents.drive_uploader import DRIVE_UPLOAD_WORKERS
+from agents.metadata_agent import get_video_metadata
+
+
+# Shared result cache: in-process LRU, then Supabase
+result_cache = ResultCache(db=db)
+
+# Bump when transcript extraction changes in a way that invalidates stored transcripts
+TRANSCRIPT_VERSION = fingerprint("youtube-transcript-api", "en", "timed")
+
+
+def _noop_step(step: str, data: Dict):
+    pass
+
+
+def _stored_transcript_text(text: Optional[str]) -> bool:
+    """videos.transcript holds a usable transcript (older rows may hold an error string)"""
+    return bool(text and text.strip()) and not text.startswith(("Error:", "Error fetching transcript"))
+
+
+def _stored_transcript(video_id: Optional[str]) -> Optional[Transcript]:
+    """Plain-text transcript from videos.transcript, if there is a usable one"""
+    if not video_id:
+        return None
+    try:
+        video = db.get_video_by_video_id(video_id)
+    except Exception as e:
+        print(f"   ⚠️  Stored transcript lookup failed: {str(e)}")
+        return None
+    if not video or not _stored_transcript_text(video.get("transcript")):
+        return None
+    return Transcript.from_text(video["transcript"])
+
+
+def cached_transcript(video_url: str, video_id: Optional[str], timings: Dict = None) -> Transcript:
+    """
+    fetch_transcript, served from cache when possible. If the fetch fails,
+    the videos.transcript column is the last resort: plain text with no
+    timing information, so it is returned but never cached under the timed
+    TRANSCRIPT_VERSION key.
+    On a miss, `timings` receives fetch_transcript's per-step latencies.
+    """
+    try:
+        data = result_cache.get_or_compute(
+            "transcript", video_id, TRANSCRIPT_VERSION,
+            compute=lambda: fetch_transcript(video_url, timings=timings).to_dict(),
+            cacheable=lambda data: bool(data and data["text"])
+        )
+    except Exception as e:
+        stored = _stored_transcript(video_id)
+        if stored is None:
+            raise
+        print(f"   ⚠️  Transcript fetch failed ({str(e)}), using the stored transcript (untimed)")
+        return stored
+    return Transcript.from_dict(data)
+
+
+def cached_viral_analysis(video_id: Optional[str], transcript: Transcript) -> Dict:
+    """find_viral_moments, keyed by video id + prompt/model hash"""
+    version = fingerprint(HIGHLIGHT_MODEL, PRERANK_VERSION, build_viral_prompt(transcript))
+    return result_cache.get_or_compute(
+        "viral_analysis", video_id, version,
+        compute=lambda: find_viral_moments(transcript)
+    )
+
+
+def cached_storyboard(video_id: Optional[str], segment: Dict, on_panel: Callable = None) -> Dict:
+    """
+    generate_storyboard, keyed by video id + prompt/model hash.
+    on_panel(panel, index) only fires on a miss (the completion is streamed).
+    """
+    version = fingerprint(STORYBOARD_MODEL, build_storyboard_prompt(segment))
+    return result_cache.get_or_compute(
+        "storyboard", video_id, version,
+        compute=lambda: generate_storyboard(segment, on_panel=on_panel)
+    )
+
+
+def _gemini_slot():
+    """Stage slot held by each panel render (see PanelRenderer(stage=...))"""
+    return stage_limiter.slot("gemini")
+
+
+def _store_panel_blob(panel: Dict):
+    """Write a rendered panel to the blob store and tag it with its hash"""
+    image = panel.get("image")
+    if image is None:
+        return
+    try:
+        panel["image_sha256"] = get_blob_store().put(image.data, image.mime_type)["sha256"]
+    except Exception as e:
+        print(f"   ⚠️  Failed to store panel {panel.get('panel_number')}: {str(e)}")
+
+
+def _submit_renditions(panel: Dict, pending: List[tuple]):
+    """Start transcoding a rendered panel on the process pool"""
+    image = panel.get("image")
+    if image is None:
+        return
+    try:
+        pending.append((panel, get_transcoder().submit(image.data)))
+    except Exception as e:
+        print(f"   ⚠️  Failed to queue renditions for panel {panel.get('panel_number')}: {str(e)}")
+
+
+def _attach_renditions(pending: List[tuple]) -> List[Dict]:
+    """
+    Wait for the transcodes, store each rendition in the blob store and
+    reference them on the panel ("renditions", keyed like "carousel.webp").
+    A failed panel just keeps its original image.
+    """
+    blob_store = get_blob_store()
+    attached = []
+    for panel, future in pending:
+        try:
+            renditions = {}
+            for item in future.result():
+                stored = blob_store.put(item["data"], item["mime_type"])
+                renditions[item["key"]] = {
+                    "name": item["name"],
+                    "sha256": stored["sha256"],
+                    "size": stored["size"],
+                    "mime_type": item["mime_type"],
+                    "width": item["width"],
+                    "height": item["height"]
+                }
+            panel["renditions"] = renditions
+            if panel.get("image_sha256"):
+                remember_renditions(panel["image_sha256"], renditions)
+            attached.append({"panel_number": panel.get("panel_number"), "renditions": renditions})
+        except Exception as e:
+            print(f"   ⚠️  Renditions for panel {panel.get('panel_number')} failed: {str(e)}")
+    return attached
+
+
+def _alternate_storyboard(video_id: Optional[str], segment: Dict) -> Dict:
+    """
+    Storyboard for a segment the AI didn't select. Not held to an "openai"
+    stage slot: it runs alongside the selected storyboard (same wall-clock
+    window) and is paced by the OpenAI rate limiter alone.
+    """
+    return cached_storyboard(video_id, segment)
+
+
+def _panel_rows(image_result: Optional[Dict]) -> List[Dict]:
+    """comic_panels rows (image bytes are in the blob store; rows only keep hash, size and mime type)"""
+    if not image_result or not image_result.get("generated_panels"):
+        return []
+    rows = []
+    for panel in image_result["generated_panels"]:
+        image = panel.get("image")
+        rows.append({
+            "panel_number": panel.get("panel_number"),
+            "image_sha256": panel.get("image_sha256"),
+            "image_size": image.size if image else None,
+            "image_mime_type": image.mime_type if image else None,
+            "image_url": panel.get("image_url"),
+            "caption": panel.get("caption", ""),
+            "scene_description": panel.get("scene_description", ""),
+            "generation_prompt": panel.get("generation_prompt", ""),
+            "renditions": panel.get("renditions")
+        })
+    return rows
+
+
+def _panel_metrics(image_result: Dict) -> List[tuple]:
+    """
+    (step, latency, success) per panel. Render cache hits are counted under
+    their own step so they don't skew the per-panel render latencies.
+    """
+    return [
+        ("image_panel_cache_hit" if timing.get("cached") else f"image_panel_{timing['panel_number']}",
+         timing["latency_seconds"], timing["success"])
+        for timing in image_result.get("panel_latencies", [])
+    ]
+
+
+def _upload_panel(doc_agent: DocAgent, folder_future, panel: Dict) -> Optional[str]:
+    """Upload one panel once its Drive folder exists"""
+    folder = folder_future.result()
+    if folder is None:
+        return None
+    return doc_agent.upload_panel(folder["id"], panel)
+
+
+def _mark(timeline: Dict, pipeline_start: float, step: str, step_start: float):
+    """Record when a step ran, in seconds since the pipeline started"""
+    timeline[step] = {
+        "start": round(step_start - pipeline_start, 3),
+        "end": round(time.time() - pipeline_start, 3)
+    }
+
+
+def _duration(timeline: Dict, step: str) -> float:
+    return timeline[step]["end"] - timeline[step]["start"] if step in timeline else 0.0
+
+
+def _timed(timeline: Dict, pipeline_start: float, step: str, func: Callable, *args):
+    """Run func(*args) and record it on the timeline (even if it raises)"""
+    step_start = time.time()
+    try:
+        return func(*args)
+    finally:
+        _mark(timeline, pipeline_start, step, step_start)
+
+
+def run_jetski_pipeline(
+    video_url: str,
+    generate_images: bool = True,
+    create_google_doc: bool = False,
+    all_storyboards: bool = False,
+    on_step: Optional[Callable[[str, Dict], None]] = None
+) -> Dict:
+    """
+    🚀 FULL JETSKI PIPELINE - Automated end-to-end flow
+
+    User pastes YouTube URL → AI does EVERYTHING automatically:
+    1. Extract transcript
+    2. Find top 3 viral moments
+    3. Auto-select the BEST one
+    4. Generate 6-panel storyboard
+    5. Create comic images (NanoBanana/Gemini)
+    6. Upload to Google Drive
+    7. Create Google Doc summary with posting strategy
+
+    Args:
+        video_url: YouTube video URL
+        generate_images: Render the comic panels with Gemini
+        create_google_doc: Create the Google Doc summary + Drive folder
+        all_storyboards: Also write storyboards for the other ranked segments
+                         (concurrently), so switching segments later only costs images
+        on_step: Optional callback(step_name, partial_result) called as each step finishes
+                 (and with "panel" as each comic panel finishes, JSON-safe)
+
+    Returns:
+        dict: Same shape as FullPipelineResponse, with raw PanelImage bytes
+              (see image_agent.image_result_to_json)
+    """
+    # Metric rows are collected here and written with the run (one persist
+    # call at the end) - or through the metrics sink if the run fails first
+    metrics = []
+    pipeline_start = time.time()
+    # Every OpenAI prompt in the run is tagged with its video (and job) and
+    # returned with the run's metrics
+    with prompt_run(video_id=extract_video_id(video_url), job_id=current_job_id.get()) as prompts:
+        try:
+            result = _run_pipeline(video_url, generate_images, create_google_doc, all_storyboards,
+                                   on_step, metrics)
+        except Exception as e:
+            metrics.append(db.metric_row("pipeline", time.time() - pipeline_start, success=False, error=str(e)))
+            db.log_metric_rows(metrics)
+            raise
+    result["metrics"]["prompts"] = prompts.entries
+    return result
+
+
+def _run_pipeline(
+    video_url: str,
+    generate_images: bool,
+    create_google_doc: bool,
+    all_storyboards: bool,
+    on_step: Optional[Callable[[str, Dict], None]],
+    metrics: List[Dict]
+) -> Dict:
+    """run_jetski_pipeline's steps (see there); metric rows are appended to `metrics`"""
+    on_step = on_step or _noop_step
+
+    pipeline_start = time.time()
+    timeline = {}
+    print(f"\n{'='*60}")
+    print(f"🚀 JETSKI PIPELINE STARTED")
+    print(f"{'='*60}\n")
+
+    # STEP 0: Extract Video Metadata
+    print("🎬 STEP 0: Extracting video metadata...")
+    step_start = time.time()
+    with stage_limiter.slot("youtube"):
+        metadata = get_video_metadata(video_url)
+    video_id = metadata.get('video_id')
+    video_title = metadata.get('title', 'Unknown Video')
+    duration = metadata.get('duration')
+    print(f"   ✅ Metadata extracted: {video_title}")
+    print(f"   Duration: {metadata.get('duration_formatted', 'Unknown')}\n")
+    metrics.append(db.metric_row("metadata_extraction", time.time() - step_start))
+    _mark(timeline, pipeline_start, "metadata_extraction", step_start)
+    on_step("metadata", metadata)
+
+    # STEP 1: Extract Transcript
+    print("📝 STEP 1: Extracting YouTube transcript...")
+    step_start = time.time()
+    transcript_timings = {}
+    with stage_limiter.slot("youtube"):
+        transcript = cached_transcript(video_url, video_id, transcript_timings)
+    print(f"   ✅ Transcript extracted ({len(transcript)} characters)\n")
+
+    metrics.append(db.metric_row("transcript_extraction", time.time() - step_start))
+    _mark(timeline, pipeline_start, "transcript_extraction", step_start)
+    for lookup_step in ("list", "resolve", "fetch"):
+        if f"{lookup_step}_seconds" in transcript_timings:
+            metrics.append(db.metric_row(f"transcript_{lookup_step}", transcript_timings[f"{lookup_step}_seconds"]))
+    on_step("transcript", {"video_id": video_id, "characters": len(transcript)})
+
+    # STEP 2: Find Viral Moments (AI auto-selects best one)
+    print("🔍 STEP 2: Analyzing viral moments...")
+    step_start = time.time()
+    with stage_limiter.slot("openai"):
+        viral_analysis = cached_viral_analysis(video_id, transcript)
+
+    selected_rank = viral_analysis["selected"]["rank"]
+    selected_segment = viral_analysis["segments"][selected_rank - 1]
+
+    print(f"   ✅ Found {len(viral_analysis['segments'])} viral moments")
+    print(f"   🎯 AI selected: {selected_segment['hook']} (Score: {selected_segment['score']}/100)\n")
+
+    metrics.append(db.metric_row("viral_analysis", time.time() - step_start))
+    _mark(timeline, pipeline_start, "viral_analysis", step_start)
+    on_step("viral_analysis", viral_analysis)
+
+    # STEP 3: Generate Storyboard
+    print("🎨 STEP 3: Generating 6-panel storyboard...")
+    step_start = time.time()
+    # Panels start rendering as soon as the streamed storyboard closes each
+    # one; every render, early or not, holds a Gemini stage slot
+    renderer = PanelRenderer(stage=_gemini_slot) if generate_images else None
+    alternates_pool = None
+    alternate_futures = {}
+    if all_storyboards:
+        alternates = [seg for seg in viral_analysis["segments"] if seg["rank"] != selected_rank]
+        alternates_pool = ThreadPoolExecutor(max_workers=max(1, len(alternates)),
+                                             thread_name_prefix="jetski-storyboard")
+        for segment in alternates:
+            alternate_futures[segment["rank"]] = alternates_pool.submit(
+                _timed, timeline, pipeline_start, f"storyboard_segment_{segment['rank']}",
+                carry_prompt_run(_alternate_storyboard), video_id, segment
+            )
+    try:
+        with stage_limiter.slot("openai"):
+            storyboard_data = cached_storyboard(
+                video_id, selected_segment, on_panel=renderer.submit if renderer else None
+            )
+    except Exception:
+        if renderer:
+            renderer.cancel()
+        if alternates_pool:
+            alternates_pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    print(f"   ✅ Storyboard created: {storyboard_data.get('title', 'Untitled')}\n")
+
+    metrics.append(db.metric_row("storyboard_generation", time.time() - step_start))
+    _mark(timeline, pipeline_start, "storyboard_generation", step_start)
+    on_step("storyboard", storyboard_data)
+
+    # STEPS 4 + 5 run as a small dependency graph so the doc and Drive work
+    # overlap with panel rendering instead of waiting for all six panels:
+    #
+    #   storyboard ─┬─> doc text (Docs API) ────────────────────┐
+    #               ├─> Drive folder ──┐                         ├─> done
+    #               └─> panel 1..6 ────┴─> upload each panel ───┘
+    doc_agent = None
+    doc_setup_error = None
+    if create_google_doc:
+        try:
+            doc_agent = DocAgent()
+        except Exception as e:
+            doc_setup_error = str(e)
+    doc_future = None
+    folder_future = None
+    upload_futures = []
+    pending_renditions = []
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="jetski-doc") as doc_pool, \
+            ThreadPoolExecutor(max_workers=DRIVE_UPLOAD_WORKERS, thread_name_prefix="jetski-drive") as drive_pool:
+
+        if doc_agent:
+            print("📄 STEP 5: Creating Google Doc summary (in parallel)...")
+            doc_future = doc_pool.submit(
+                _timed, timeline, pipeline_start, "doc_creation", doc_agent.create_doc,
+                video_url, video_title, viral_analysis, storyboard_data
+            )
+            if generate_images:
+                # Submitted first so it's picked up before any upload; uploads wait on it
+                folder_future = drive_pool.submit(
+                    _timed, timeline, pipeline_start, "drive_folder", doc_agent.create_drive_folder,
+                    drive_folder_name(storyboard_data)
+                )
+
+        def on_panel(panel: Dict):
+            _store_panel_blob(panel)
+            on_step("panel", panel_to_json(panel))
+            _submit_renditions(panel, pending_renditions)
+            if folder_future is not None and "image" in panel:
+                upload_futures.append(drive_pool.submit(_upload_panel, doc_agent, folder_future, panel))
+
+        # STEP 4: Generate Images (if requested)
+        image_result = None
+        if generate_images:
+            print("🖼️  STEP 4: Generating comic panel images (NanoBanana)...")
+            step_start = time.time()
+            try:
+                image_result = renderer.finish(storyboard_data, on_panel=on_panel)
+                print(f"   ✅ Generated {image_result.get('success_count', 0)}/6 panels\n")
+                metrics.append(db.metric_row("image_generation", time.time() - step_start, success=True))
+                for step, latency, success in _panel_metrics(image_result):
+                    metrics.append(db.metric_row(step, latency, success=success))
+            except Exception as e:
+                print(f"   ⚠️  Image generation failed: {str(e)}")
+                print(f"   Continuing without images...\n")
+                image_result = {"error": str(e), "success_count": 0}
+                metrics.append(db.metric_row("image_generation", time.time() - step_start,
+                                             success=False, error=str(e)))
+            _mark(timeline, pipeline_start, "image_generation", step_start)
+            on_step("images", image_result)
+
+        # Join the doc branch
+        doc_result = None
+        google_doc_url = None
+        drive_folder_url = None
+
+        if doc_future is not None:
+            try:
+                doc_result = doc_future.result()
+                print(f"   ✅ Google Doc created\n")
+                google_doc_url = doc_result.get("doc_url")
+                metrics.append(db.metric_row("doc_creation", _duration(timeline, "doc_creation"), success=True))
+            except Exception as e:
+                print(f"   ⚠️  Doc creation failed: {str(e)}\n")
+                doc_result = {"error": str(e), "status": "failed"}
+                metrics.append(db.metric_row("doc_creation", _duration(timeline, "doc_creation"),
+                                             success=False, error=str(e)))
+
+        if folder_future is not None:
+            uploaded = 0
+            drive_error = None
+            try:
+                folder = folder_future.result()
+                drive_folder_url = folder["url"] if folder else None
+                uploaded = sum(1 for future in upload_futures if future.result())
+            except Exception as e:
+                print(f"   ⚠️  Drive upload failed: {str(e)}\n")
+                drive_error = str(e)
+            _mark(timeline, pipeline_start, "drive_upload", pipeline_start + timeline["drive_folder"]["start"])
+            metrics.append(db.metric_row("drive_upload", _duration(timeline, "drive_upload"),
+                                         success=drive_error is None, error=drive_error))
+
+            if doc_result is not None:
+                doc_result = {**doc_result, "drive_folder_url": drive_folder_url, "uploaded_panels": uploaded}
+                if drive_error:
+                    doc_result["drive_error"] = drive_error
+
+        if doc_setup_error:
+            print(f"   ⚠️  Doc creation failed: {doc_setup_error}\n")
+            doc_result = {"error": doc_setup_error, "status": "failed"}
+            metrics.append(db.metric_row("doc_creation", 0.0, success=False, error=doc_setup_error))
+
+        if create_google_doc:
+            on_step("google_doc", doc_result)
+
+    # Renditions have been transcoding (process pool) since each panel finished
+    if pending_renditions:
+        step_start = time.time()
+        attached = _attach_renditions(pending_renditions)
+        metrics.append(db.metric_row("panel_renditions", time.time() - step_start,
+                                     success=len(attached) == len(pending_renditions)))
+        on_step("renditions", {"panels": attached})
+
+    # Storyboards for the other segments have been running since step 3
+    alternate_storyboards = {}
+    if alternates_pool:
+        for rank, future in alternate_futures.items():
+            step = f"storyboard_segment_{rank}"
+            try:
+                alternate_storyboards[rank] = future.result()
+                metrics.append(db.metric_row(step, _duration(timeline, step)))
+            except Exception as e:
+                print(f"   ⚠️  Storyboard for segment {rank} failed: {str(e)}\n")
+                metrics.append(db.metric_row(step, _duration(timeline, step), success=False, error=str(e)))
+        alternates_pool.shutdown(wait=False)
+        on_step("alternate_storyboards", {"storyboards": alternate_storyboards})
+
+    # Save the whole run (video, segments, storyboard, panels, comic, metrics)
+    # in one round trip and one transaction
+    total_time = time.time() - pipeline_start
+    persist_start = time.time()
+    saved = db.persist_pipeline_result(
+        video={
+            "video_url": video_url,
+            "video_id": video_id,
+            "title": video_title,
+            "duration": duration,
+            "transcript": transcript.text
+        },
+        segments=viral_analysis["segments"],
+        selected_rank=selected_rank,
+        storyboard_data=storyboard_data,
+        panels_data=_panel_rows(image_result),
+        comic={
+            "google_doc_url": google_doc_url,
+            "drive_folder_url": drive_folder_url,
+            "generation_time": total_time,
+            "status": "success"
+        },
+        metrics=metrics,
+        alternate_storyboards=alternate_storyboards
+    )
+    observe_step("persist", time.time() - persist_start)
+    comic_id = saved["comic_id"]
+
+    print(f"{'='*60}")
+    print(f"✨ JETSKI PIPELINE COMPLETE")
+    print(f"   Total time: {total_time:.2f}s")
+    print(f"   Comic ID: {comic_id}")
+    print(f"{'='*60}\n")
+
+    return {
+        "video_url": video_url,
+        "video_title": video_title,
+        "viral_analysis": viral_analysis,
+        "storyboard": storyboard_data,
+        "images": image_result,
+        "google_doc": doc_result,
+        # Segment ids (for POST /segments/{id}/select) and their storyboards
+        "segments": saved.get("segments", []),
+        "status": "success",
+        "metrics": {
+            "total_time_seconds": total_time,
+            "comic_id": comic_id,
+            "video_id": saved["video_id"],
+            "timeline": timeline
+        }
+    }
+
+
+def run_segment_images(
+    segment_id: str,
+    storyboard_id: str,
+    on_step: Optional[Callable[[str, Dict], None]] = None
+) -> Dict:
+    """
+    Render and save the comic panels of an existing storyboard - used after
+    switching the selected segment, so the switch costs image time only.
+
+    Args:
+        segment_id: The (now selected) viral segment
+        storyboard_id: That segment's storyboard
+        on_step: Optional callback(step_name, partial_result), as in run_jetski_pipeline
+
+    Returns:
+        dict: storyboard, images (raw PanelImage bytes), status and metrics
+    """
+    on_step = on_step or _noop_step
+    start = time.time()
+
+    storyboard = db.get_storyboard_with_panels(storyboard_id)
+    if not storyboard:
+        raise ValueError(f"Storyboard {storyboard_id} not found")
+    storyboard_data = {
+        "title": storyboard.get("title"),
+        "style": storyboard.get("style") or "manga-vintage",
+        "tone": storyboard.get("tone"),
+        "panels": storyboard.get("panels") or [],
+        "hashtags": storyboard.get("hashtags") or [],
+        "posting_tip": storyboard.get("posting_strategy")
+    }
+    on_step("storyboard", storyboard_data)
+
+    pending_renditions = []
+
+    def on_panel(panel: Dict):
+        _store_panel_blob(panel)
+        on_step("panel", panel_to_json(panel))
+        _submit_renditions(panel, pending_renditions)
+
+    print(f"🖼️  Rendering panels for segment {segment_id}: {storyboard_data['title']}")
+    step_start = time.time()
+    image_result = PanelRenderer(stage=_gemini_slot).finish(storyboard_data, on_panel=on_panel)
+    db.log_metric(storyboard["video_id"], "image_generation", time.time() - step_start,
+                  success=image_result.get("success_count", 0) > 0)
+    for step, latency, success in _panel_metrics(image_result):
+        db.log_metric(storyboard["video_id"], step, latency, success=success)
+    on_step("images", image_result)
+
+    if pending_renditions:
+        step_start = time.time()
+        attached = _attach_renditions(pending_renditions)
+        db.log_metric(storyboard["video_id"], "panel_renditions", time.time() - step_start,
+                      success=len(attached) == len(pending_renditions))
+        on_step("renditions", {"panels": attached})
+
+    panels_data = _panel_rows(image_result)
+    if panels_data:
+        db.save_comic_panels(storyboard_id, panels_data)
+    total_time = time.time() - start
+    comic_id = db.save_generated_comic(storyboard_id=storyboard_id, generation_time=total_time)
+
+    return {
+        "segment_id": segment_id,
+        "storyboard": storyboard_data,
+        "images": image_result,
+        "status": "success",
+        "metrics": {
+            "total_time_seconds": total_time,
+            "comic_id": comic_id,
+            "video_id": storyboard["video_id"]
+        }
+    }
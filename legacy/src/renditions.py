@@ -0,0 +1,194 @@
+"""
+Panel renditions (carousel-size WebP/JPEG, thumbnails)
+Gemini returns full-size PNGs. Each panel is transcoded into the renditions
+in PANEL_RENDITIONS on a process pool (PIL work doesn't hold the GIL on the
+request path), stored in the blob store, and served by Accept header.
+
+This module only imports PIL so spawned workers start fast.
+"""
+
+import os
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+# name:max_size:format:quality, comma separated; max_size bounds the longer side
+PANEL_RENDITIONS = os.getenv(
+    "PANEL_RENDITIONS",
+    "carousel:1080:webp:80,carousel:1080:jpeg:85,thumb:320:webp:70,thumb:320:jpeg:75"
+)
+TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", "2"))
+
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+    "jpg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "avif": ("AVIF", "image/avif"),
+}
+
+# Original sha256 -> renditions, for serving without a database round trip
+RENDITION_INDEX_SIZE = 4096
+
+
+def parse_renditions(spec: str = PANEL_RENDITIONS) -> List[Dict]:
+    """PANEL_RENDITIONS string to a list of rendition specs"""
+    renditions = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, max_size, fmt, quality = [part.strip() for part in item.split(":")]
+        if fmt.lower() not in FORMATS:
+            raise ValueError(f"Unsupported rendition format: {fmt}")
+        pil_format, mime_type = FORMATS[fmt.lower()]
+        renditions.append({
+            "key": f"{name}.{fmt.lower()}",
+            "name": name,
+            "max_size": int(max_size),
+            "format": pil_format,
+            "mime_type": mime_type,
+            "quality": int(quality)
+        })
+    return renditions
+
+
+def transcode(data: bytes, renditions: List[Dict]) -> List[Dict]:
+    """
+    Decode once, encode every rendition (runs in a worker process).
+
+    Returns:
+        list: {"key", "name", "data", "mime_type", "width", "height"} per rendition
+    """
+    source = Image.open(BytesIO(data))
+    source.load()
+
+    results = []
+    for spec in renditions:
+        image = source.copy()
+        image.thumbnail((spec["max_size"], spec["max_size"]), Image.LANCZOS)
+        if spec["format"] == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        elif image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+
+        out = BytesIO()
+        options = {"quality": spec["quality"]}
+        if spec["format"] == "JPEG":
+            options.update(optimize=True, progressive=True)
+        elif spec["format"] == "WEBP":
+            options["method"] = 4
+        image.save(out, format=spec["format"], **options)
+
+        results.append({
+            "key": spec["key"],
+            "name": spec["name"],
+            "data": out.getvalue(),
+            "mime_type": spec["mime_type"],
+            "width": image.width,
+            "height": image.height
+        })
+    return results
+
+
+class Transcoder:
+    """Process pool for transcode(); created on first use"""
+
+    def __init__(self, max_workers: int = TRANSCODE_WORKERS, renditions: List[Dict] = None):
+        self.max_workers = max(1, max_workers)
+        self.renditions = renditions if renditions is not None else parse_renditions()
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def submit(self, data: bytes) -> Future:
+        with self._lock:
+            if self._pool is None:
+                # spawn, not fork: the API process has live threads and sockets
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool.submit(transcode, data, self.renditions)
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+
+def parse_accept(accept: Optional[str]) -> Dict[str, float]:
+    """Accept header to {mime_type: q}"""
+    weights = {}
+    for item in (accept or "").split(","):
+        parts = [part.strip() for part in item.split(";")]
+        if not parts[0]:
+            continue
+        q = 1.0
+        for param in parts[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        weights[parts[0].lower()] = q
+    return weights
+
+
+def _accept_weight(weights: Dict[str, float], mime_type: str) -> float:
+    if mime_type in weights:
+        return weights[mime_type]
+    if mime_type.split("/")[0] + "/*" in weights:
+        return weights[mime_type.split("/")[0] + "/*"]
+    return weights.get("*/*", 0.0)
+
+
+def choose_rendition(renditions: Dict[str, Dict], name: str, accept: Optional[str]) -> Optional[Dict]:
+    """
+    Best rendition called `name` for an Accept header: highest q, then
+    smallest. None when the client accepts none of them.
+    """
+    weights = parse_accept(accept) or {"*/*": 1.0}
+    candidates = [
+        (rendition, _accept_weight(weights, rendition["mime_type"]))
+        for rendition in renditions.values() if rendition.get("name") == name
+    ]
+    candidates = [(rendition, q) for rendition, q in candidates if q > 0]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda item: (-item[1], item[0]["size"]))[0]
+
+
+_transcoder = None
+_transcoder_lock = threading.Lock()
+_index: "OrderedDict[str, Dict]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_transcoder() -> Transcoder:
+    global _transcoder
+    with _transcoder_lock:
+        if _transcoder is None:
+            _transcoder = Transcoder()
+        return _transcoder
+
+
+def close_transcoder():
+    with _transcoder_lock:
+        if _transcoder is not None:
+            _transcoder.close()
+
+
+def remember_renditions(sha256: str, renditions: Dict[str, Dict]):
+    with _index_lock:
+        _index[sha256] = renditions
+        _index.move_to_end(sha256)
+        while len(_index) > RENDITION_INDEX_SIZE:
+            _index.popitem(last=False)
+
+
+def known_renditions(sha256: str) -> Optional[Dict[str, Dict]]:
+    with _index_lock:
+        return _index.get(sha256)
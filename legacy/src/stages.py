@@ -0,0 +1,66 @@
+"""
+Shared per-provider stage limits
+Every pipeline run (single /jetski jobs and batches alike) enters a provider's
+stage through the same semaphore, so N concurrent runs never put more than the
+configured number of videos (for Gemini: panel renders) on one provider at once.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# Videos (Gemini: panel renders) allowed inside each provider's stage at the same time
+STAGE_LIMITS = {
+    "youtube": int(os.getenv("STAGE_YOUTUBE_CONCURRENCY", "8")),   # metadata + transcript
+    "openai": int(os.getenv("STAGE_OPENAI_CONCURRENCY", "6")),     # viral analysis + storyboard
+    "gemini": int(os.getenv("STAGE_GEMINI_CONCURRENCY", "6")),     # panel renders, early ones included (3 per run)
+}
+
+
+class StageLimiter:
+    """Named counting semaphores with active/waiting counters"""
+
+    def __init__(self, limits: Dict[str, int] = None):
+        self.limits = dict(limits or STAGE_LIMITS)
+        self._semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in self.limits.items()}
+        self._lock = threading.Lock()
+        self._counters = {
+            name: {"active": 0, "waiting": 0, "completed": 0, "wait_seconds": 0.0}
+            for name in self.limits
+        }
+
+    @contextmanager
+    def slot(self, provider: str):
+        """Hold one of the provider's slots for the duration of the block"""
+        semaphore = self._semaphores[provider]
+        counters = self._counters[provider]
+
+        with self._lock:
+            counters["waiting"] += 1
+        wait_start = time.time()
+        semaphore.acquire()
+        with self._lock:
+            counters["waiting"] -= 1
+            counters["active"] += 1
+            counters["wait_seconds"] += time.time() - wait_start
+
+        try:
+            yield
+        finally:
+            with self._lock:
+                counters["active"] -= 1
+                counters["completed"] += 1
+            semaphore.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                name: {**counters, "limit": self.limits[name], "wait_seconds": round(counters["wait_seconds"], 3)}
+                for name, counters in self._counters.items()
+            }
+
+
+# Process-wide limiter shared by every pipeline run
+stage_limiter = StageLimiter()
@@ -1,9 +1,13 @@
 import os
+import time
+import uuid
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client, Client
 from typing import Optional, Dict, List, Any
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+
+from metrics import create_sink, observe_step
 
 root_dir = Path(__file__).parent.parent
 load_dotenv(root_dir / ".env")
@@ -16,8 +20,11 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
+# Retries for persist_pipeline_result (safe: the RPC is idempotent)
+PERSIST_MAX_RETRIES = int(os.getenv("PERSIST_MAX_RETRIES", "2"))
 
-def save_video(
+
+def _video_row(
     video_url: str,
     video_id: str,
     title: str = "",
@@ -25,8 +32,8 @@ def save_video(
     channel_name: Optional[str] = None,
     thumbnail_url: Optional[str] = None,
     transcript: Optional[str] = None
-) -> str:
-    data = {
+) -> Dict:
+    return {
         "video_id": video_id,
         "video_url": video_url,
         "title": title,
@@ -36,38 +43,110 @@ def save_video(
         "transcript": transcript
     }
 
-    result = supabase.table("videos").insert(data).execute()
+
+def _segment_row(segment: Dict, selected_rank: int) -> Dict:
+    return {
+        "rank": segment["rank"],
+        "score": segment["score"],
+        "hook": segment["hook"],
+        "summary": segment.get("summary", ""),
+        "viral_type": segment.get("viral_type", ""),
+        "start_time": segment.get("start_time", ""),
+        "end_time": segment.get("end_time", ""),
+        # find_viral_moments() returns the excerpt as "transcript_excerpt"
+        "excerpt": segment.get("excerpt") or segment.get("transcript_excerpt", ""),
+        "is_selected": segment["rank"] == selected_rank
+    }
+
+
+def _storyboard_row(storyboard_data: Dict) -> Dict:
+    return {
+        "title": storyboard_data.get("title", ""),
+        "style": storyboard_data.get("style", "manga-vintage"),
+        "tone": storyboard_data.get("tone", ""),
+        "panels": storyboard_data.get("panels", []),
+        "hashtags": storyboard_data.get("hashtags", []),
+        "posting_strategy": storyboard_data.get("posting_tip", "")
+    }
+
+
+def _panel_row(panel: Dict) -> Dict:
+    return {
+        "panel_number": panel.get("panel_number"),
+        "image_url": panel.get("image_url"),
+        "image_sha256": panel.get("image_sha256"),
+        "image_size": panel.get("image_size"),
+        "image_mime_type": panel.get("image_mime_type"),
+        "caption": panel.get("caption", ""),
+        "scene_description": panel.get("scene_description", ""),
+        "generation_prompt": panel.get("generation_prompt", ""),
+        "renditions": panel.get("renditions")
+    }
+
+
+def _comic_row(
+    google_doc_url: Optional[str] = None,
+    drive_folder_url: Optional[str] = None,
+    generation_time: float = 0.0,
+    cost_estimate: float = 0.25,
+    status: str = "success",
+    error_message: Optional[str] = None
+) -> Dict:
+    return {
+        "google_doc_url": google_doc_url,
+        "drive_folder_url": drive_folder_url,
+        "generation_time_seconds": generation_time,
+        "cost_estimate": cost_estimate,
+        "status": status,
+        "error_message": error_message
+    }
+
+
+def metric_row(
+    step_name: str,
+    duration: float,
+    success: bool = True,
+    error: Optional[str] = None
+) -> Dict:
+    """
+    A processing_metrics row for persist_pipeline_result(). The step
+    latency histogram is updated right away; the row is written with the run.
+    """
+    observe_step(step_name, duration, success)
+    return {
+        "step_name": step_name,
+        "duration_seconds": duration,
+        "success": success,
+        "error_message": error
+    }
+
+
+def save_video(
+    video_url: str,
+    video_id: str,
+    title: str = "",
+    duration: Optional[int] = None,
+    channel_name: Optional[str] = None,
+    thumbnail_url: Optional[str] = None,
+    transcript: Optional[str] = None
+) -> str:
+    data = _video_row(video_url, video_id, title, duration, channel_name, thumbnail_url, transcript)
+
+    # Upsert so reprocessing a known video (e.g. on a cache hit) reuses its row
+    result = supabase.table("videos").upsert(data, on_conflict="video_id").execute()
     return result.data[0]["id"]
 
 
 def save_viral_segments(video_id: str, segments: List[Dict], selected_rank: int) -> str:
-    segments_data = []
-    selected_segment_id = None
-
-    for segment in segments:
-        is_selected = segment["rank"] == selected_rank
-        segment_data = {
-            "video_id": video_id,
-            "rank": segment["rank"],
-            "score": segment["score"],
-            "hook": segment["hook"],
-            "summary": segment.get("summary", ""),
-            "viral_type": segment.get("viral_type", ""),
-            "start_time": segment.get("start_time", ""),
-            "end_time": segment.get("end_time", ""),
-            "excerpt": segment.get("excerpt", ""),
-            "is_selected": is_selected
-        }
-        segments_data.append(segment_data)
+    segments_data = [{"video_id": video_id, **_segment_row(segment, selected_rank)} for segment in segments]
 
     result = supabase.table("viral_segments").insert(segments_data).execute()
 
     for item in result.data:
         if item["is_selected"]:
-            selected_segment_id = item["id"]
-            break
+            return item["id"]
 
-    return selected_segment_id
+    return None
 
 
 def save_storyboard(
@@ -75,37 +154,19 @@ def save_storyboard(
     segment_id: str,
     storyboard_data: Dict
 ) -> str:
-    data = {
-        "video_id": video_id,
-        "segment_id": segment_id,
-        "title": storyboard_data.get("title", ""),
-        "style": storyboard_data.get("style", "manga-vintage"),
-        "tone": storyboard_data.get("tone", ""),
-        "panels": storyboard_data.get("panels", []),
-        "hashtags": storyboard_data.get("hashtags", []),
-        "posting_strategy": storyboard_data.get("posting_tip", "")
-    }
+    data = {"video_id": video_id, "segment_id": segment_id, **_storyboard_row(storyboard_data)}
 
     result = supabase.table("storyboards").insert(data).execute()
     return result.data[0]["id"]
 
 
 def save_comic_panels(storyboard_id: str, panels_data: List[Dict]) -> List[str]:
-    panels_to_insert = []
-
-    for panel in panels_data:
-        panel_data = {
-            "storyboard_id": storyboard_id,
-            "panel_number": panel.get("panel_number"),
-            "image_url": panel.get("image_url"),
-            "image_data": panel.get("image_data"),
-            "caption": panel.get("caption", ""),
-            "scene_description": panel.get("scene_description", ""),
-            "generation_prompt": panel.get("generation_prompt", "")
-        }
-        panels_to_insert.append(panel_data)
-
-    result = supabase.table("comic_panels").insert(panels_to_insert).execute()
+    panels_to_insert = [{"storyboard_id": storyboard_id, **_panel_row(panel)} for panel in panels_data]
+
+    # Upsert so re-rendering a storyboard replaces its panels
+    result = supabase.table("comic_panels") \
+        .upsert(panels_to_insert, on_conflict="storyboard_id,panel_number") \
+        .execute()
     return [item["id"] for item in result.data]
 
 
@@ -120,18 +181,88 @@ def save_generated_comic(
 ) -> str:
     data = {
         "storyboard_id": storyboard_id,
-        "google_doc_url": google_doc_url,
-        "drive_folder_url": drive_folder_url,
-        "generation_time_seconds": generation_time,
-        "cost_estimate": cost_estimate,
-        "status": status,
-        "error_message": error_message
+        **_comic_row(google_doc_url, drive_folder_url, generation_time, cost_estimate, status, error_message)
     }
 
     result = supabase.table("generated_comics").insert(data).execute()
     return result.data[0]["id"]
 
 
+def persist_pipeline_result(
+    video: Dict,
+    segments: List[Dict],
+    selected_rank: int,
+    storyboard_data: Dict,
+    panels_data: List[Dict],
+    comic: Dict,
+    metrics: List[Dict],
+    alternate_storyboards: Optional[Dict[int, Dict]] = None
+) -> Dict:
+    """
+    Write a whole pipeline run in one round trip and one transaction
+    (the persist_jetski_run() Postgres function): either every row is
+    written or none is.
+
+    Ids are generated here so the payload can link children to parents
+    up front. The call is idempotent - a retry after a timeout returns
+    the ids of the run that was already committed.
+
+    Args:
+        video: save_video() keyword arguments
+        segments: Viral segments (selected_rank marks the selected one)
+        selected_rank: Rank of the segment the storyboard was made from
+        storyboard_data: Storyboard as returned by generate_storyboard()
+        panels_data: Comic panel rows (see save_comic_panels)
+        comic: save_generated_comic() keyword arguments (without storyboard_id)
+        metrics: metric_row() rows
+        alternate_storyboards: Storyboards for the other segments, by segment rank
+
+    Returns:
+        dict: video_id, segment_id, storyboard_id, comic_id and
+              segments ([{id, rank, storyboard_id}])
+    """
+    segment_rows = [{"id": str(uuid.uuid4()), **_segment_row(segment, selected_rank)} for segment in segments]
+    selected = next((row for row in segment_rows if row["is_selected"]), None)
+    segment_ids = {row["rank"]: row["id"] for row in segment_rows}
+
+    payload = {
+        "video": {"id": str(uuid.uuid4()), **_video_row(**video)},
+        "segments": segment_rows,
+        "selected_segment_id": selected["id"] if selected else None,
+        "storyboard": {"id": str(uuid.uuid4()), **_storyboard_row(storyboard_data)},
+        "panels": [_panel_row(panel) for panel in panels_data],
+        "comic": {"id": str(uuid.uuid4()), **_comic_row(**comic)},
+        "metrics": metrics,
+        "alternate_storyboards": [
+            {"id": str(uuid.uuid4()), "segment_id": segment_ids[rank], **_storyboard_row(data)}
+            for rank, data in (alternate_storyboards or {}).items()
+            if rank in segment_ids and rank != selected_rank
+        ]
+    }
+
+    for attempt in range(PERSIST_MAX_RETRIES + 1):
+        try:
+            return supabase.rpc("persist_jetski_run", {"payload": payload}).execute().data
+        except Exception as e:
+            # Constraint violations won't succeed on retry - only transport errors are retried
+            if attempt == PERSIST_MAX_RETRIES or getattr(e, "code", None):
+                raise
+            print(f"⚠️  Persist failed, retrying ({str(e)})")
+            time.sleep(0.5 * (2 ** attempt))
+
+
+def select_segment(segment_id: str) -> Dict:
+    """
+    Make segment_id the selected segment of its video (the other segments
+    are unselected in the same transaction).
+
+    Returns:
+        dict: segment_id, video_id and storyboard_id (None if the segment
+              has no storyboard yet)
+    """
+    return supabase.rpc("select_viral_segment", {"p_segment_id": segment_id}).execute().data
+
+
 def log_metric(
     video_id: Optional[str],
     step_name: str,
@@ -139,15 +270,37 @@ def log_metric(
     success: bool = True,
     error: Optional[str] = None
 ):
-    data = {
-        "video_id": video_id,
+    """
+    Record a step latency. Non-blocking: the row is buffered and inserted
+    in batches by a background writer (see metrics.py).
+    """
+    observe_step(step_name, duration, success)
+    _metrics_sink.record({
+        # Steps that run before the video row exists pass 0 - store NULL, not an invalid uuid
+        "video_id": video_id or None,
         "step_name": step_name,
         "duration_seconds": duration,
         "success": success,
         "error_message": error
-    }
+    })
+
 
-    supabase.table("processing_metrics").insert(data).execute()
+def log_metric_rows(rows: List[Dict], video_id: Optional[str] = None):
+    """
+    Buffer metric_row() rows for the background writer - for a run that
+    failed before persist_pipeline_result() could write them. Their
+    latencies were already observed by metric_row().
+    """
+    for row in rows:
+        _metrics_sink.record({"video_id": video_id or None, **row})
+
+
+def _insert_metrics(rows: List[Dict]):
+    """One insert request for a whole batch of metric rows"""
+    supabase.table("processing_metrics").insert(rows).execute()
+
+
+_metrics_sink = create_sink("supabase", _insert_metrics)
 
 
 def get_video_history(limit: int = 10) -> List[Dict]:
@@ -164,34 +317,92 @@ def get_video_by_id(video_id: str) -> Optional[Dict]:
     result = supabase.table("videos") \
         .select("*") \
         .eq("id", video_id) \
-        .maybeSingle() \
+        .maybe_single() \
         .execute()
 
-    return result.data
+    # maybe_single() returns no response at all when nothing matches
+    return result.data if result else None
+
+
+def get_video_by_video_id(video_id: str) -> Optional[Dict]:
+    result = supabase.table("videos") \
+        .select("*") \
+        .eq("video_id", video_id) \
+        .limit(1) \
+        .execute()
+
+    return result.data[0] if result.data else None
+
+
+def get_cached_result(cache_key: str) -> Optional[Any]:
+    now = datetime.now(timezone.utc).isoformat()
+    result = supabase.table("result_cache") \
+        .select("payload") \
+        .eq("cache_key", cache_key) \
+        .gt("expires_at", now) \
+        .limit(1) \
+        .execute()
+
+    return result.data[0]["payload"] if result.data else None
+
+
+def save_cached_result(
+    cache_key: str,
+    kind: str,
+    video_id: str,
+    payload: Any,
+    ttl_seconds: int
+):
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+    data = {
+        "cache_key": cache_key,
+        "kind": kind,
+        "video_id": video_id,
+        "payload": payload,
+        "expires_at": expires_at.isoformat()
+    }
+
+    supabase.table("result_cache").upsert(data).execute()
 
 
 def get_storyboard_with_panels(storyboard_id: str) -> Optional[Dict]:
     storyboard_result = supabase.table("storyboards") \
         .select("*") \
         .eq("id", storyboard_id) \
-        .maybeSingle() \
+        .maybe_single() \
         .execute()
 
-    if not storyboard_result.data:
+    if not storyboard_result or not storyboard_result.data:
         return None
 
+    # Image bytes live in the blob store - never pull legacy image_data here
     panels_result = supabase.table("comic_panels") \
-        .select("*") \
+        .select("id, storyboard_id, panel_number, image_url, image_sha256, image_size, "
+                "image_mime_type, renditions, caption, scene_description, generation_prompt, created_at") \
         .eq("storyboard_id", storyboard_id) \
         .order("panel_number") \
         .execute()
 
     storyboard = storyboard_result.data
     storyboard["comic_panels"] = panels_result.data
+    for panel in storyboard["comic_panels"]:
+        panel["image_path"] = f"/blobs/{panel['image_sha256']}" if panel.get("image_sha256") else None
 
     return storyboard
 
 
+def get_panel_renditions(image_sha256: str) -> Optional[Dict]:
+    """Renditions of a panel image, by the original image's hash"""
+    result = supabase.table("comic_panels") \
+        .select("renditions") \
+        .eq("image_sha256", image_sha256) \
+        .not_.is_("renditions", "null") \
+        .limit(1) \
+        .execute()
+
+    return result.data[0]["renditions"] if result.data else None
+
+
 def get_recent_comics(limit: int = 10) -> List[Dict]:
     result = supabase.table("generated_comics") \
         .select("""
@@ -2,6 +2,7 @@
 
 import sys
 import io
+import time
 import requests
 import json
 
@@ -14,6 +15,8 @@ print("="*70)
 
 # Test video URL - shorter video for faster testing
 test_url = "https://www.youtube.com/watch?v=PssKpzB0Ah0"
+API_BASE = "http://localhost:8000"
+JOB_TIMEOUT_SECONDS = 300
 
 print(f"\nTest Video: {test_url}")
 print("\nSending request to /jetski endpoint...")
@@ -22,17 +25,30 @@ print("(This may take 1-2 minutes...)\n")
 try:
     # Call the /jetski endpoint
     response = requests.post(
-        "http://localhost:8000/jetski",
+        f"{API_BASE}/jetski",
         json={
             "video_url": test_url,
             "generate_images": False,  # Skip images for faster testing
             "create_google_doc": False  # Skip docs for faster testing
         },
-        timeout=300  # 5 minute timeout
+        timeout=30
     )
 
-    if response.status_code == 200:
-        result = response.json()
+    # /jetski queues the run (202) - poll the job until it finishes
+    job = None
+    if response.status_code == 202:
+        status_url = response.json()["status_url"]
+        deadline = time.time() + JOB_TIMEOUT_SECONDS
+        while True:
+            job = requests.get(f"{API_BASE}{status_url}", timeout=30).json()
+            if job["status"] in ("success", "failed"):
+                break
+            if time.time() > deadline:
+                raise requests.exceptions.Timeout(f"Job still {job['status']}")
+            time.sleep(3)
+
+    if job and job["status"] == "success":
+        result = job["result"]
 
         print("="*70)
         print("SUCCESS - PIPELINE COMPLETED")
@@ -78,7 +94,7 @@ try:
 
         # Test /history endpoint
         print("\nTesting /history endpoint...")
-        history_response = requests.get("http://localhost:8000/history?limit=5")
+        history_response = requests.get(f"{API_BASE}/history?limit=5")
         if history_response.status_code == 200:
             history = history_response.json()
             print(f"History entries found: {history.get('count', 0)}")
@@ -88,6 +104,8 @@ try:
         else:
             print(f"History endpoint error: {history_response.status_code}")
 
+    elif job:
+        print(f"ERROR - Job failed: {job['error']}")
     else:
         print(f"ERROR - Status Code: {response.status_code}")
         print(f"Response: {response.text}")
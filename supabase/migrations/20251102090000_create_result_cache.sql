@@ -0,0 +1,53 @@
+/*
+  # Result cache
+
+  Stores transcripts, viral analyses and storyboards so repeat runs for the
+  same video skip the YouTube fetch and the LLM calls.
+
+  ### `result_cache`
+  - `cache_key` (text, primary key) - `<kind>:<youtube video id>:<prompt/model hash>`
+  - `kind` (text) - transcript, viral_analysis or storyboard
+  - `video_id` (text) - YouTube video ID
+  - `payload` (jsonb) - Cached result
+  - `expires_at` (timestamptz) - Entry is ignored after this time
+  - `created_at` (timestamptz) - Record creation timestamp
+
+  ### Policies
+  - UPDATE on videos (save_video upserts on video_id, so re-processing a
+    video updates its row)
+*/
+
+CREATE TABLE IF NOT EXISTS result_cache (
+  cache_key text PRIMARY KEY,
+  kind text NOT NULL,
+  video_id text NOT NULL,
+  payload jsonb NOT NULL,
+  expires_at timestamptz NOT NULL,
+  created_at timestamptz DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_result_cache_video_id ON result_cache(video_id);
+CREATE INDEX IF NOT EXISTS idx_result_cache_expires_at ON result_cache(expires_at);
+
+ALTER TABLE result_cache ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Public can view result cache"
+  ON result_cache FOR SELECT
+  USING (true);
+
+CREATE POLICY "Authenticated users can write result cache"
+  ON result_cache FOR INSERT
+  TO authenticated
+  WITH CHECK (true);
+
+CREATE POLICY "Authenticated users can update result cache"
+  ON result_cache FOR UPDATE
+  TO authenticated
+  USING (true)
+  WITH CHECK (true);
+
+CREATE POLICY "Authenticated users can update videos"
+  ON videos FOR UPDATE
+  TO authenticated
+  USING (true)
+  WITH CHECK (true);
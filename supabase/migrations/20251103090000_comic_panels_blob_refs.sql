@@ -0,0 +1,20 @@
+/*
+  # Panel images move to the blob store
+
+  Panel image bytes are now stored in a content-addressed blob store (local
+  filesystem or S3-compatible) and served by `GET /blobs/{sha256}`. Rows only
+  keep a reference to the blob.
+
+  ### `comic_panels` - new columns
+  - `image_sha256` (text) - SHA-256 of the raw image bytes (blob key)
+  - `image_size` (integer) - Image size in bytes
+  - `image_mime_type` (text) - Image mime type
+
+  `image_data` is kept (nullable) for rows written before this change.
+*/
+
+ALTER TABLE comic_panels ADD COLUMN IF NOT EXISTS image_sha256 text;
+ALTER TABLE comic_panels ADD COLUMN IF NOT EXISTS image_size integer;
+ALTER TABLE comic_panels ADD COLUMN IF NOT EXISTS image_mime_type text;
+
+CREATE INDEX IF NOT EXISTS idx_comic_panels_image_sha256 ON comic_panels(image_sha256);
@@ -0,0 +1,95 @@
+/*
+  # Panel renditions
+
+  Each rendered panel is transcoded into smaller renditions (e.g. 1080px
+  WebP/JPEG for carousels, 320px thumbnails), stored in the blob store and
+  served by `GET /panels/{sha256}/image` according to the Accept header.
+
+  ### `comic_panels` - new column
+  - `renditions` (jsonb) - Renditions by key (e.g. `carousel.webp`):
+    `{name, sha256, size, mime_type, width, height}`
+
+  ### persist_jetski_run(payload jsonb)
+  Panels in the payload may carry `renditions`; otherwise unchanged.
+*/
+
+ALTER TABLE comic_panels ADD COLUMN IF NOT EXISTS renditions jsonb;
+
+CREATE OR REPLACE FUNCTION persist_jetski_run(payload jsonb)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  v_video_id uuid;
+  v_segment_id uuid := (payload->>'selected_segment_id')::uuid;
+  v_storyboard_id uuid := (payload->'storyboard'->>'id')::uuid;
+  v_comic_id uuid := (payload->'comic'->>'id')::uuid;
+  v_segments jsonb;
+BEGIN
+  -- Already committed by an earlier attempt: return the same ids
+  IF EXISTS (SELECT 1 FROM generated_comics WHERE id = v_comic_id) THEN
+    SELECT s.video_id INTO v_video_id FROM storyboards s WHERE s.id = v_storyboard_id;
+  ELSE
+    INSERT INTO videos (id, video_id, video_url, title, duration, channel_name, thumbnail_url, transcript)
+    SELECT v.id, v.video_id, v.video_url, COALESCE(v.title, ''), v.duration, v.channel_name,
+           v.thumbnail_url, v.transcript
+    FROM jsonb_populate_record(NULL::videos, payload->'video') v
+    ON CONFLICT (video_id) DO UPDATE SET
+      video_url = EXCLUDED.video_url,
+      title = EXCLUDED.title,
+      duration = EXCLUDED.duration,
+      channel_name = COALESCE(EXCLUDED.channel_name, videos.channel_name),
+      thumbnail_url = COALESCE(EXCLUDED.thumbnail_url, videos.thumbnail_url),
+      transcript = EXCLUDED.transcript
+    RETURNING id INTO v_video_id;
+
+    INSERT INTO viral_segments (id, video_id, rank, score, hook, summary, viral_type,
+                                start_time, end_time, excerpt, is_selected)
+    SELECT s.id, v_video_id, s.rank, s.score, s.hook, s.summary, s.viral_type,
+           s.start_time, s.end_time, s.excerpt, s.id = v_segment_id
+    FROM jsonb_populate_recordset(NULL::viral_segments, COALESCE(payload->'segments', '[]'::jsonb)) s;
+
+    INSERT INTO storyboards (id, video_id, segment_id, title, style, tone, panels, hashtags, posting_strategy)
+    SELECT b.id, v_video_id, v_segment_id, b.title, COALESCE(b.style, 'manga-vintage'), b.tone,
+           b.panels, b.hashtags, b.posting_strategy
+    FROM jsonb_populate_record(NULL::storyboards, payload->'storyboard') b;
+
+    INSERT INTO storyboards (id, video_id, segment_id, title, style, tone, panels, hashtags, posting_strategy)
+    SELECT b.id, v_video_id, b.segment_id, b.title, COALESCE(b.style, 'manga-vintage'), b.tone,
+           b.panels, b.hashtags, b.posting_strategy
+    FROM jsonb_populate_recordset(NULL::storyboards, COALESCE(payload->'alternate_storyboards', '[]'::jsonb)) b;
+
+    INSERT INTO comic_panels (storyboard_id, panel_number, image_url, image_sha256, image_size,
+                              image_mime_type, renditions, caption, scene_description, generation_prompt)
+    SELECT v_storyboard_id, p.panel_number, p.image_url, p.image_sha256, p.image_size,
+           p.image_mime_type, p.renditions, p.caption, p.scene_description, p.generation_prompt
+    FROM jsonb_populate_recordset(NULL::comic_panels, COALESCE(payload->'panels', '[]'::jsonb)) p;
+
+    INSERT INTO generated_comics (id, storyboard_id, google_doc_url, drive_folder_url,
+                                  generation_time_seconds, cost_estimate, status, error_message)
+    SELECT c.id, v_storyboard_id, c.google_doc_url, c.drive_folder_url,
+           c.generation_time_seconds, COALESCE(c.cost_estimate, 0.25), COALESCE(c.status, 'success'),
+           c.error_message
+    FROM jsonb_populate_record(NULL::generated_comics, payload->'comic') c;
+
+    INSERT INTO processing_metrics (video_id, step_name, duration_seconds, success, error_message)
+    SELECT v_video_id, m.step_name, m.duration_seconds, COALESCE(m.success, true), m.error_message
+    FROM jsonb_populate_recordset(NULL::processing_metrics, COALESCE(payload->'metrics', '[]'::jsonb)) m;
+  END IF;
+
+  SELECT COALESCE(jsonb_agg(jsonb_build_object('id', s.id, 'rank', s.rank, 'storyboard_id', b.id)
+                            ORDER BY s.rank), '[]'::jsonb)
+  INTO v_segments
+  FROM viral_segments s
+  LEFT JOIN storyboards b ON b.segment_id = s.id
+  WHERE s.id IN (SELECT (x->>'id')::uuid FROM jsonb_array_elements(COALESCE(payload->'segments', '[]'::jsonb)) x);
+
+  RETURN jsonb_build_object(
+    'video_id', v_video_id,
+    'segment_id', v_segment_id,
+    'storyboard_id', v_storyboard_id,
+    'comic_id', v_comic_id,
+    'segments', v_segments
+  );
+END;
+$$;
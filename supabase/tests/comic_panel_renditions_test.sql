@@ -0,0 +1,52 @@
+/*
+  pgTAP tests for comic_panels.renditions via persist_jetski_run()
+
+  Runs against the local Postgres + PostgREST stack:
+      supabase start
+      supabase test db
+*/
+
+BEGIN;
+CREATE EXTENSION IF NOT EXISTS pgtap WITH SCHEMA extensions;
+
+SELECT plan(3);
+
+SELECT has_column('comic_panels', 'renditions', 'comic_panels has a renditions column');
+
+CREATE TEMP TABLE ids AS
+SELECT gen_random_uuid() AS video, gen_random_uuid() AS segment,
+       gen_random_uuid() AS storyboard, gen_random_uuid() AS comic;
+
+SELECT persist_jetski_run(jsonb_build_object(
+  'video', jsonb_build_object('id', ids.video, 'video_id', 'pgtap_rend01',
+                              'video_url', 'https://youtu.be/pgtap_rend01', 'title', 'Renditions'),
+  'segments', jsonb_build_array(jsonb_build_object('id', ids.segment, 'rank', 1, 'score', 80)),
+  'selected_segment_id', ids.segment,
+  'storyboard', jsonb_build_object('id', ids.storyboard, 'title', 'Renditions', 'panels', '[]'::jsonb),
+  'panels', jsonb_build_array(
+    jsonb_build_object('panel_number', 1, 'image_sha256', 'abc123',
+                       'renditions', jsonb_build_object(
+                         'carousel.webp', jsonb_build_object('name', 'carousel', 'sha256', 'def456',
+                                                             'size', 1024, 'mime_type', 'image/webp',
+                                                             'width', 1080, 'height', 1080))),
+    jsonb_build_object('panel_number', 2, 'image_sha256', 'abc124')
+  ),
+  'comic', jsonb_build_object('id', ids.comic)
+))
+FROM ids;
+
+SELECT is(
+  (SELECT renditions->'carousel.webp'->>'mime_type' FROM comic_panels
+   WHERE storyboard_id = (SELECT storyboard FROM ids) AND panel_number = 1),
+  'image/webp',
+  'panel renditions are saved'
+);
+
+SELECT ok(
+  (SELECT renditions IS NULL FROM comic_panels
+   WHERE storyboard_id = (SELECT storyboard FROM ids) AND panel_number = 2),
+  'panels without renditions are saved with null'
+);
+
+SELECT * FROM finish();
+ROLLBACK;
@@ -0,0 +1,118 @@
+/*
+  pgTAP tests for persist_jetski_run()
+
+  Runs against the local Postgres + PostgREST stack:
+      supabase start
+      supabase test db
+*/
+
+BEGIN;
+CREATE EXTENSION IF NOT EXISTS pgtap WITH SCHEMA extensions;
+
+SELECT plan(10);
+
+-- Full payload for a video; panel_number is configurable to force a failure
+CREATE FUNCTION pg_temp.run_payload(p_video text, p_last_panel integer DEFAULT 6)
+RETURNS jsonb
+LANGUAGE sql
+AS $$
+  WITH ids AS (
+    SELECT gen_random_uuid() AS video, gen_random_uuid() AS seg1, gen_random_uuid() AS seg2,
+           gen_random_uuid() AS storyboard, gen_random_uuid() AS comic
+  )
+  SELECT jsonb_build_object(
+    'video', jsonb_build_object('id', ids.video, 'video_id', p_video,
+                                'video_url', 'https://youtu.be/' || p_video, 'title', 'Test video'),
+    'segments', jsonb_build_array(
+      jsonb_build_object('id', ids.seg1, 'rank', 1, 'score', 90, 'hook', 'Hook one'),
+      jsonb_build_object('id', ids.seg2, 'rank', 2, 'score', 70, 'hook', 'Hook two')
+    ),
+    'selected_segment_id', ids.seg1,
+    'storyboard', jsonb_build_object('id', ids.storyboard, 'title', 'Test comic',
+                                     'panels', '[]'::jsonb, 'hashtags', jsonb_build_array('#a', '#b')),
+    'panels', jsonb_build_array(
+      jsonb_build_object('panel_number', 1, 'caption', 'First', 'image_sha256', repeat('a', 64)),
+      jsonb_build_object('panel_number', p_last_panel, 'caption', 'Last')
+    ),
+    'comic', jsonb_build_object('id', ids.comic, 'generation_time_seconds', 42.5),
+    'metrics', jsonb_build_array(
+      jsonb_build_object('step_name', 'viral_analysis', 'duration_seconds', 3.2),
+      jsonb_build_object('step_name', 'image_generation', 'duration_seconds', 20.1, 'success', false,
+                         'error_message', 'quota')
+    )
+  )
+  FROM ids
+$$;
+
+CREATE TEMP TABLE runs (name text PRIMARY KEY, payload jsonb, result jsonb);
+INSERT INTO runs (name, payload) VALUES ('first', pg_temp.run_payload('pgtap_vid01'));
+
+-- Happy path: one call writes the whole graph
+SELECT lives_ok(
+  $$ UPDATE runs SET result = persist_jetski_run(payload) WHERE name = 'first' $$,
+  'persists a full pipeline run'
+);
+
+SELECT is(
+  (SELECT result->>'video_id' FROM runs WHERE name = 'first'),
+  (SELECT payload->'video'->>'id' FROM runs WHERE name = 'first'),
+  'new video keeps its client-generated id'
+);
+
+SELECT is(
+  (SELECT count(*)::int FROM viral_segments vs JOIN videos v ON v.id = vs.video_id
+   WHERE v.video_id = 'pgtap_vid01'),
+  2, 'segments are written against the video'
+);
+
+SELECT is(
+  (SELECT id::text FROM viral_segments vs WHERE vs.is_selected AND vs.video_id =
+     (SELECT (result->>'video_id')::uuid FROM runs WHERE name = 'first')),
+  (SELECT payload->>'selected_segment_id' FROM runs WHERE name = 'first'),
+  'selected segment is flagged'
+);
+
+SELECT is(
+  (SELECT count(*)::int FROM comic_panels WHERE storyboard_id =
+     (SELECT (result->>'storyboard_id')::uuid FROM runs WHERE name = 'first')),
+  2, 'panels are written against the storyboard'
+);
+
+SELECT is(
+  (SELECT count(*)::int FROM processing_metrics WHERE video_id =
+     (SELECT (result->>'video_id')::uuid FROM runs WHERE name = 'first')),
+  2, 'metrics are written against the video'
+);
+
+-- Retrying a committed payload is a no-op with the same ids
+SELECT is(
+  (SELECT persist_jetski_run(payload) FROM runs WHERE name = 'first'),
+  (SELECT result FROM runs WHERE name = 'first'),
+  'retrying a committed payload returns the same ids'
+);
+
+-- Re-processing the same video reuses its row
+INSERT INTO runs (name, payload) VALUES ('second', pg_temp.run_payload('pgtap_vid01'));
+UPDATE runs SET result = persist_jetski_run(payload) WHERE name = 'second';
+
+SELECT is(
+  (SELECT result->>'video_id' FROM runs WHERE name = 'second'),
+  (SELECT result->>'video_id' FROM runs WHERE name = 'first'),
+  're-processed video keeps its existing id'
+);
+
+-- Atomicity: panel_number 7 violates the CHECK constraint, so nothing is written
+SELECT throws_ok(
+  $$ SELECT persist_jetski_run(pg_temp.run_payload('pgtap_vid02', 7)) $$,
+  '23514',
+  NULL,
+  'an invalid row fails the whole call'
+);
+
+SELECT is(
+  (SELECT count(*)::int FROM videos WHERE video_id = 'pgtap_vid02'),
+  0, 'a failed call leaves no rows behind'
+);
+
+SELECT * FROM finish();
+ROLLBACK;
@@ -0,0 +1,77 @@
+/*
+  pgTAP tests for alternate storyboards and select_viral_segment()
+
+  Runs against the local Postgres + PostgREST stack:
+      supabase start
+      supabase test db
+*/
+
+BEGIN;
+CREATE EXTENSION IF NOT EXISTS pgtap WITH SCHEMA extensions;
+
+SELECT plan(7);
+
+CREATE TEMP TABLE ids AS
+SELECT gen_random_uuid() AS video, gen_random_uuid() AS seg1, gen_random_uuid() AS seg2,
+       gen_random_uuid() AS storyboard, gen_random_uuid() AS alternate, gen_random_uuid() AS comic;
+
+CREATE TEMP TABLE runs AS
+SELECT persist_jetski_run(jsonb_build_object(
+  'video', jsonb_build_object('id', ids.video, 'video_id', 'pgtap_seg01',
+                              'video_url', 'https://youtu.be/pgtap_seg01', 'title', 'Segments'),
+  'segments', jsonb_build_array(
+    jsonb_build_object('id', ids.seg1, 'rank', 1, 'score', 90, 'hook', 'Hook one'),
+    jsonb_build_object('id', ids.seg2, 'rank', 2, 'score', 70, 'hook', 'Hook two')
+  ),
+  'selected_segment_id', ids.seg1,
+  'storyboard', jsonb_build_object('id', ids.storyboard, 'title', 'Selected', 'panels', '[]'::jsonb),
+  'alternate_storyboards', jsonb_build_array(
+    jsonb_build_object('id', ids.alternate, 'segment_id', ids.seg2, 'title', 'Alternate',
+                       'panels', '[{"panel_number": 1}]'::jsonb)
+  ),
+  'comic', jsonb_build_object('id', ids.comic)
+)) AS result
+FROM ids;
+
+SELECT is(
+  (SELECT segment_id FROM storyboards WHERE id = (SELECT alternate FROM ids)),
+  (SELECT seg2 FROM ids),
+  'alternate storyboard is saved against its segment'
+);
+
+SELECT is(
+  (SELECT result->'segments'->1->>'storyboard_id' FROM runs),
+  (SELECT alternate::text FROM ids),
+  'result lists each segment with its storyboard'
+);
+
+SELECT is(
+  (SELECT select_viral_segment(seg2)->>'storyboard_id' FROM ids),
+  (SELECT alternate::text FROM ids),
+  'switching returns the segment''s storyboard'
+);
+
+SELECT ok(
+  (SELECT is_selected FROM viral_segments WHERE id = (SELECT seg2 FROM ids)),
+  'new segment is selected'
+);
+
+SELECT ok(
+  NOT (SELECT is_selected FROM viral_segments WHERE id = (SELECT seg1 FROM ids)),
+  'previous segment is unselected'
+);
+
+SELECT is(
+  (SELECT count(*)::int FROM viral_segments WHERE video_id = (SELECT video FROM ids) AND is_selected),
+  1, 'exactly one segment is selected'
+);
+
+SELECT throws_ok(
+  $$ SELECT select_viral_segment(gen_random_uuid()) $$,
+  'P0002',
+  NULL,
+  'unknown segment is rejected'
+);
+
+SELECT * FROM finish();
+ROLLBACK;